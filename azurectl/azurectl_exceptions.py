@@ -157,6 +157,10 @@ class AzureDataDiskShowError(AzureError):
     pass
 
 
+class AzureDecompressorNotAvailable(AzureError):
+    pass
+
+
 class AzureDomainLookupError(AzureError):
     pass
 
@@ -253,6 +257,10 @@ class AzurePageBlobAlignmentViolation(AzureError):
     pass
 
 
+class AzurePageBlobDownloadError(AzureError):
+    pass
+
+
 class AzurePageBlobSetupError(AzureError):
     pass
 
@@ -261,7 +269,7 @@ class AzurePageBlobUpdateError(AzureError):
     pass
 
 
-class AzurePageBlobZeroPageError(AzureError):
+class AzureQcow2FormatError(AzureError):
     pass
 
 
@@ -333,10 +341,18 @@ class AzureStorageAccountUpdateError(AzureError):
     pass
 
 
+class AzureStorageCopyError(AzureError):
+    pass
+
+
 class AzureStorageDeleteError(AzureError):
     pass
 
 
+class AzureStorageDownloadError(AzureError):
+    pass
+
+
 class AzureStorageFileNotFound(AzureError):
     pass
 
@@ -357,6 +373,10 @@ class AzureStorageUploadError(AzureError):
     pass
 
 
+class AzureStorageVerifyError(AzureError):
+    pass
+
+
 class AzureSubscriptionCertificateDecodeError(AzureError):
     pass
 
@@ -389,6 +409,14 @@ class AzureUnrecognizedManagementUrl(AzureError):
     pass
 
 
+class AzureUploadJournalError(AzureError):
+    pass
+
+
+class AzureUploadManifestError(AzureError):
+    pass
+
+
 class AzureVmCreateError(AzureError):
     pass
 
@@ -407,3 +435,7 @@ class AzureVmShutdownError(AzureError):
 
 class AzureVmStartError(AzureError):
     pass
+
+
+class AzureXZIndexError(AzureError):
+    pass
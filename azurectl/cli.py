@@ -38,7 +38,7 @@ usage: azurectl -h | --help
 
 global options:
     --output-format=<format>
-        output formats, supported are: json
+        output formats, supported are: json, ndjson
     --output-style=<style>
         output styles, supported are: standard, color
     --debug
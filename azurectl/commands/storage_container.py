@@ -24,6 +24,11 @@ usage: azurectl storage container -h | --help
            [--permissions=<permissions>]
        azurectl storage container list
        azurectl storage container show --name=<containername>
+           [--prefix=<prefix>]
+           [--max-results=<count>]
+       azurectl storage container usage
+           [--name=<containername>]
+           [--top=<count>]
        azurectl storage container delete --name=<containername>
        azurectl storage container help
 
@@ -40,13 +45,20 @@ commands:
         generate a shared access signature URL allowing limited access to the
         specified container without an access key
     show
-        show container content for configured account and container
+        show container content for configured account and container,
+        with --output-format=ndjson one line per blob is printed while
+        the container is listed
+    usage
+        show the number and size of the blobs by age and the largest
+        blobs of the given container or of all containers
 
 options:
     --expiry-datetime=<expiry>
         Date (and optionally time) to cease access via a shared access
         signature. [default: 30 days from start]
         Example format: YYYY-MM-DDThh:mm:ssZ
+    --max-results=<count>
+        show at most count blobs
     --name=<name>
         name of the container
     --permissions=<permissions>
@@ -57,12 +69,17 @@ options:
         d  Delete
         l  List
         [default: rl]
+    --prefix=<prefix>
+        show only blobs whose name starts with prefix
     --start-datetime=<start>
         Date (and optionally time) to grant access via a shared access
         signature. [default: now]
         Example format: YYYY-MM-DDThh:mm:ssZ
+    --top=<count>
+        number of largest blobs to show, default 10
 """
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # project
 from azurectl.commands.base import CliTask
@@ -70,14 +87,22 @@ from azurectl.account.service import AzureAccount
 from azurectl.utils.collector import DataCollector
 from azurectl.utils.output import DataOutput
 from azurectl.logger import log
-from azurectl.storage.container import Container
+from azurectl.storage.container import (
+    Container,
+    ISO8061_FORMAT
+)
+from azurectl.storage.container_usage import ContainerUsage
 from azurectl.help import Help
 
+from azurectl.azurectl_exceptions import AzureInvalidCommand
+
 
 class StorageContainerTask(CliTask):
     """
         Process container commands
     """
+    MAX_USAGE_LISTINGS = 8
+
     def process(self):
         self.manual = Help()
         if self.__help():
@@ -118,6 +143,8 @@ class StorageContainerTask(CliTask):
             self.__container_create()
         elif self.command_args['delete']:
             self.__container_delete()
+        elif self.command_args['usage']:
+            self.__container_usage()
         elif self.command_args['sas']:
             self.__container_sas(
                 start, expiry, self.command_args['--permissions']
@@ -143,12 +170,74 @@ class StorageContainerTask(CliTask):
 
     def __container_content(self):
         container_name = self.command_args['--name']
+        max_results = self.command_args['--max-results']
+        self.__validate_count('--max-results', 1)
+        blobs = self.container.blobs(
+            container_name, self.command_args['--prefix'], max_results
+        )
+        if self.global_args['--output-format'] == 'ndjson':
+            self.out.stream(
+                {
+                    'name': blob['name'],
+                    'byte_size': blob['byte_size'],
+                    'last_modified': blob['last_modified'].strftime(
+                        ISO8061_FORMAT
+                    ),
+                    'blob_type': blob['blob_type']
+                } for blob in blobs
+            )
+        else:
+            self.result.add(
+                self.account.storage_name() + ':container_content',
+                {container_name: [format(blob['name']) for blob in blobs]}
+            )
+            self.out.display()
+
+    def __container_usage(self):
+        self.__validate_count('--top', 0)
+        top = self.command_args['--top'] or 10
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if self.command_args['--name']:
+            containers = [self.command_args['--name']]
+        else:
+            containers = self.container.list()
+        usages = []
+        if containers:
+            # containers are listed concurrently, each listing waits
+            # for the pages of its container
+            with ThreadPoolExecutor(
+                max_workers=min(len(containers), self.MAX_USAGE_LISTINGS)
+            ) as listing_pool:
+                usages = list(listing_pool.map(
+                    lambda container: self.container.usage(
+                        container, top, now
+                    ),
+                    containers
+                ))
         self.result.add(
-            self.account.storage_name() + ':container_content',
-            self.container.content(container_name)
+            self.account.storage_name() + ':container_usage',
+            dict(
+                (usage.container, usage.report()) for usage in usages
+            )
         )
+        if not self.command_args['--name']:
+            total = ContainerUsage(None, top, now)
+            for usage in usages:
+                total.merge(usage)
+            self.result.add(
+                self.account.storage_name() + ':usage', total.report()
+            )
         self.out.display()
 
+    def __validate_count(self, option, minimum):
+        count = self.command_args[option]
+        if count is not None and \
+                (not count.isdigit() or int(count) < minimum):
+            raise AzureInvalidCommand(
+                '%s must be a number of at least %d, got %s' %
+                (option, minimum, count)
+            )
+
     def __container_list(self):
         self.result.add(
             self.account.storage_name() + ':containers',
@@ -16,38 +16,107 @@ In order to make use of a disk image in Azure, a fixed-size virtual hard disk
 (VHD) file must be uploaded to storage as a page blob.
 
 usage: azurectl storage disk -h | --help
-       azurectl storage disk upload --source=<file>
+       azurectl storage disk upload (--source=<file>... | --source-list=<file>)
            [--blob-name=<blobname>]
+           [--max-uploads=<count>]
+           [--convert-to-vhd]
            [--max-chunk-size=<size>]
+           [--adaptive-chunk-size]
+           [--max-page-gap=<size>]
+           [--threads=<count>]
+           [--max-bandwidth=<bytes>]
+           [--max-requests=<count>]
+           [--read-ahead=<count>]
+           [--size=<bytes>]
+           [--resume]
+           [--delta]
+           [--verify]
+           [--quiet]
+       azurectl storage disk download --blob-name=<blobname>
+           [--destination=<file>]
+           [--xz]
+           [--max-chunk-size=<size>]
+           [--threads=<count>]
+           [--max-bandwidth=<bytes>]
+           [--quiet]
+       azurectl storage disk copy --blob-name=<blobname> --target=<account>...
+           [--target-blob-name=<blobname>]
            [--quiet]
        azurectl storage disk sas --blob-name=<blobname>
            [--start-datetime=<start>]
            [--expiry-datetime=<expiry>]
            [--permissions=<permissions>]
-       azurectl storage disk delete --blob-name=<blobname>
+       azurectl storage disk delete
+           [--blob-name=<blobname>]
+           [--prefix=<prefix>]
+           [--older-than=<days>]
+           [--threads=<count>]
+           [--dry-run]
        azurectl storage disk help
 
 commands:
+    copy
+        copy disk image server side to containers of other storage
+        accounts, e.g in other regions
     delete
-        delete disk image from the given container
+        delete disk image from the given container, or all disk images
+        matching a glob, a prefix or an age concurrently
+    download
+        download disk image from the given container to a sparse file,
+        only the pages holding data are downloaded
     help
         show manual page for disk command
     sas
         generate a shared access signature URL allowing limited access to the
         specified disk image without an access key
     upload
-        upload xz compressed disk image to the given container
+        upload raw or xz, lzma, gzip, bzip2 or zstd compressed disk
+        image to the given container
         (will automatically skip zero'd blocks)
+        several images are uploaded concurrently and reported in one
+        JSON document
 
 options:
+    --adaptive-chunk-size
+        adapt the size of the page updates between 64KB and the max
+        chunk size to the observed upload throughput and failures
     --blob-name=<blobname>
-        name of the file in the storage pool
+        name of the file in the storage pool, on delete a glob pattern
+        like image-*.vhd is matched against all blob names
+    --convert-to-vhd
+        convert a raw or qcow2 disk image to a fixed VHD while uploading
+        it, compressed images must hold a raw disk image or a fixed VHD
+    --delta
+        upload only the chunks which changed since the last upload of
+        the same blob, as recorded in the local upload manifest
+    --destination=<file>
+        file to download to, default is the blob name in the current
+        directory
+    --dry-run
+        list the disk images which would be deleted without deleting
+        them
     --expiry-datetime=<expiry>
         Date (and optionally time) to cease access via a shared access
         signature. [default: 30 days from start]
         Example format: YYYY-MM-DDThh:mm:ssZ
+    --max-bandwidth=<bytes>
+        max number of bytes per second sent by the upload or received
+        by the download, default unlimited
     --max-chunk-size=<size>
-        max chunk size in bytes for upload, default 4MB
+        max chunk size in bytes for upload or download, default 4MB,
+        which is also the max for download
+    --max-page-gap=<size>
+        max number of zero bytes between two data ranges of a chunk to
+        still upload them in one request, default 64KB
+    --max-requests=<count>
+        max number of page requests per second sent by the upload,
+        default unlimited
+    --max-uploads=<count>
+        max number of images uploaded concurrently when uploading
+        several images, default 4
+    --older-than=<days>
+        delete only disk images last modified more than the given
+        number of days ago
     --permissions=<permissions>
         String of permitted actions on a storage element via shared access
         signature.
@@ -56,16 +125,51 @@ options:
         d  Delete
         l  List
         [default: rl]
+    --prefix=<prefix>
+        delete only disk images whose name starts with the prefix
     --quiet
-        suppress progress information on upload
+        suppress progress information on upload, download or copy
+    --read-ahead=<count>
+        number of chunks decompressed ahead of the upload of compressed
+        files, limits the memory used for it to count times the max
+        chunk size, also for the blocks of xz files decompressed in
+        parallel, 0 disables read ahead, default 4
+    --resume
+        continue an interrupted upload of the same file to the same
+        blob instead of starting over
+    --size=<bytes>
+        size of the image read from stdin, without it the page blob is
+        cut to the size of the data at the end of the upload
     --source=<file>
-        file to upload
+        file to upload, - reads the image from stdin. Can be given
+        more than once to upload several files
+    --source-list=<file>
+        file listing the files to upload, one file and optionally its
+        blob name per line. Empty lines and lines starting with # are
+        ignored
     --start-datetime=<start>
         Date (and optionally time) to grant access via a shared access
         signature. [default: now]
         Example format: YYYY-MM-DDThh:mm:ssZ
+    --target=<account>
+        storage account to copy the disk image to, optionally followed
+        by /<container>, default is the container of the disk image.
+        Can be given more than once to copy to several accounts
+    --target-blob-name=<blobname>
+        name of the copied disk image, default is the blob name
+    --threads=<count>
+        number of page updates kept in flight concurrently, default 1,
+        number of concurrent page downloads, default 4, or number of
+        concurrent deletes, default 8
+    --verify
+        after upload, compare the page ranges of the page blob with the
+        chunks recorded in the upload manifest
+    --xz
+        compress the downloaded image with xz, the holes of the disk
+        image are compressed as zeros then
 """
 import datetime
+import math
 from pytz import utc
 from apscheduler.schedulers.background import BackgroundScheduler
 
@@ -78,6 +182,13 @@ from azurectl.storage.storage import Storage
 from azurectl.utils.collector import DataCollector
 from azurectl.utils.output import DataOutput
 
+from azurectl.azurectl_exceptions import (
+    AzureInvalidCommand,
+    AzureStorageCopyError,
+    AzureStorageDeleteError,
+    AzureStorageUploadError
+)
+
 
 class StorageDiskTask(CliTask):
     """
@@ -114,6 +225,10 @@ class StorageDiskTask(CliTask):
 
         if self.command_args['upload']:
             self.__upload()
+        elif self.command_args['download']:
+            self.__download()
+        elif self.command_args['copy']:
+            self.__copy()
         elif self.command_args['delete']:
             self.__delete()
         elif self.command_args['sas']:
@@ -132,40 +247,193 @@ class StorageDiskTask(CliTask):
         return self.manual
 
     def __upload(self):
-        if self.command_args['--quiet']:
-            self.__upload_no_progress()
+        sources = self.__upload_sources()
+        if self.command_args['--source-list'] or len(sources) > 1:
+            self.__transfer_report(
+                self.__transfer(
+                    self.storage.print_upload_status,
+                    self.__process_upload_files, sources
+                ),
+                lambda upload: upload['blob_name'],
+                AzureStorageUploadError
+            )
         else:
-            self.__upload_with_progress()
+            image = sources[0][0]
+            self.__transfer(
+                self.storage.print_upload_status,
+                self.__process_upload, image
+            )
+            if not self.command_args['--quiet']:
+                log.info('Uploaded %s', image)
+
+    def __download(self):
+        destination = self.__transfer(
+            self.storage.print_download_status, self.__process_download
+        )
+        log.info('Downloaded %s', destination)
+
+    def __copy(self):
+        self.__transfer_report(
+            self.__transfer(
+                self.storage.print_copy_status, self.__process_copy
+            ),
+            lambda copy: '/'.join([copy['account'], copy['container']]),
+            AzureStorageCopyError
+        )
 
-    def __upload_no_progress(self):
+    def __transfer(self, print_status, transfer, *args):
+        if self.command_args['--quiet']:
+            return self.__transfer_no_progress(transfer, *args)
+        return self.__transfer_with_progress(print_status, transfer, *args)
+
+    def __transfer_no_progress(self, transfer, *args):
         try:
-            self.__process_upload()
+            return transfer(*args)
         except (KeyboardInterrupt):
             raise SystemExit('azurectl aborted by keyboard interrupt')
 
-    def __upload_with_progress(self):
-        image = self.command_args['--source']
+    def __transfer_with_progress(self, print_status, transfer, *args):
         progress = BackgroundScheduler(timezone=utc)
-        progress.add_job(
-            self.storage.print_upload_status, 'interval', seconds=3
-        )
+        progress.add_job(print_status, 'interval', seconds=3)
         progress.start()
         try:
-            self.__process_upload()
-            self.storage.print_upload_status()
+            result = transfer(*args)
+            print_status()
             progress.shutdown()
         except (KeyboardInterrupt):
             progress.shutdown()
             raise SystemExit('azurectl aborted by keyboard interrupt')
         print()
-        log.info('Uploaded %s', image)
+        return result
+
+    def __upload_sources(self):
+        if self.command_args['--source-list']:
+            sources = self.__read_source_list(
+                self.command_args['--source-list']
+            )
+        else:
+            sources = [
+                (image, self.command_args['--blob-name'])
+                for image in self.command_args['--source']
+            ]
+        if self.command_args['--source-list'] or len(sources) > 1:
+            if self.command_args['--blob-name']:
+                raise AzureInvalidCommand(
+                    '--blob-name can not be used to upload several files'
+                )
+            if '-' in [image for image, name in sources]:
+                raise AzureInvalidCommand(
+                    'stdin can not be uploaded together with other files'
+                )
+        if self.command_args['--size'] is not None and \
+                [image for image, name in sources] != ['-']:
+            raise AzureInvalidCommand(
+                '--size can only be used to upload from stdin'
+            )
+        return sources
+
+    def __read_source_list(self, source_list):
+        sources = []
+        try:
+            with open(source_list) as source_list_file:
+                for line in source_list_file:
+                    fields = line.split()
+                    if not fields or fields[0].startswith('#'):
+                        continue
+                    if len(fields) > 2:
+                        raise AzureInvalidCommand(
+                            'Invalid source list line: %s' % line.strip()
+                        )
+                    sources.append((fields[0], (fields[1:] or [None])[0]))
+        except IOError as e:
+            raise AzureInvalidCommand(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        if not sources:
+            raise AzureInvalidCommand(
+                'No files to upload in %s' % source_list
+            )
+        return sources
 
-    def __process_upload(self):
+    def __transfer_report(self, results, key, error):
+        result = DataCollector()
+        out = DataOutput(
+            result,
+            self.global_args['--output-format'],
+            self.global_args['--output-style']
+        )
+        for transfer in results:
+            result.add(key(transfer), transfer)
+        out.display()
+        failed = [
+            key(transfer) for transfer in results
+            if transfer['status'] == 'failed'
+        ]
+        if failed:
+            raise error(
+                '%d of %d transfers failed: %s' % (
+                    len(failed), len(results), ', '.join(failed)
+                )
+            )
+
+    def __process_upload_files(self, sources):
+        return self.storage.upload_files(
+            sources,
+            self.command_args['--max-uploads'],
+            self.command_args['--max-chunk-size'],
+            max_threads=self.command_args['--threads'],
+            max_page_gap=self.command_args['--max-page-gap'],
+            adaptive_chunk_size=self.command_args['--adaptive-chunk-size'],
+            max_bandwidth=self.command_args['--max-bandwidth'],
+            max_requests=self.command_args['--max-requests'],
+            resume=self.command_args['--resume'],
+            read_ahead=self.command_args['--read-ahead'],
+            delta=self.command_args['--delta'],
+            verify=self.command_args['--verify'],
+            convert_to_vhd=self.command_args['--convert-to-vhd']
+        )
+
+    def __process_upload(self, image):
         self.storage.upload(
+            image,
+            self.command_args['--blob-name'],
+            self.command_args['--max-chunk-size'],
+            max_threads=self.command_args['--threads'],
+            max_page_gap=self.command_args['--max-page-gap'],
+            adaptive_chunk_size=self.command_args['--adaptive-chunk-size'],
+            max_bandwidth=self.command_args['--max-bandwidth'],
+            max_requests=self.command_args['--max-requests'],
+            resume=self.command_args['--resume'],
+            read_ahead=self.command_args['--read-ahead'],
+            delta=self.command_args['--delta'],
+            verify=self.command_args['--verify'],
+            convert_to_vhd=self.command_args['--convert-to-vhd'],
+            size=self.command_args['--size']
+        )
+
+    def __process_download(self):
+        return self.storage.download(
+            self.command_args['--blob-name'],
+            self.command_args['--destination'],
+            self.command_args['--max-chunk-size'],
+            max_threads=self.command_args['--threads'],
+            max_bandwidth=self.command_args['--max-bandwidth'],
+            compress=self.command_args['--xz']
+        )
 
-            self.command_args['--source'],
+    def __process_copy(self):
+        targets = []
+        for target in self.command_args['--target']:
+            account_name, _, container = target.partition('/')
+            targets.append((
+                account_name,
+                self.account.storage_key(account_name),
+                container or self.storage.container
+            ))
+        return self.storage.copy(
             self.command_args['--blob-name'],
-            self.command_args['--max-chunk-size']
+            targets,
+            self.command_args['--target-blob-name']
         )
 
     def __sas(self, container_name, start, expiry, permissions):
@@ -190,5 +458,48 @@ class StorageDiskTask(CliTask):
 
     def __delete(self):
         image = self.command_args['--blob-name']
-        self.storage.delete(image)
-        log.info('Deleted %s', image)
+        prefix = self.command_args['--prefix']
+        older_than = self.__delete_older_than()
+        if not (image or prefix or older_than is not None):
+            raise AzureInvalidCommand(
+                'one of --blob-name, --prefix or --older-than is required'
+            )
+        single_image = image and not (
+            prefix or older_than is not None or self.command_args['--dry-run']
+        ) and not any(char in image for char in '*?[')
+        if single_image:
+            self.storage.delete(image)
+            log.info('Deleted %s', image)
+            return
+        self.__transfer_report(
+            self.storage.delete_blobs(
+                image,
+                prefix,
+                older_than,
+                max_threads=self.command_args['--threads'],
+                dry_run=self.command_args['--dry-run']
+            ),
+            lambda delete: delete['blob_name'],
+            AzureStorageDeleteError
+        )
+
+    def __delete_older_than(self):
+        days = self.command_args['--older-than']
+        if days is None:
+            return None
+        try:
+            older_than = float(days)
+        except ValueError:
+            older_than = -1
+        if not math.isfinite(older_than) or older_than < 0:
+            raise AzureInvalidCommand(
+                '--older-than must be a number of days, not %s' % days
+            )
+        max_days = (datetime.datetime.utcnow() - datetime.datetime.min).days
+        if older_than > max_days:
+            raise AzureInvalidCommand(
+                '--older-than must be at most %d days, not %s' % (
+                    max_days, days
+                )
+            )
+        return older_than
@@ -73,6 +73,13 @@ class ConfigFilePath(object):
         )
         return list(glob.iglob(glob_match))
 
+    def cache_directory(self):
+        """
+            The fully qualified path of the directory which holds
+            data azurectl keeps between calls, e.g upload journals
+        """
+        return self.__home_path() + '/.cache/azurectl'
+
     def __home_path(self):
         homeEnvVar = 'HOME'
         if self.platform == 'win':
@@ -0,0 +1,118 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+
+
+class AdaptiveChunkSize(object):
+    """
+        Size of the page update requests of an upload, adapted to
+        the observed request throughput and failures. The results of
+        the requests are evaluated in windows of WINDOW requests:
+
+        * a window with failed requests halves the size, because
+          every retry of a large request sends a lot of data again
+        * a window whose throughput did not drop after the size was
+          increased doubles the size again
+        * a window whose throughput dropped after the size was
+          increased halves the size, which is then kept as ceiling
+          for HOLD_WINDOWS windows before a larger size is probed
+
+        The size stays between min_size and max_size, which is capped
+        to the MAX_SIZE of a single page write. Only requests of at
+        least half the current size measure the throughput. Sparse
+        data is sent in small requests of its data ranges whatever
+        the size is, such that their latency dominated throughput
+        does not tell about the size
+    """
+    PAGE_SIZE = 512
+    MIN_SIZE = 65536
+    MAX_SIZE = 4194304
+    WINDOW = 8
+    HOLD_WINDOWS = 16
+    THROUGHPUT_TOLERANCE = 0.9
+
+    def __init__(self, max_size, min_size=MIN_SIZE):
+        self.max_size = self.__align(min(int(max_size), self.MAX_SIZE))
+        self.min_size = self.__align(min(int(min_size), self.max_size))
+        self.size = self.max_size
+        self.ceiling = self.max_size
+        self.hold_windows = 0
+        self.throughput = None
+        self.increased = False
+        self.lock = threading.Lock()
+        self.__reset_window()
+
+    def current(self):
+        """
+            Current size of a page update request
+        """
+        return self.size
+
+    def record(self, byte_count, seconds):
+        """
+            Record a successful request of byte_count bytes which
+            took the given seconds
+        """
+        with self.lock:
+            self.window_requests += 1
+            if byte_count * 2 >= self.size:
+                self.window_bytes += byte_count
+                self.window_seconds += seconds
+            self.__evaluate_window()
+
+    def record_error(self):
+        """
+            Record a failed request
+        """
+        with self.lock:
+            self.window_errors += 1
+            self.__evaluate_window()
+
+    def __evaluate_window(self):
+        if self.window_requests + self.window_errors < self.WINDOW:
+            return
+        if self.hold_windows:
+            self.hold_windows -= 1
+            if not self.hold_windows:
+                self.ceiling = self.max_size
+        if self.window_errors:
+            self.__decrease()
+            self.throughput = None
+        elif self.window_seconds:
+            throughput = self.window_bytes / self.window_seconds
+            if self.increased and \
+                    throughput < self.throughput * self.THROUGHPUT_TOLERANCE:
+                self.__decrease()
+            elif self.size < self.ceiling:
+                self.size = min(self.size * 2, self.ceiling)
+                self.increased = True
+            else:
+                self.increased = False
+            self.throughput = throughput
+        self.__reset_window()
+
+    def __decrease(self):
+        self.size = max(self.__align(self.size // 2), self.min_size)
+        self.ceiling = self.size
+        self.hold_windows = self.HOLD_WINDOWS
+        self.increased = False
+
+    def __reset_window(self):
+        self.window_requests = 0
+        self.window_errors = 0
+        self.window_bytes = 0
+        self.window_seconds = 0.0
+
+    def __align(self, size):
+        return max(size - size % self.PAGE_SIZE, self.PAGE_SIZE)
@@ -0,0 +1,80 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+class BlobCopy(object):
+    """
+        Server side copy of a blob to a container of a storage
+        account. The storage service copies the data asynchronously,
+        the state of the copy is polled from the properties of the
+        target blob
+    """
+    PENDING = 'pending'
+    SUCCESS = 'success'
+    FAILED = 'failed'
+    MAX_POLL_ERRORS = 5
+
+    def __init__(self, blob_service, container, blob_name):
+        self.blob_service = blob_service
+        self.container = container
+        self.blob_name = blob_name
+        self.status = None
+        self.error = None
+        self.copied_bytes = 0
+        self.poll_errors = 0
+
+    def start(self, copy_source):
+        """
+            Start the copy from the copy_source URL. A copy within the
+            same storage account may be done when it is started
+        """
+        try:
+            self.__update(
+                self.blob_service.copy_blob(
+                    self.container, self.blob_name, copy_source
+                )
+            )
+        except Exception as e:
+            self.__fail(e)
+
+    def poll(self):
+        """
+            Update the state of a pending copy. A copy fails only if
+            the state can not be polled several times in a row
+        """
+        try:
+            self.__update(
+                self.blob_service.get_blob_properties(
+                    self.container, self.blob_name
+                ).properties.copy
+            )
+            self.poll_errors = 0
+        except Exception as e:
+            self.poll_errors += 1
+            if self.poll_errors == self.MAX_POLL_ERRORS:
+                self.__fail(e)
+
+    def is_pending(self):
+        return self.status == self.PENDING
+
+    def __update(self, copy):
+        self.status = copy.status
+        if copy.progress:
+            self.copied_bytes = int(copy.progress.split('/')[0])
+        if self.status not in (self.PENDING, self.SUCCESS):
+            self.error = copy.status_description
+
+    def __fail(self, error):
+        self.status = self.FAILED
+        self.error = '%s: %s' % (type(error).__name__, format(error))
@@ -15,6 +15,7 @@ from azure.storage.blob.baseblobservice import BaseBlobService
 from azure.storage.sharedaccesssignature import SharedAccessSignature
 
 # project
+from azurectl.storage.container_usage import ContainerUsage
 from azurectl.azurectl_exceptions import (
     AzureCannotInit,
     AzureContainerListError,
@@ -30,6 +31,9 @@ class Container(object):
     """
         Information from Azure storage containers
     """
+    # max number of blobs the storage service returns per listing request
+    MAX_PAGE_SIZE = 5000
+
     def __init__(
         self,
         account=None,
@@ -114,20 +118,58 @@ class Container(object):
         return True
 
     def content(self, container):
-        result = {container: []}
+        return {
+            container: [format(blob['name']) for blob in self.blobs(container)]
+        }
+
+    def usage(self, container, top=10, now=None):
+        """
+            Usage statistics of the container, computed in one pass
+            over the listing of its blobs
+        """
+        usage = ContainerUsage(container, top, now)
+        for blob in self.blobs(container):
+            usage.add(blob)
+        return usage
+
+    def blobs(self, container, prefix=None, max_results=None):
+        """
+            Iterate over the blobs of the container whose name starts
+            with prefix, up to max_results blobs. The blobs are listed
+            page by page following the continuation marker of each
+            page, only the current page is held in memory
+        """
         blob_service = BaseBlobService(
             self.account_name,
             self.account_key,
             endpoint_suffix=self.blob_service_host_base
         )
-        try:
-            for blob in blob_service.list_blobs(container):
-                result[container].append(format(blob.name))
-            return result
-        except Exception as e:
-            raise AzureContainerListContentError(
-                '%s: %s' % (type(e).__name__, format(e))
-            )
+        marker = None
+        remaining = None if max_results is None else int(max_results)
+        while remaining is None or remaining > 0:
+            try:
+                page = blob_service.list_blobs(
+                    container, prefix=prefix, marker=marker,
+                    num_results=min(
+                        self.MAX_PAGE_SIZE, remaining or self.MAX_PAGE_SIZE
+                    )
+                )
+            except Exception as e:
+                raise AzureContainerListContentError(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
+            for blob in page.items:
+                yield {
+                    'name': blob.name,
+                    'byte_size': blob.properties.content_length,
+                    'last_modified': blob.properties.last_modified,
+                    'blob_type': blob.properties.blob_type
+                }
+            if remaining is not None:
+                remaining -= len(page.items)
+            marker = page.next_marker
+            if not marker:
+                break
 
     def sas(self, container, start, expiry, permissions):
         sas = SharedAccessSignature(
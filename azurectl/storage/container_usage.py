@@ -0,0 +1,115 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import datetime
+import heapq
+
+ISO8061_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+class ContainerUsage(object):
+    """
+        Usage statistics of the blobs of a container, aggregated blob
+        by blob while the container is listed. The memory used does
+        not grow with the number of blobs, only the largest top blobs
+        are kept in a heap
+    """
+    PAGE_BLOB = 'PageBlob'
+    # blobs are counted in the bucket of the first age in days
+    # they are younger than
+    AGE_BUCKETS = [
+        ('day', 1),
+        ('week', 7),
+        ('month', 30),
+        ('quarter', 90),
+        ('year', 365)
+    ]
+    OLDER = 'older'
+
+    def __init__(self, container, top=10, now=None):
+        self.container = container
+        self.top = int(top)
+        self.now = now or datetime.datetime.now(datetime.timezone.utc)
+        self.blob_count = 0
+        self.byte_size = 0
+        self.page_blob_count = 0
+        self.page_blob_byte_size = 0
+        self.age = {}
+        for bucket in [name for name, days in self.AGE_BUCKETS] + [self.OLDER]:
+            self.age[bucket] = {'blob_count': 0, 'byte_size': 0}
+        # min heap of the largest blobs, the smallest of them on top
+        self.largest = []
+
+    def add(self, blob):
+        """
+            Count a blob as listed by Container.blobs
+        """
+        self.blob_count += 1
+        self.byte_size += blob['byte_size']
+        if blob['blob_type'] == self.PAGE_BLOB:
+            self.page_blob_count += 1
+            self.page_blob_byte_size += blob['byte_size']
+        age = self.age[self.__age_bucket(blob['last_modified'])]
+        age['blob_count'] += 1
+        age['byte_size'] += blob['byte_size']
+        self.__add_largest((
+            blob['byte_size'], self.container, blob['name'],
+            blob['last_modified']
+        ))
+
+    def merge(self, usage):
+        """
+            Add the statistics of another usage, e.g of another
+            container of the same storage account
+        """
+        self.blob_count += usage.blob_count
+        self.byte_size += usage.byte_size
+        self.page_blob_count += usage.page_blob_count
+        self.page_blob_byte_size += usage.page_blob_byte_size
+        for bucket, age in usage.age.items():
+            self.age[bucket]['blob_count'] += age['blob_count']
+            self.age[bucket]['byte_size'] += age['byte_size']
+        for largest in usage.largest:
+            self.__add_largest(largest)
+
+    def report(self):
+        return {
+            'blob_count': self.blob_count,
+            'byte_size': self.byte_size,
+            'page_blob_count': self.page_blob_count,
+            'page_blob_byte_size': self.page_blob_byte_size,
+            'age': self.age,
+            'largest': [
+                {
+                    'container': container,
+                    'name': name,
+                    'byte_size': byte_size,
+                    'last_modified': last_modified.strftime(ISO8061_FORMAT)
+                } for byte_size, container, name, last_modified in sorted(
+                    self.largest, reverse=True
+                )
+            ]
+        }
+
+    def __add_largest(self, largest):
+        if len(self.largest) < self.top:
+            heapq.heappush(self.largest, largest)
+        elif self.top and largest > self.largest[0]:
+            heapq.heapreplace(self.largest, largest)
+
+    def __age_bucket(self, last_modified):
+        age = self.now - last_modified
+        for name, days in self.AGE_BUCKETS:
+            if age < datetime.timedelta(days=days):
+                return name
+        return self.OLDER
@@ -11,8 +11,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import hashlib
+import threading
+import time
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    FIRST_COMPLETED,
+    wait
+)
+
+# project
+from azurectl.utils.rate_limit import RateLimit
 from azurectl.azurectl_exceptions import (
-    AzurePageBlobZeroPageError,
     AzurePageBlobAlignmentViolation,
     AzurePageBlobSetupError,
     AzurePageBlobUpdateError
@@ -23,21 +33,63 @@ class PageBlob(object):
     """
         Page blob iterator to control a stream of data to an Azure page blob
     """
-    def __init__(self, blob_service, blob_name, container, byte_size):
+    PAGE_SIZE = 512
+    PAGE_SCAN_SIZE = 65536
+    ZERO_BUFFER = memoryview(bytes(PAGE_SCAN_SIZE))
+    MAX_PAGE_GAP = 65536
+    MAX_BYTE_SIZE = 8796093022208
+
+    def __init__(
+        self, blob_service, blob_name, container, byte_size, max_threads=1,
+        max_page_gap=MAX_PAGE_GAP, journal=None, manifest=None,
+        adaptive_chunk_size=None, rate_limit=None
+    ):
         """
             Create a new page blob of the specified byte_size with
-            name blob_name in the specified container. An azure page
-            blob must be 512 byte aligned
+            name blob_name in the specified container, or reuse the
+            existing page blob of a resumed or delta upload
         """
         self.container = container
         self.blob_service = blob_service
         self.blob_name = blob_name
 
+        if max_page_gap is None:
+            max_page_gap = self.MAX_PAGE_GAP
+        self.max_page_gap = int(max_page_gap)
+
         self.__validate_page_alignment(byte_size)
 
         self.rest_bytes = byte_size
         self.page_start = 0
 
+        self.max_threads = max(int(max_threads or 1), 1)
+        self.uploaded_bytes = 0
+        self.uploaded_bytes_lock = threading.Lock()
+        self.pending_uploads = set()
+        self.upload_pool = None
+        if self.max_threads > 1:
+            self.upload_pool = ThreadPoolExecutor(
+                max_workers=self.max_threads
+            )
+
+        self.adaptive_chunk_size = adaptive_chunk_size
+        self.rate_limit = rate_limit or RateLimit()
+        self.journal = journal
+        self.manifest = manifest
+        self.byte_size = byte_size
+        # the manifest chunk whose digest is computed, it starts at
+        # the first position read
+        self.chunk_start = None
+        if self.journal and self.journal.is_resumable():
+            if self.__existing_blob_size() == byte_size:
+                return
+            self.journal.reset()
+
+        if self.manifest and self.manifest.etag:
+            if self.__reuse_blob(byte_size):
+                return
+            self.manifest.discard_previous()
+
         try:
             self.blob_service.create_blob(
                 self.container, self.blob_name, byte_size
@@ -48,69 +100,384 @@ class PageBlob(object):
             )
 
     def next(self, data_stream, max_chunk_byte_size=None, max_attempts=5):
-        if not max_chunk_byte_size:
+        """
+            Read the next chunk from data_stream and write it to the
+            page blob. Returns the number of bytes which are known to
+            be stored in the page blob so far
+        """
+        if self.manifest:
+            max_chunk_byte_size = self.manifest.chunk_size
+        elif not max_chunk_byte_size:
             max_chunk_byte_size = self.blob_service.MAX_CHUNK_GET_SIZE
         max_chunk_byte_size = int(max_chunk_byte_size)
 
+        if self.manifest and self.chunk_start is None:
+            self.__start_chunk(self.page_start)
+
+        committed_size = self.__skip_committed(
+            data_stream, max_chunk_byte_size
+        )
+        if committed_size:
+            self.rest_bytes -= committed_size
+            self.page_start += committed_size
+            self.__add_uploaded_bytes(committed_size)
+            if self.manifest:
+                # the chunk is not recorded in the manifest, which
+                # thus does not cover a resumed upload
+                self.__start_chunk(self.page_start)
+            return self.uploaded_bytes
+
+        hole_size = self.__skip_hole(data_stream)
+        if hole_size:
+            if self.manifest:
+                self.__add_chunk_hole(self.page_start, hole_size, max_attempts)
+            else:
+                self.__commit(self.page_start, hole_size)
+                self.__add_uploaded_bytes(hole_size)
+            self.rest_bytes -= hole_size
+            self.page_start += hole_size
+            return self.uploaded_bytes
+
         requested_bytes = min(
             self.rest_bytes, max_chunk_byte_size
         )
-
-        if requested_bytes != max_chunk_byte_size:
-            zero_page = self.__read_zero_page(requested_bytes)
-        else:
-            zero_page = self.__read_zero_page(max_chunk_byte_size)
+        if self.manifest:
+            # reads never cross the manifest chunk boundaries
+            requested_bytes = min(
+                requested_bytes, self.__chunk_end() - self.page_start
+            )
 
         data = data_stream.read(requested_bytes)
 
         if not data:
+            if self.manifest and self.page_start > self.chunk_start:
+                # the data ended within the chunk
+                self.__complete_chunk(self.page_start, max_attempts)
+            self.__wait_for_uploads()
             raise StopIteration()
 
         length = len(data)
-        page_end = self.page_start + length - 1
-
-        if not data == zero_page:
-            upload_errors = []
-            while len(upload_errors) < max_attempts:
-                try:
-                    self.blob_service.update_page(
-                        self.container,
-                        self.blob_name,
-                        data,
-                        self.page_start,
-                        page_end
-                    )
-                    break
-                except Exception as e:
-                    upload_errors.append(
-                        '%s: %s' % (type(e).__name__, format(e))
-                    )
-
-            if len(upload_errors) == max_attempts:
-                raise AzurePageBlobUpdateError(
-                    'Page update failed with: %s' % '\n'.join(upload_errors)
-                )
+        page_start = self.page_start
 
         self.rest_bytes -= length
         self.page_start += length
 
-        return self.page_start
+        # zero pages are not transfered, they are already
+        # zero in the newly created page blob
+        data_ranges = self.__non_zero_ranges(data)
+        if self.manifest:
+            data_ranges = self.__add_chunk_data(
+                data, page_start, data_ranges, max_attempts
+            )
+            if data_ranges is None:
+                return self.uploaded_bytes
+        self.__add_uploaded_bytes(
+            length - sum(end - start for start, end in data_ranges)
+        )
+        self.__upload_ranges(data, page_start, data_ranges, max_attempts)
+
+        return self.uploaded_bytes
 
     def __iter__(self):
         return self
 
+    def __skip_hole(self, data_stream):
+        # sparse aware streams tell about holes in the data, such
+        # that they can be skipped without reading them
+        if not hasattr(data_stream, 'skip_hole'):
+            return 0
+        return min(data_stream.skip_hole(), self.rest_bytes)
+
+    def __upload_ranges(self, data, page_start, data_ranges, max_attempts):
+        if not data_ranges:
+            self.__commit(page_start, len(data))
+        elif self.upload_pool:
+            self.__wait_for_upload_slot()
+            self.pending_uploads.add(
+                self.upload_pool.submit(
+                    self.__update_pages,
+                    data, page_start, data_ranges, max_attempts
+                )
+            )
+        else:
+            self.__update_pages(data, page_start, data_ranges, max_attempts)
+
+    def __start_chunk(self, chunk_start):
+        self.chunk_start = chunk_start
+        self.chunk_previous = self.manifest.previous_chunk(chunk_start)
+        self.chunk_digest = None
+        self.chunk_digested = chunk_start
+        self.chunk_pages = []
+
+    def __chunk_end(self):
+        chunk_size = self.manifest.chunk_size
+        return min(
+            self.chunk_start - self.chunk_start % chunk_size + chunk_size,
+            self.byte_size
+        )
+
+    def __chunk_deferred(self):
+        # a changed chunk must overwrite the data of the former upload
+        # in its zero pages too, it is written once it is complete
+        return bool(self.chunk_previous and self.chunk_previous[1])
+
+    def __add_chunk_data(self, data, page_start, data_ranges, max_attempts):
+        """
+            Add the data read at page_start to the digest of its
+            manifest chunk. Returns the data ranges to upload, or None
+            if the data is written once its chunk is complete
+        """
+        deferred = self.__chunk_deferred()
+        if data_ranges:
+            self.__digest(page_start, data)
+            if deferred:
+                self.chunk_pages.append((page_start, data))
+        self.__end_chunk_range(page_start + len(data), max_attempts)
+        if deferred:
+            return None
+        return data_ranges
+
+    def __add_chunk_hole(self, page_start, length, max_attempts):
+        # holes are committed at once, except for the parts of
+        # chunks which are written once they are complete
+        hole_end = page_start + length
+        commit_start = page_start
+        while page_start < hole_end:
+            range_end = min(hole_end, self.__chunk_end())
+            if self.__chunk_deferred():
+                self.__commit_hole(commit_start, page_start)
+                commit_start = range_end
+            self.__end_chunk_range(range_end, max_attempts)
+            page_start = range_end
+        self.__commit_hole(commit_start, hole_end)
+
+    def __commit_hole(self, start, end):
+        if end > start:
+            self.__commit(start, end - start)
+            self.__add_uploaded_bytes(end - start)
+
+    def __end_chunk_range(self, position, max_attempts):
+        if position == self.__chunk_end():
+            self.__complete_chunk(position, max_attempts)
+            self.__start_chunk(position)
+
+    def __digest(self, page_start, data):
+        # holes and zero pages in front of the data are digested
+        # from a zero buffer instead of being read
+        if self.chunk_digest is None:
+            self.chunk_digest = hashlib.md5()
+        zero_bytes = page_start - self.chunk_digested
+        while zero_bytes:
+            zeros = self.ZERO_BUFFER[:min(zero_bytes, len(self.ZERO_BUFFER))]
+            self.chunk_digest.update(zeros)
+            zero_bytes -= len(zeros)
+        self.chunk_digest.update(data)
+        self.chunk_digested = page_start + len(data)
+
+    def __complete_chunk(self, chunk_end, max_attempts):
+        """
+            Record the digest of the chunk in the manifest. A chunk
+            whose former upload holds data is cleared if it is zero
+            now, or written as a whole if it changed
+        """
+        length = chunk_end - self.chunk_start
+        digest = None
+        if self.chunk_digest is not None:
+            self.__digest(chunk_end, b'')
+            digest = self.chunk_digest.digest()
+        self.manifest.add(self.chunk_start, length, digest)
+        if not self.__chunk_deferred():
+            return
+        if self.chunk_previous == (length, digest):
+            self.__commit(self.chunk_start, length)
+            self.__add_uploaded_bytes(length)
+        elif not digest:
+            self.__clear_pages(self.chunk_start, length, max_attempts)
+            self.__commit(self.chunk_start, length)
+            self.__add_uploaded_bytes(length)
+        else:
+            data = bytearray(length)
+            for page_start, page in self.chunk_pages:
+                offset = page_start - self.chunk_start
+                data[offset:offset + len(page)] = page
+            self.__upload_ranges(
+                bytes(data), self.chunk_start, [[0, length]], max_attempts
+            )
+
+    def __skip_committed(self, data_stream, max_chunk_byte_size):
+        # ranges committed by a former upload are skipped in the
+        # data stream but not uploaded again
+        if not self.journal:
+            return 0
+        committed_size = min(
+            self.journal.committed_range_size(self.page_start),
+            self.rest_bytes
+        )
+        if committed_size and hasattr(data_stream, 'seek'):
+            data_stream.seek(self.page_start + committed_size)
+        else:
+            skip_bytes = committed_size
+            while skip_bytes:
+                data = data_stream.read(min(skip_bytes, max_chunk_byte_size))
+                if not data:
+                    break
+                skip_bytes -= len(data)
+        return committed_size
+
+    def __commit(self, page_start, length):
+        if self.journal:
+            self.journal.commit(page_start, page_start + length)
+
+    def __reuse_blob(self, byte_size):
+        try:
+            properties = self.blob_service.get_blob_properties(
+                self.container, self.blob_name
+            ).properties
+        except Exception:
+            return False
+        if properties.etag != self.manifest.etag:
+            return False
+        if properties.content_length != byte_size:
+            try:
+                self.blob_service.resize_blob(
+                    self.container, self.blob_name, byte_size
+                )
+            except Exception as e:
+                raise AzurePageBlobSetupError(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
+        return True
+
+    def __existing_blob_size(self):
+        try:
+            return self.blob_service.get_blob_properties(
+                self.container, self.blob_name
+            ).properties.content_length
+        except Exception:
+            return None
+
+    def __update_pages(self, data, page_start, data_ranges, max_attempts):
+        length = len(data)
+        for data_start, data_end in self.__split_ranges(data_ranges):
+            if data_start or data_end != length:
+                page = data[data_start:data_end]
+            else:
+                page = data
+            self.__update_page(page, page_start + data_start, max_attempts)
+        self.__commit(page_start, length)
+
+    def __split_ranges(self, data_ranges):
+        if not self.adaptive_chunk_size:
+            return data_ranges
+        split_ranges = []
+        for data_start, data_end in data_ranges:
+            request_size = self.adaptive_chunk_size.current()
+            for start in range(data_start, data_end, request_size):
+                split_ranges.append([start, min(start + request_size, data_end)])
+        return split_ranges
+
+    def __update_page(self, data, page_start, max_attempts):
+        # the page is sent with its MD5 as Content-MD5, such that a
+        # page corrupted in transfer is rejected and sent again
+        length = len(data)
+        update_page = self.blob_service.update_page
+        if self.adaptive_chunk_size:
+            update_page = self.__measured_update_page
+        self.rate_limit.retry(
+            AzurePageBlobUpdateError, 'Page update failed with',
+            max_attempts, length, update_page,
+            self.container,
+            self.blob_name,
+            data,
+            page_start,
+            page_start + length - 1,
+            validate_content=True
+        )
+        self.__add_uploaded_bytes(length)
+
+    def __measured_update_page(self, *args, **kwargs):
+        start = time.time()
+        try:
+            result = self.blob_service.update_page(*args, **kwargs)
+        except Exception:
+            self.adaptive_chunk_size.record_error()
+            raise
+        self.adaptive_chunk_size.record(len(args[2]), time.time() - start)
+        return result
+
+    def __clear_pages(self, page_start, length, max_attempts):
+        self.rate_limit.retry(
+            AzurePageBlobUpdateError, 'Page clear failed with',
+            max_attempts, 0, self.blob_service.clear_page,
+            self.container,
+            self.blob_name,
+            page_start,
+            page_start + length - 1
+        )
+
+    def __non_zero_ranges(self, data):
+        """
+            List of [start, end] offsets of the non-zero pages in the
+            chunk. Ranges with a gap of up to max_page_gap zero bytes
+            are merged. The chunk is scanned in blocks first, such that
+            only blocks with a mix of zero and data pages are checked
+            page by page. Counting the zero bytes in place requires no
+            extra buffer
+        """
+        data_ranges = []
+        length = len(data)
+        for block_start in range(0, length, self.PAGE_SCAN_SIZE):
+            block_end = min(block_start + self.PAGE_SCAN_SIZE, length)
+            zero_bytes = data.count(0, block_start, block_end)
+            if zero_bytes == block_end - block_start:
+                continue
+            smallest_page = (block_end - block_start) % self.PAGE_SIZE
+            if zero_bytes < (smallest_page or self.PAGE_SIZE):
+                self.__add_range(data_ranges, block_start, block_end)
+                continue
+            for page_start in range(block_start, block_end, self.PAGE_SIZE):
+                page_end = min(page_start + self.PAGE_SIZE, block_end)
+                if data.count(0, page_start, page_end) != \
+                        page_end - page_start:
+                    self.__add_range(data_ranges, page_start, page_end)
+        return data_ranges
+
+    def __add_range(self, data_ranges, start, end):
+        if data_ranges and start - data_ranges[-1][1] <= self.max_page_gap:
+            data_ranges[-1][1] = end
+        else:
+            data_ranges.append([start, end])
+
+    def __add_uploaded_bytes(self, byte_count):
+        with self.uploaded_bytes_lock:
+            self.uploaded_bytes += byte_count
+
+    def __wait_for_upload_slot(self):
+        if len(self.pending_uploads) >= self.max_threads:
+            done, self.pending_uploads = wait(
+                self.pending_uploads, return_when=FIRST_COMPLETED
+            )
+            self.__check_uploads(done)
+
+    def __wait_for_uploads(self):
+        if self.upload_pool:
+            done, self.pending_uploads = wait(self.pending_uploads)
+            self.__check_uploads(done)
+            self.upload_pool.shutdown()
+
+    def __check_uploads(self, done):
+        for upload in done:
+            try:
+                upload.result()
+            except Exception:
+                for pending in self.pending_uploads:
+                    pending.cancel()
+                self.upload_pool.shutdown(wait=False)
+                raise
+
     def __validate_page_alignment(self, byte_size):
         remainder = byte_size % 512
         if remainder != 0:
             raise AzurePageBlobAlignmentViolation(
                 'Uncompressed size %d is not 512 byte aligned' % byte_size
             )
-
-    def __read_zero_page(self, requested_bytes):
-        try:
-            with open('/dev/zero', 'rb') as zero_stream:
-                return zero_stream.read(requested_bytes)
-        except Exception as e:
-            raise AzurePageBlobZeroPageError(
-                'Reading zero page failed with: %s' % format(e)
-            )
@@ -0,0 +1,131 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# project
+from azurectl.utils.rate_limit import RateLimit
+from azurectl.azurectl_exceptions import AzurePageBlobDownloadError
+
+
+class PageBlobDownload(object):
+    """
+        Download of the data of an Azure page blob. Only the page
+        ranges the page blob holds data for are downloaded, the
+        remaining pages of the page blob read as zeros
+    """
+    PAGE_RANGE_QUERY_SIZE = 68719476736
+    MAX_THREADS = 4
+
+    def __init__(
+        self, blob_service, blob_name, container, max_chunk_size=None,
+        max_threads=None, rate_limit=None
+    ):
+        """
+            Look up the size and the valid page ranges of the page
+            blob blob_name in the specified container. The page
+            ranges are split into chunks of up to max_chunk_size
+            bytes, up to max_threads chunks, by default 4, are
+            downloaded concurrently. The page ranges of a large page
+            blob are queried in segments, since the query of a
+            fragmented page blob can exceed the server timeout
+        """
+        self.blob_service = blob_service
+        self.blob_name = blob_name
+        self.container = container
+        self.max_threads = max(int(max_threads or self.MAX_THREADS), 1)
+        # ranges up to the max chunk get size are validated by the
+        # Content-MD5 of the response
+        self.max_chunk_size = min(
+            int(max_chunk_size or blob_service.MAX_CHUNK_GET_SIZE),
+            blob_service.MAX_CHUNK_GET_SIZE
+        )
+        self.rate_limit = rate_limit or RateLimit()
+        try:
+            self.byte_size = self.blob_service.get_blob_properties(
+                self.container, self.blob_name
+            ).properties.content_length
+            self.chunks = self.__chunks(self.__page_ranges())
+        except Exception as e:
+            raise AzurePageBlobDownloadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        self.data_byte_size = sum(end - start for start, end in self.chunks)
+
+    def read(self, max_attempts=5):
+        """
+            Iterate over the (offset, data) chunks of the page blob in
+            the order of their offsets. The next chunks are downloaded
+            while the current chunk is consumed
+        """
+        with ThreadPoolExecutor(max_workers=self.max_threads) as pool:
+            pending = deque()
+            try:
+                for start, end in self.chunks:
+                    pending.append((start, pool.submit(
+                        self.__get_range, start, end, max_attempts
+                    )))
+                    if len(pending) > self.max_threads:
+                        offset, download = pending.popleft()
+                        yield offset, download.result()
+                while pending:
+                    offset, download = pending.popleft()
+                    yield offset, download.result()
+            finally:
+                for offset, download in pending:
+                    download.cancel()
+
+    def __page_ranges(self):
+        page_ranges = []
+        for segment_start in range(
+            0, self.byte_size, self.PAGE_RANGE_QUERY_SIZE
+        ):
+            segment_end = min(
+                segment_start + self.PAGE_RANGE_QUERY_SIZE, self.byte_size
+            )
+            for page_range in self.blob_service.get_page_ranges(
+                self.container, self.blob_name,
+                start_range=segment_start, end_range=segment_end - 1
+            ):
+                if not page_range.is_cleared:
+                    page_ranges.append((page_range.start, page_range.end + 1))
+        return page_ranges
+
+    def __chunks(self, page_ranges):
+        chunks = []
+        for start, end in page_ranges:
+            for chunk_start in range(start, end, self.max_chunk_size):
+                chunks.append(
+                    (chunk_start, min(chunk_start + self.max_chunk_size, end))
+                )
+        return chunks
+
+    def __get_range(self, start, end, max_attempts):
+        return self.rate_limit.retry(
+            AzurePageBlobDownloadError,
+            'Download of bytes %d-%d failed with' % (start, end - 1),
+            max_attempts, end - start, self.__get_range_data, start, end
+        )
+
+    def __get_range_data(self, start, end):
+        data = self.blob_service.get_blob_to_bytes(
+            self.container, self.blob_name,
+            start_range=start, end_range=end - 1,
+            validate_content=True, max_connections=1
+        ).content
+        if len(data) != end - start:
+            raise AzurePageBlobDownloadError(
+                'Got %d of %d bytes' % (len(data), end - start)
+            )
+        return data
@@ -11,30 +11,74 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import datetime
+import fnmatch
+import lzma
 import os
+import re
+import sys
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from azure.common import AzureMissingResourceHttpError
 from azure.storage.blob.pageblobservice import PageBlobService
 from azure.storage.sharedaccesssignature import SharedAccessSignature
 
 # project
-from azurectl.utils.xz import XZ
+from azurectl.utils.xz import XZ, LZMA, ParallelXZ
+from azurectl.utils.decompressor import GZip, BZip2, ZStd
+from azurectl.utils.xz_index import XZIndex
 from azurectl.azurectl_exceptions import (
+    AzureStorageCopyError,
     AzureStorageFileNotFound,
     AzureStorageStreamError,
     AzureStorageUploadError,
-    AzureStorageDeleteError
+    AzureStorageDeleteError,
+    AzureStorageDownloadError,
+    AzureStorageVerifyError,
+    AzureUploadManifestError,
+    AzureXZIndexError
 )
 from azurectl.utils.filetype import FileType
+from azurectl.utils.sparse_file import SparseFile
+from azurectl.utils.pipe_stream import PipeStream
+from azurectl.utils.qcow2 import Qcow2
+from azurectl.utils.vhd import FixedVHD
+from azurectl.utils.read_ahead import ReadAhead
+from azurectl.utils.rate_limit import RateLimit
 from azurectl.storage.page_blob import PageBlob
+from azurectl.storage.page_blob_download import PageBlobDownload
+from azurectl.storage.blob_copy import BlobCopy
+from azurectl.storage.container import Container
+from azurectl.storage.adaptive_chunk_size import AdaptiveChunkSize
+from azurectl.storage.upload_journal import UploadJournal
+from azurectl.storage.upload_manifest import UploadManifest
 from azurectl.logger import log
 
 
 ISO8061_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
+DECOMPRESSORS = {
+    'xz': XZ,
+    'lzma': LZMA,
+    'gzip': GZip,
+    'bzip2': BZip2,
+    'zstd': ZStd
+}
+
 
 class Storage(object):
     """
         Implements storage operations in Azure storage containers
     """
+    MAX_UPLOADS = 4
+    MAX_COPY_REQUESTS = 8
+    MAX_DELETES = 8
+    COPY_POLL_INTERVAL = 5
+    # the storage service times out a pending copy after two weeks
+    COPY_SAS_EXPIRY = datetime.timedelta(days=14)
+
     def __init__(self, account, container):
         self.account = account
         self.account_name = account.storage_name()
@@ -42,46 +86,233 @@ class Storage(object):
         self.blob_service_host_base = self.account.get_blob_service_host_base()
         self.container = container
         self.upload_status = {'current_bytes': 0, 'total_bytes': 0}
+        self.upload_statuses = {}
+        self.upload_status_lock = threading.Lock()
+        self.download_status = {'current_bytes': 0, 'total_bytes': 0}
+        self.copy_status = {'current_bytes': 0, 'total_bytes': 0}
 
-    def upload(self, image, name=None, max_chunk_size=None, max_attempts=5):
-        if not os.path.exists(image):
+    def upload(
+        self, image, name=None, max_chunk_size=None, max_attempts=5,
+        max_threads=1, max_page_gap=None, resume=False, read_ahead=None,
+        delta=False, verify=False, adaptive_chunk_size=False,
+        max_bandwidth=None, max_requests=None, convert_to_vhd=False,
+        size=None
+    ):
+        """
+            Upload the image file to a page blob. An image of - is
+            read from stdin, with the given size or up to its end, in
+            which case the page blob is cut to the size of the data
+            after the upload
+        """
+        if image == '-':
+            self.__validate_pipe_upload(name, resume)
+        elif size is not None:
+            raise AzureStorageUploadError(
+                'A size can only be given for an upload from stdin'
+            )
+        elif not os.path.exists(image):
             raise AzureStorageFileNotFound('File %s not found' % image)
-        blob_service = PageBlobService(
-            self.account_name,
-            self.account_key,
-            endpoint_suffix=self.blob_service_host_base
+        self.__upload(
+            self.__page_blob_service(max_threads),
+            RateLimit(max_bandwidth, max_requests),
+            image, name, max_chunk_size, max_attempts, max_threads,
+            max_page_gap, resume, read_ahead, delta, verify,
+            adaptive_chunk_size, convert_to_vhd, size
         )
 
-        image_type = FileType(image)
-        blob_name = (name or image_type.basename())
-        if not name:
-            log.info('blob-name: %s', blob_name)
-        image_size = self.__upload_byte_size(image, image_type)
+    def upload_files(
+        self, sources, max_uploads=None, max_chunk_size=None,
+        max_attempts=5, max_threads=1, max_page_gap=None, resume=False,
+        read_ahead=None, delta=False, verify=False,
+        adaptive_chunk_size=False, max_bandwidth=None, max_requests=None,
+        convert_to_vhd=False
+    ):
+        """
+            Upload the image files of the list of (image, name) sources
+            concurrently, up to max_uploads at a time. All uploads share
+            one connection pool and the bandwidth and request rate
+            limits. A failed upload does not stop the others, the result
+            of each upload is returned in the order of the sources
+        """
+        max_uploads = max(int(max_uploads or self.MAX_UPLOADS), 1)
+        blob_names = []
+        for image, name in sources:
+            if not os.path.exists(image):
+                raise AzureStorageFileNotFound('File %s not found' % image)
+            blob_name = self.__blob_name(FileType(image), name, convert_to_vhd)
+            if blob_name in blob_names:
+                raise AzureStorageUploadError(
+                    'More than one source is uploaded to %s' % blob_name
+                )
+            blob_names.append(blob_name)
+
+        blob_service = self.__page_blob_service(
+            max_uploads * max(int(max_threads or 1), 1)
+        )
+        rate_limit = RateLimit(max_bandwidth, max_requests)
+        with ThreadPoolExecutor(max_workers=max_uploads) as upload_pool:
+            uploads = [
+                upload_pool.submit(
+                    self.__upload_result,
+                    blob_service, rate_limit, image, blob_name,
+                    max_chunk_size, max_attempts, max_threads, max_page_gap,
+                    resume, read_ahead, delta, verify, adaptive_chunk_size,
+                    convert_to_vhd, None
+                ) for (image, name), blob_name in zip(sources, blob_names)
+            ]
+        return [upload.result() for upload in uploads]
+
+    def __upload_result(self, blob_service, rate_limit, image, name, *args):
+        result = {'source': image, 'blob_name': name}
+        start = time.time()
+        try:
+            result['byte_size'] = self.__upload(
+                blob_service, rate_limit, image, name, *args
+            )
+            result['status'] = 'uploaded'
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = '%s: %s' % (type(e).__name__, format(e))
+        result['seconds'] = round(time.time() - start, 1)
+        return result
+
+    def __upload(
+        self, blob_service, rate_limit, image, name, max_chunk_size,
+        max_attempts, max_threads, max_page_gap, resume, read_ahead, delta,
+        verify, adaptive_chunk_size, convert_to_vhd, size
+    ):
+        from_pipe = image == '-'
+        if from_pipe:
+            image_type = None
+            blob_name = name
+            data_size = None if size is None else int(size)
+        else:
+            image_type = FileType(image)
+            if convert_to_vhd and image_type.is_compressed():
+                # the footer of a compressed VHD is found at the end
+                # of the decompressed data only
+                image_type.detect_vhd(
+                    DECOMPRESSORS[image_type.compression].uncompressed_tail(
+                        image, FileType.VHD_FOOTER_SIZE
+                    )
+                )
+            if image_type.is_vhd() and not image_type.is_fixed_vhd():
+                raise AzureStorageUploadError(
+                    '%s is a %s VHD, only fixed VHD images can be uploaded'
+                    % (image, image_type.vhd_disk_type or 'unknown')
+                )
+            blob_name = self.__blob_name(image_type, name, convert_to_vhd)
+            if not name:
+                log.info('blob-name: %s', blob_name)
+            if convert_to_vhd and image_type.is_vhd():
+                log.info('%s is a VHD image already, not converted', image)
+                convert_to_vhd = False
+            data_size = self.__upload_byte_size(
+                image, image_type, convert_to_vhd
+            )
+        if data_size is None:
+            image_size = PageBlob.MAX_BYTE_SIZE
+        elif convert_to_vhd:
+            image_size = FixedVHD.vhd_byte_size(data_size)
+        elif from_pipe:
+            # the pipe stream pads the data to a full page
+            image_size = -(-data_size // 512) * 512
+        else:
+            image_size = data_size
+        # the size of the upload is unknown until the end of the data
+        total_size = None if data_size is None else image_size
+
+        # every upload records the digests of its chunks, a delta
+        # upload compares them with the digests of the former upload
+        manifest = UploadManifest(
+            self.account_name, self.container, blob_name,
+            max_chunk_size or blob_service.MAX_CHUNK_GET_SIZE
+        )
+        if delta:
+            self.__load_manifest(manifest)
+        max_chunk_size = manifest.chunk_size
+
+        journal = None
+        if resume:
+            journal = UploadJournal(
+                self.account_name, self.container, blob_name
+            )
+            if journal.open(image, image_size, manifest.etag):
+                log.info('Resuming upload of %s', blob_name)
 
+        if read_ahead is None:
+            read_ahead = ReadAhead.DEFAULT_DEPTH
+        # the read ahead also limits the data decompressed ahead
+        # in parallel
+        read_ahead_size = int(read_ahead) * int(
+            max_chunk_size or blob_service.MAX_CHUNK_GET_SIZE
+        )
         try:
-            stream = self.__open_upload_stream(image, image_type)
+            if from_pipe:
+                stream = pipe = PipeStream(sys.stdin.buffer)
+            else:
+                stream = self.__open_upload_stream(
+                    image, image_type, convert_to_vhd, read_ahead_size
+                )
+            if image_type and image_type.is_compressed() and \
+                    int(read_ahead) > 0:
+                # decompress ahead while the previous chunks upload
+                stream = ReadAhead(
+                    stream,
+                    max_chunk_size or blob_service.MAX_CHUNK_GET_SIZE,
+                    read_ahead
+                )
+            if convert_to_vhd:
+                stream = FixedVHD(stream, data_size)
+            elif data_size is None and not from_pipe:
+                # data of unknown size is padded to a full page like
+                # the data read from stdin
+                stream = PipeStream(stream)
         except Exception as e:
             raise AzureStorageStreamError(
                 '%s: %s' % (type(e).__name__, format(e))
             )
+        page_update_size = None
+        if adaptive_chunk_size:
+            page_update_size = AdaptiveChunkSize(max_chunk_size)
         try:
             page_blob = PageBlob(
-                blob_service, blob_name, self.container, image_size
+                blob_service, blob_name, self.container, image_size,
+                max_threads, max_page_gap, journal, manifest,
+                page_update_size, rate_limit
             )
-            self.__upload_status(0, image_size)
+            if delta:
+                self.__log_delta_base(blob_name, manifest)
+            self.__upload_status(blob_name, 0, total_size)
             while True:
                 bytes_transfered = page_blob.next(
                     stream, max_chunk_size, max_attempts
                 )
-                self.__upload_status(bytes_transfered, image_size)
+                self.__upload_status(blob_name, bytes_transfered, total_size)
         except StopIteration:
-            stream.close()
-            self.__upload_status(image_size, image_size)
+            try:
+                if data_size is None:
+                    image_size = self.__resize_upload(
+                        blob_service, blob_name, page_blob.page_start
+                    )
+                elif from_pipe:
+                    self.__validate_pipe_size(pipe, data_size)
+            finally:
+                stream.close()
+            if journal:
+                journal.remove()
+            self.__save_manifest(blob_service, blob_name, manifest)
+            self.__upload_status(blob_name, image_size, image_size)
         except Exception as e:
             stream.close()
+            if journal:
+                journal.close()
             raise AzureStorageUploadError(
                 '%s: %s' % (type(e).__name__, format(e))
             )
+        if verify:
+            self.__verify_upload(blob_service, blob_name, manifest)
+        return image_size
 
     def upload_empty_image(self, image_size, footer, name):
         blob_service = PageBlobService(
@@ -128,6 +359,104 @@ class Storage(object):
             signed_query
         )
 
+    def download(
+        self, name, destination=None, max_chunk_size=None, max_attempts=5,
+        max_threads=None, max_bandwidth=None, compress=False
+    ):
+        """
+            Download the page blob name to the destination file, by
+            default the blob name in the current directory. Only the
+            page ranges holding data are downloaded, the remaining
+            pages are kept as holes of a sparse destination file. With
+            compress the destination is written xz compressed, the
+            holes are compressed as zeros then
+        """
+        if not destination:
+            destination = os.path.basename(name) + ('.xz' if compress else '')
+        blob_service = self.__page_blob_service(max_threads)
+        writing = False
+        try:
+            download = PageBlobDownload(
+                blob_service, name, self.container, max_chunk_size,
+                max_threads, RateLimit(max_bandwidth)
+            )
+            self.download_status['current_bytes'] = 0
+            self.download_status['total_bytes'] = download.data_byte_size
+            writing = True
+            if compress:
+                with lzma.open(destination, 'wb') as image:
+                    self.__write_download(
+                        download, image, self.__write_zeros, max_attempts
+                    )
+            else:
+                with open(destination, 'wb') as image:
+                    self.__write_download(
+                        download, image, self.__skip_zeros, max_attempts
+                    )
+        except Exception as e:
+            # a partial download is no valid image
+            if writing and os.path.exists(destination):
+                os.remove(destination)
+            raise AzureStorageDownloadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        return destination
+
+    def copy(self, name, targets, target_name=None):
+        """
+            Copy the page blob name server side to the container of
+            each of the (account_name, account_key, container) targets.
+            The copies read the page blob from a read only shared
+            access signature URL. They are started concurrently and
+            the pending copies are polled until all copies ended. The
+            result of each copy is returned in the order of the targets
+        """
+        blob_service = self.__page_blob_service()
+        try:
+            byte_size = blob_service.get_blob_properties(
+                self.container, name
+            ).properties.content_length
+        except Exception as e:
+            raise AzureStorageCopyError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        start = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+        copy_source = self.disk_image_sas(
+            self.container, name, start, start + self.COPY_SAS_EXPIRY, 'r'
+        )
+        copies = [
+            BlobCopy(
+                PageBlobService(
+                    account_name,
+                    account_key,
+                    endpoint_suffix=self.blob_service_host_base
+                ),
+                container, target_name or name
+            ) for account_name, account_key, container in targets
+        ]
+        results = [
+            {
+                'account': account_name,
+                'container': container,
+                'blob_name': target_name or name
+            } for account_name, account_key, container in targets
+        ]
+        self.copy_status['total_bytes'] = byte_size * len(copies)
+        start_time = time.time()
+        with ThreadPoolExecutor(
+            max_workers=min(len(copies), self.MAX_COPY_REQUESTS)
+        ) as copy_pool:
+            list(copy_pool.map(lambda copy: copy.start(copy_source), copies))
+            self.__copy_status(copies, results, byte_size, start_time)
+            while any(copy.is_pending() for copy in copies):
+                time.sleep(self.COPY_POLL_INTERVAL)
+                list(copy_pool.map(
+                    lambda copy: copy.poll(),
+                    [copy for copy in copies if copy.is_pending()]
+                ))
+                self.__copy_status(copies, results, byte_size, start_time)
+        return results
+
     def delete(self, image):
         blob_service = PageBlobService(
             self.account_name,
@@ -141,6 +470,43 @@ class Storage(object):
                 '%s: %s' % (type(e).__name__, format(e))
             )
 
+    def delete_blobs(
+        self, pattern=None, prefix=None, older_than=None, max_threads=None,
+        dry_run=False
+    ):
+        """
+            Delete the blobs of the container whose name matches the
+            glob pattern, starts with prefix and which were last
+            modified more than older_than days ago. The blobs are
+            looked up in one listing of the container, a pattern
+            without glob characters names a single blob, which needs
+            no listing and is only looked up by a dry_run. Up to
+            max_threads blobs are deleted concurrently, a failed
+            delete does not stop the others. The result of each
+            delete is returned in the order of the listing, with
+            dry_run the blobs are only matched
+        """
+        blob_names = self.__matching_blobs(
+            pattern, prefix, older_than, dry_run
+        )
+        if dry_run:
+            return [
+                {'blob_name': blob_name, 'status': 'matched'}
+                for blob_name in blob_names
+            ]
+        if not blob_names:
+            return []
+        blob_service = self.__page_blob_service(max_threads)
+        with ThreadPoolExecutor(
+            max_workers=max(int(max_threads or self.MAX_DELETES), 1)
+        ) as delete_pool:
+            return list(delete_pool.map(
+                lambda blob_name: self.__delete_result(
+                    blob_service, blob_name
+                ),
+                blob_names
+            ))
+
     def print_upload_status(self):
         log.progress(
             self.upload_status['current_bytes'],
@@ -148,16 +514,290 @@ class Storage(object):
             'Uploading'
         )
 
-    def __upload_status(self, current, total):
-        self.upload_status['current_bytes'] = current
-        self.upload_status['total_bytes'] = total
+    def print_download_status(self):
+        log.progress(
+            self.download_status['current_bytes'],
+            self.download_status['total_bytes'],
+            'Downloading'
+        )
+
+    def __matching_blobs(self, pattern, prefix, older_than, dry_run):
+        # the listing is restricted to the longest name prefix every
+        # matching blob starts with
+        literal = re.split(r'[*?[]', pattern or '')[0]
+        if pattern and literal == pattern and not (prefix or older_than):
+            if dry_run and not self.__blob_exists(pattern):
+                return []
+            return [pattern]
+        listing_prefix = max(prefix or '', literal, key=len) or None
+        cutoff = None
+        if older_than is not None:
+            try:
+                cutoff = datetime.datetime.now(datetime.timezone.utc) - \
+                    datetime.timedelta(days=float(older_than))
+            except (OverflowError, ValueError) as e:
+                raise AzureStorageDeleteError(
+                    '%s: %s' % (type(e).__name__, format(e))
+                )
+        container = Container(
+            account_name=self.account_name,
+            key=self.account_key,
+            blob_service_host_base=self.blob_service_host_base
+        )
+        try:
+            return [
+                blob['name'] for blob in container.blobs(
+                    self.container, prefix=listing_prefix
+                ) if self.__blob_matches(blob, pattern, prefix, cutoff)
+            ]
+        except Exception as e:
+            raise AzureStorageDeleteError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+
+    def __blob_exists(self, blob_name):
+        try:
+            self.__page_blob_service().get_blob_properties(
+                self.container, blob_name
+            )
+        except AzureMissingResourceHttpError:
+            return False
+        except Exception as e:
+            raise AzureStorageDeleteError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        return True
+
+    def __blob_matches(self, blob, pattern, prefix, cutoff):
+        if pattern and not fnmatch.fnmatchcase(blob['name'], pattern):
+            return False
+        if prefix and not blob['name'].startswith(prefix):
+            return False
+        if cutoff and blob['last_modified'] >= cutoff:
+            return False
+        return True
+
+    def __delete_result(self, blob_service, blob_name):
+        result = {'blob_name': blob_name}
+        try:
+            blob_service.delete_blob(self.container, blob_name)
+            result['status'] = 'deleted'
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = '%s: %s' % (type(e).__name__, format(e))
+        return result
+
+    def print_copy_status(self):
+        log.progress(
+            self.copy_status['current_bytes'],
+            self.copy_status['total_bytes'],
+            'Copying'
+        )
+
+    def __copy_status(self, copies, results, byte_size, start_time):
+        for copy, result in zip(copies, results):
+            if copy.is_pending() or 'status' in result:
+                continue
+            result['status'] = \
+                'copied' if copy.status == BlobCopy.SUCCESS else 'failed'
+            if copy.error:
+                result['error'] = copy.error
+            result['seconds'] = round(time.time() - start_time, 1)
+        self.copy_status['current_bytes'] = sum(
+            byte_size if copy.status == BlobCopy.SUCCESS else
+            copy.copied_bytes for copy in copies
+        )
+
+    def __write_download(self, download, image, write_hole, max_attempts):
+        position = 0
+        for offset, data in download.read(max_attempts):
+            write_hole(image, offset - position)
+            image.write(data)
+            position = offset + len(data)
+            self.download_status['current_bytes'] += len(data)
+        write_hole(image, download.byte_size - position)
+
+    def __skip_zeros(self, image, byte_size):
+        # extending the file creates a hole, the file system
+        # allocates no blocks for it
+        if byte_size:
+            image.truncate(image.tell() + byte_size)
+            image.seek(byte_size, os.SEEK_CUR)
+
+    def __write_zeros(self, image, byte_size):
+        zeros = bytes(min(byte_size, 1048576))
+        while byte_size:
+            image.write(zeros[:byte_size])
+            byte_size -= min(byte_size, len(zeros))
+
+    def __upload_status(self, blob_name, current, total):
+        # the status of all uploads is summed up, the total is unknown
+        # as long as the size of one upload is unknown
+        with self.upload_status_lock:
+            self.upload_statuses[blob_name] = (current, total)
+            totals = [total for current, total in self.upload_statuses.values()]
+            self.upload_status['current_bytes'] = sum(
+                current for current, total in self.upload_statuses.values()
+            )
+            self.upload_status['total_bytes'] = \
+                None if None in totals else sum(totals)
+
+    def __page_blob_service(self, max_connections=None):
+        if not max_connections:
+            return PageBlobService(
+                self.account_name,
+                self.account_key,
+                endpoint_suffix=self.blob_service_host_base
+            )
+        # concurrent uploads share the connections of one session,
+        # which keeps a connection for each concurrent page request
+        request_session = requests.Session()
+        request_session.mount(
+            'https://', requests.adapters.HTTPAdapter(
+                pool_maxsize=int(max_connections)
+            )
+        )
+        return PageBlobService(
+            self.account_name,
+            self.account_key,
+            endpoint_suffix=self.blob_service_host_base,
+            request_session=request_session
+        )
+
+    def __blob_name(self, image_type, name, convert_to_vhd):
+        if name:
+            return name
+        blob_name = image_type.basename()
+        if convert_to_vhd and not image_type.is_vhd():
+            blob_name = os.path.splitext(blob_name)[0] + '.vhd'
+        return blob_name
+
+    def __log_delta_base(self, blob_name, manifest):
+        if manifest.etag:
+            log.info('Uploading changes since the last upload of %s', blob_name)
+        else:
+            log.info(
+                'No unmodified former upload of %s found, uploading all data',
+                blob_name
+            )
+
+    def __load_manifest(self, manifest):
+        # a manifest which can not be read only prevents this upload
+        # from being a delta upload
+        try:
+            manifest.load()
+        except AzureUploadManifestError as e:
+            log.warning(
+                'Upload manifest not read, uploading all data: %s: %s',
+                type(e).__name__, format(e)
+            )
+            manifest.discard_previous()
 
-    def __open_upload_stream(self, image, image_type):
+    def __save_manifest(self, blob_service, blob_name, manifest):
+        # the upload succeeded, a manifest which can not be written
+        # only prevents the next upload from being a delta upload
+        try:
+            blob = blob_service.get_blob_properties(self.container, blob_name)
+            blob_size = blob.properties.content_length
+            metadata = dict(
+                (key, value) for key, value in (blob.metadata or {}).items()
+                if key not in UploadManifest.METADATA_KEYS
+            )
+            metadata.update(manifest.blob_metadata(blob_size))
+            # setting the metadata changes the etag of the page blob
+            etag = blob_service.set_blob_metadata(
+                self.container, blob_name, metadata
+            ).etag
+            if not manifest.save(blob_size, etag):
+                log.warning(
+                    'Upload of %s was resumed, no upload manifest written',
+                    blob_name
+                )
+        except Exception as e:
+            log.warning(
+                'Upload manifest not written: %s: %s',
+                type(e).__name__, format(e)
+            )
+
+    def __verify_upload(self, blob_service, blob_name, manifest):
+        # the page ranges are compared with the chunk digests recorded
+        # during upload, the image is not read another time
+        try:
+            page_ranges = blob_service.get_page_ranges(
+                self.container, blob_name
+            )
+        except Exception as e:
+            raise AzureStorageVerifyError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        mismatches = manifest.verify(page_ranges)
+        if mismatches:
+            raise AzureStorageVerifyError(
+                'Page ranges of %s do not match %d uploaded chunks, '
+                'first mismatch at offset %d' % (
+                    blob_name, len(mismatches), mismatches[0]
+                )
+            )
+        log.info('Verified page ranges of %s', blob_name)
+
+    def __validate_pipe_upload(self, name, resume):
+        if not name:
+            raise AzureStorageUploadError(
+                'A blob name is required for an upload from stdin'
+            )
+        if resume:
+            raise AzureStorageUploadError(
+                'An upload from stdin can not be resumed'
+            )
+
+    def __resize_upload(self, blob_service, blob_name, upload_size):
+        # the page blob was created with the max size and is cut to
+        # the size of the uploaded data
+        try:
+            blob_service.resize_blob(self.container, blob_name, upload_size)
+        except Exception as e:
+            raise AzureStorageUploadError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        return upload_size
+
+    def __validate_pipe_size(self, pipe, data_size):
+        if pipe.byte_size != data_size or not pipe.is_exhausted():
+            raise AzureStorageUploadError(
+                'Data read from stdin does not match the size of %d bytes'
+                % data_size
+            )
+
+    def __open_upload_stream(
+        self, image, image_type, convert_to_vhd, read_ahead_size
+    ):
         if image_type.is_xz():
+            return self.__open_xz_stream(image, read_ahead_size)
+        if image_type.is_compressed():
+            return DECOMPRESSORS[image_type.compression].open(image)
+        if convert_to_vhd and image_type.is_qcow2():
+            return Qcow2.open(image)
+        return SparseFile.open(image)
+
+    def __open_xz_stream(self, image, read_ahead_size):
+        # multi block xz files are decompressed in parallel on all
+        # cores, anything else uses serial stream decompression
+        try:
+            xz_index = XZIndex(image)
+        except AzureXZIndexError as e:
+            log.debug('Using serial xz decompression: %s', format(e))
             return XZ.open(image)
-        return open(image)
+        if len(xz_index.blocks) > 1 and (os.cpu_count() or 1) > 1:
+            return ParallelXZ(
+                image, xz_index, max_buffer_size=read_ahead_size
+            )
+        return XZ.open(image)
 
-    def __upload_byte_size(self, image, image_type):
-        if image_type.is_xz():
-            return XZ.uncompressed_size(image)
+    def __upload_byte_size(self, image, image_type, convert_to_vhd):
+        if image_type.is_compressed():
+            return DECOMPRESSORS[image_type.compression].uncompressed_size(
+                image
+            )
+        if convert_to_vhd and image_type.is_qcow2():
+            return Qcow2.virtual_size(image)
         return os.path.getsize(image)
@@ -0,0 +1,150 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import bisect
+import json
+import os
+import threading
+from urllib.parse import quote
+
+# project
+from azurectl.config.file_path import ConfigFilePath
+from azurectl.azurectl_exceptions import AzureUploadJournalError
+
+
+class UploadJournal(object):
+    """
+        On-disk journal of the byte ranges of a page blob upload
+        which are known to be stored in the page blob. The journal
+        allows to continue an interrupted upload of the same source
+        into the same blob at the first uncommitted range
+    """
+    def __init__(self, account_name, container, blob_name, journal_dir=None):
+        if not journal_dir:
+            journal_dir = os.sep.join(
+                [ConfigFilePath().cache_directory(), 'upload']
+            )
+        self.journal_file = os.sep.join(
+            [
+                journal_dir,
+                quote('/'.join([account_name, container, blob_name]), '')
+            ]
+        )
+        self.source = None
+        self.journal = None
+        self.range_starts = []
+        self.range_ends = []
+        self.lock = threading.Lock()
+
+    def open(self, image, byte_size, delta_base=None):
+        """
+            Open the journal for the upload of image as a page blob
+            of byte_size. Returns True if a journal of a former upload
+            of the same unmodified image exists and was loaded. For a
+            delta upload, delta_base is the etag of the page blob the
+            upload started from, which must match as well
+        """
+        image_stat = os.stat(image)
+        self.source = {
+            'image': os.path.abspath(image),
+            'image_size': image_stat.st_size,
+            'image_mtime': image_stat.st_mtime,
+            'blob_size': byte_size,
+            'delta_base': delta_base
+        }
+        try:
+            resumable = self.__load()
+            journal_dir = os.path.dirname(self.journal_file)
+            if not os.path.isdir(journal_dir):
+                os.makedirs(journal_dir)
+            self.journal = open(self.journal_file, 'a')
+            if not resumable:
+                self.reset()
+        except Exception as e:
+            raise AzureUploadJournalError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        return resumable
+
+    def is_resumable(self):
+        return len(self.range_starts) > 0
+
+    def committed_range_size(self, offset):
+        """
+            Number of committed bytes starting at offset
+        """
+        with self.lock:
+            index = bisect.bisect_right(self.range_starts, offset) - 1
+            if index >= 0 and self.range_ends[index] > offset:
+                return self.range_ends[index] - offset
+            return 0
+
+    def commit(self, start, end):
+        """
+            Record the byte range from start to end, excluding end,
+            as stored in the page blob
+        """
+        if end <= start:
+            return
+        with self.lock:
+            self.__add_range(start, end)
+            self.journal.write('%d %d\n' % (start, end))
+            self.journal.flush()
+
+    def reset(self):
+        self.range_starts = []
+        self.range_ends = []
+        self.journal.seek(0)
+        self.journal.truncate()
+        self.journal.write(json.dumps(self.source, sort_keys=True) + '\n')
+        self.journal.flush()
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    def __load(self):
+        if not os.path.exists(self.journal_file):
+            return False
+        with open(self.journal_file) as journal:
+            try:
+                source = json.loads(journal.readline())
+            except ValueError:
+                return False
+            if source != self.source:
+                return False
+            for line in journal:
+                try:
+                    start, end = [int(offset) for offset in line.split()]
+                except ValueError:
+                    # incomplete last record of an interrupted write
+                    break
+                self.__add_range(start, end)
+        return self.is_resumable()
+
+    def __add_range(self, start, end):
+        # keep a sorted list of disjoint ranges, merging the new
+        # range with all ranges it overlaps or touches
+        first = bisect.bisect_left(self.range_ends, start)
+        last = bisect.bisect_right(self.range_starts, end)
+        if first < last:
+            start = min(start, self.range_starts[first])
+            end = max(end, self.range_ends[last - 1])
+        self.range_starts[first:last] = [start]
+        self.range_ends[first:last] = [end]
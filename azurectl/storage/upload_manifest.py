@@ -0,0 +1,216 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import hashlib
+import os
+import struct
+from urllib.parse import quote
+
+# project
+from azurectl.config.file_path import ConfigFilePath
+from azurectl.azurectl_exceptions import AzureUploadManifestError
+
+
+class UploadManifest(object):
+    """
+        On-disk manifest of the MD5 digest of every chunk of the last
+        upload of a page blob, together with the etag the page blob
+        had after that upload. As long as the page blob still has
+        this etag, only chunks whose digest differs from the manifest
+        need to be sent by the next upload of the same blob.
+
+        The manifest is a binary file with a header of the chunk
+        size, the blob size and the etag, followed by one record
+        of offset, length, MD5 digest and zero flag per chunk. The
+        digest of all records identifies the uploaded content and
+        is stored in the page blob metadata
+    """
+    MAGIC = b'AZMF\x00\x00\x00\x01'
+    HEADER = struct.Struct('<8sQQH')
+    RECORD = struct.Struct('<QI16s?')
+    ZERO_DIGEST = b'\x00' * 16
+    METADATA_DIGEST = 'azurectl_manifest_md5'
+    METADATA_CHUNK_SIZE = 'azurectl_manifest_chunk_size'
+    METADATA_KEYS = (METADATA_DIGEST, METADATA_CHUNK_SIZE)
+
+    def __init__(
+        self, account_name, container, blob_name, chunk_size,
+        manifest_dir=None
+    ):
+        if not manifest_dir:
+            manifest_dir = os.sep.join(
+                [ConfigFilePath().cache_directory(), 'manifest']
+            )
+        self.manifest_file = os.sep.join(
+            [
+                manifest_dir,
+                quote('/'.join([account_name, container, blob_name]), '')
+            ]
+        )
+        self.chunk_size = int(chunk_size)
+        self.etag = None
+        self.previous_chunks = {}
+        self.chunks = []
+        self.next_offset = 0
+        self.complete = True
+
+    def load(self):
+        """
+            Load the manifest of the former upload. Returns True if
+            a valid manifest exists, in which case its chunk size
+            replaces the requested one
+        """
+        if not os.path.exists(self.manifest_file):
+            return False
+        try:
+            with open(self.manifest_file, 'rb') as manifest:
+                header = manifest.read(self.HEADER.size)
+                if len(header) != self.HEADER.size:
+                    return False
+                magic, chunk_size, blob_size, etag_size = \
+                    self.HEADER.unpack(header)
+                if magic != self.MAGIC:
+                    return False
+                etag = manifest.read(etag_size).decode()
+                previous_chunks = {}
+                for record in self.RECORD.iter_unpack(manifest.read()):
+                    offset, length, digest, zero = record
+                    previous_chunks[offset] = \
+                        (length, None if zero else digest)
+        except Exception as e:
+            raise AzureUploadManifestError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        self.chunk_size = chunk_size
+        self.etag = etag
+        self.previous_chunks = previous_chunks
+        return True
+
+    def discard_previous(self):
+        """
+            Forget the manifest of the former upload, e.g because
+            the page blob was modified since
+        """
+        self.etag = None
+        self.previous_chunks = {}
+
+    def previous_chunk(self, offset):
+        """
+            Tuple of length and digest of the chunk at offset in the
+            former upload or None. The digest of a zero chunk is None
+        """
+        return self.previous_chunks.get(offset)
+
+    def add(self, offset, length, digest):
+        """
+            Record the digest of the chunk at offset, None for a
+            chunk of only zero bytes. Chunks must be added in order
+        """
+        if offset != self.next_offset or offset % self.chunk_size:
+            self.complete = False
+        self.chunks.append((offset, length, digest))
+        self.next_offset = offset + length
+
+    def is_complete(self, blob_size):
+        """
+            True if the recorded chunks cover a page blob of blob_size,
+            which is not the case for a resumed upload
+        """
+        return self.complete and self.next_offset == blob_size
+
+    def content_digest(self):
+        """
+            MD5 hex digest of the chunk size and all chunk records.
+            Uploads of identical content with the same chunk size
+            have the same content digest
+        """
+        content_digest = hashlib.md5(
+            struct.pack('<QQ', self.chunk_size, self.next_offset)
+        )
+        for record in self.__records():
+            content_digest.update(record)
+        return content_digest.hexdigest()
+
+    def blob_metadata(self, blob_size):
+        """
+            Page blob metadata of a complete manifest
+        """
+        if not self.is_complete(blob_size):
+            return {}
+        return {
+            self.METADATA_DIGEST: self.content_digest(),
+            self.METADATA_CHUNK_SIZE: str(self.chunk_size)
+        }
+
+    def verify(self, page_ranges):
+        """
+            Compare the page ranges reported for the page blob with the
+            recorded chunks. An upload writes pages for all chunks with
+            data but never for a zero chunk, thus every chunk with data
+            must overlap a page range and every zero chunk must not.
+            Returns the offsets of the chunks which do not match
+        """
+        mismatches = []
+        page_ranges = sorted(
+            (page_range.start, page_range.end + 1)
+            for page_range in page_ranges
+        )
+        index = 0
+        for offset, length, digest in sorted(self.chunks):
+            while index < len(page_ranges) and \
+                    page_ranges[index][1] <= offset:
+                index += 1
+            has_pages = index < len(page_ranges) and \
+                page_ranges[index][0] < offset + length
+            if has_pages != (digest is not None):
+                mismatches.append(offset)
+        return mismatches
+
+    def save(self, blob_size, etag):
+        """
+            Write the manifest of this upload for a page blob of
+            blob_size with the given etag. A manifest which does not
+            cover the whole page blob, e.g for a resumed upload, is
+            not written but removes the manifest of the former upload.
+            Returns True if the manifest was written
+        """
+        try:
+            if not self.is_complete(blob_size):
+                if os.path.exists(self.manifest_file):
+                    os.remove(self.manifest_file)
+                return False
+            manifest_dir = os.path.dirname(self.manifest_file)
+            if not os.path.isdir(manifest_dir):
+                os.makedirs(manifest_dir)
+            etag = etag.encode()
+            with open(self.manifest_file + '.tmp', 'wb') as manifest:
+                manifest.write(
+                    self.HEADER.pack(
+                        self.MAGIC, self.chunk_size, blob_size, len(etag)
+                    )
+                )
+                manifest.write(etag)
+                for record in self.__records():
+                    manifest.write(record)
+            os.replace(self.manifest_file + '.tmp', self.manifest_file)
+        except Exception as e:
+            raise AzureUploadManifestError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+        return True
+
+    def __records(self):
+        for offset, length, digest in self.chunks:
+            yield self.RECORD.pack(
+                offset, length, digest or self.ZERO_DIGEST, digest is None
+            )
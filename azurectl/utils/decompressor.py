@@ -0,0 +1,314 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import bz2
+import os
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# project
+from azurectl.azurectl_exceptions import AzureDecompressorNotAvailable
+
+
+class Decompressor(object):
+    """
+        Implements streaming decompression of compressed files with
+        a decompressor object of the lzma, bz2 or zlib kind. Compressed
+        data is read into a reusable input buffer and the decompressor
+        output is limited to the requested size, such that no
+        decompressed data needs to be buffered and copied between
+        reads. Concatenated streams are decompressed one after the
+        other. The lzma and bz2 decompressors of Python 3.4 can not
+        limit their output, their output beyond the requested size
+        is kept until the next read. Subclasses provide the
+        decompressor object
+    """
+    STREAM_BUFFER_SIZE = 1048576
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, compressed_stream, buffer_size=STREAM_BUFFER_SIZE):
+        self.buffer_size = int(buffer_size)
+        self.decompressor = self.__new_decompressor()
+        self.compressed_stream = compressed_stream
+        self.input_buffer = memoryview(bytearray(self.buffer_size))
+        self.unused_data = b''
+
+    def new_decompressor(self):
+        raise NotImplementedError
+
+    def read(self, size):
+        chunks = []
+        bytes_uncompressed = 0
+        while bytes_uncompressed < size:
+            if self.decompressor.eof and not self.__next_stream():
+                break
+            compressed = b''
+            if self.decompressor.needs_input:
+                compressed = self.unused_data or self.__read_compressed()
+                self.unused_data = b''
+                if not compressed:
+                    raise EOFError(
+                        'Compressed file ended before the '
+                        'end-of-stream marker was reached'
+                    )
+            chunk = self.decompressor.decompress(
+                compressed, size - bytes_uncompressed
+            )
+            bytes_uncompressed += len(chunk)
+            chunks.append(chunk)
+
+        if not bytes_uncompressed:
+            return None
+        if len(chunks) == 1:
+            return chunks[0]
+        return b''.join(chunks)
+
+    def close(self):
+        self.compressed_stream.close()
+
+    @classmethod
+    def open(self, file_name, buffer_size=STREAM_BUFFER_SIZE):
+        return self(open(file_name, 'rb'), buffer_size)
+
+    @classmethod
+    def uncompressed_size(self, file_name):
+        # formats which do not record the uncompressed size tell it
+        # only once the data is decompressed
+        return None
+
+    @classmethod
+    def uncompressed_tail(self, file_name, byte_size):
+        # the end of the data is only known once all of it is
+        # decompressed
+        tail = b''
+        with self.open(file_name) as stream:
+            while True:
+                data = stream.read(self.STREAM_BUFFER_SIZE)
+                if not data:
+                    return tail
+                tail = (tail + data[-byte_size:])[-byte_size:]
+
+    def __next_stream(self):
+        # concatenated streams may be separated by zero byte stream
+        # padding, each stream needs a new decompressor
+        unused_data = self.decompressor.unused_data.lstrip(b'\x00')
+        while not unused_data:
+            compressed = self.__read_compressed()
+            if not compressed:
+                return False
+            unused_data = bytes(compressed).lstrip(b'\x00')
+        self.decompressor = self.__new_decompressor()
+        self.unused_data = unused_data
+        return True
+
+    def __new_decompressor(self):
+        decompressor = self.new_decompressor()
+        if not hasattr(decompressor, 'needs_input'):
+            decompressor = BufferedDecompressor(decompressor)
+        return decompressor
+
+    def __read_compressed(self):
+        bytes_read = self.compressed_stream.readinto(self.input_buffer)
+        return self.input_buffer[:bytes_read]
+
+
+class GZip(Decompressor):
+    """
+        Implements decompression of gzip compressed files. The gzip
+        trailer holds the uncompressed size modulo 4GB of the last
+        member only, which is why the size is unknown
+    """
+    def new_decompressor(self):
+        return ZlibDecompressor(zlib.MAX_WBITS | 16)
+
+
+class BZip2(Decompressor):
+    """
+        Implements decompression of bzip2 compressed files, which do
+        not record their uncompressed size
+    """
+    def new_decompressor(self):
+        return bz2.BZ2Decompressor()
+
+
+class ZlibDecompressor(object):
+    """
+        zlib decompressor object with the interface of the lzma and
+        bz2 decompressor objects
+    """
+    def __init__(self, wbits):
+        self.zlib = zlib.decompressobj(wbits)
+
+    @property
+    def eof(self):
+        return self.zlib.eof
+
+    @property
+    def needs_input(self):
+        return not self.zlib.unconsumed_tail
+
+    @property
+    def unused_data(self):
+        return self.zlib.unused_data
+
+    def decompress(self, data, max_length):
+        return self.zlib.decompress(
+            data or self.zlib.unconsumed_tail, max_length
+        )
+
+
+class BufferedDecompressor(object):
+    """
+        Python 3.4 lzma or bz2 decompressor object, which has no
+        max_length, with the interface of the later ones. The output
+        beyond max_length is kept until the next call
+    """
+    def __init__(self, decompressor):
+        self.decompressor = decompressor
+        self.output = memoryview(b'')
+
+    @property
+    def eof(self):
+        return self.decompressor.eof and not self.output
+
+    @property
+    def needs_input(self):
+        return not self.output
+
+    @property
+    def unused_data(self):
+        return self.decompressor.unused_data
+
+    def decompress(self, data, max_length):
+        if data:
+            self.output = memoryview(self.decompressor.decompress(data))
+        chunk = self.output[:max_length]
+        self.output = self.output[len(chunk):]
+        return chunk.tobytes()
+
+
+class ZStd(Decompressor):
+    """
+        Implements decompression of zstd compressed files with the
+        optional zstandard module. The frames of the file are walked
+        by their block headers without decompressing them, which
+        tells the uncompressed size from the content sizes recorded
+        in the frame headers and detects a truncated file, the
+        zstandard stream reader would end at the truncation without
+        an error. If a frame does not record its content size the
+        size is unknown
+    """
+    FRAME_MAGIC = 0xfd2fb528
+    SKIPPABLE_FRAME_MAGIC = 0x184d2a50
+    SKIPPABLE_FRAME_MASK = 0xfffffff0
+    RLE_BLOCK = 1
+
+    def __init__(self, compressed_stream, buffer_size=None):
+        if not zstandard:
+            raise AzureDecompressorNotAvailable(
+                'zstd decompression requires the zstandard python module'
+            )
+        self.compressed_stream = compressed_stream
+        self.zstd_reader = zstandard.ZstdDecompressor().stream_reader(
+            compressed_stream,
+            read_size=int(buffer_size or self.STREAM_BUFFER_SIZE),
+            read_across_frames=True
+        )
+
+    def read(self, size):
+        # the stream reader fills the requested size across frames
+        return self.zstd_reader.read(size) or None
+
+    def close(self):
+        self.zstd_reader.close()
+        self.compressed_stream.close()
+
+    @classmethod
+    def open(self, file_name, buffer_size=None):
+        self.__content_size(file_name)
+        return self(open(file_name, 'rb'), buffer_size)
+
+    @classmethod
+    def uncompressed_size(self, file_name):
+        return self.__content_size(file_name)
+
+    @classmethod
+    def __content_size(self, file_name):
+        with open(file_name, 'rb') as zstd_file:
+            file_size = os.fstat(zstd_file.fileno()).st_size
+            content_size = 0
+            while zstd_file.tell() < file_size:
+                frame_size = self.__skip_frame(zstd_file)
+                if frame_size is None or content_size is None:
+                    content_size = None
+                else:
+                    content_size += frame_size
+            if zstd_file.tell() > file_size:
+                raise EOFError(
+                    'Compressed file ended before the end of the last '
+                    'zstd frame was reached'
+                )
+        return content_size
+
+    @classmethod
+    def __skip_frame(self, zstd_file):
+        magic = struct.unpack('<I', self.__read(zstd_file, 4))[0]
+        if magic & self.SKIPPABLE_FRAME_MASK == self.SKIPPABLE_FRAME_MAGIC:
+            skip_size = struct.unpack('<I', self.__read(zstd_file, 4))[0]
+            zstd_file.seek(skip_size, os.SEEK_CUR)
+            return 0
+        if magic != self.FRAME_MAGIC:
+            # not a zstd frame, the decompression tells what it is
+            zstd_file.seek(0, os.SEEK_END)
+            return None
+        descriptor = self.__read(zstd_file, 1)[0]
+        single_segment = descriptor >> 5 & 1
+        content_size_bytes = [single_segment, 2, 4, 8][descriptor >> 6]
+        header_size = [0, 1, 2, 4][descriptor & 3] + 1 - single_segment
+        header = self.__read(zstd_file, header_size + content_size_bytes)
+        content_size = None
+        if content_size_bytes:
+            content_size = int.from_bytes(header[header_size:], 'little')
+            if content_size_bytes == 2:
+                content_size += 256
+        while True:
+            block = int.from_bytes(self.__read(zstd_file, 3), 'little')
+            if block >> 1 & 3 == self.RLE_BLOCK:
+                zstd_file.seek(1, os.SEEK_CUR)
+            else:
+                zstd_file.seek(block >> 3, os.SEEK_CUR)
+            if block & 1:
+                break
+        if descriptor >> 2 & 1:
+            zstd_file.seek(4, os.SEEK_CUR)
+        return content_size
+
+    @classmethod
+    def __read(self, zstd_file, size):
+        data = zstd_file.read(size)
+        if len(data) != size:
+            raise EOFError(
+                'Compressed file ended before the end of the last '
+                'zstd frame was reached'
+            )
+        return data
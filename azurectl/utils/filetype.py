@@ -13,30 +13,106 @@
 #
 import os
 import re
-import subprocess
+import struct
 
 
 class FileType(object):
     """
-        map file magic information to type methods
+        map file magic information to type methods. The compression
+        and the qcow2 container format are told by the magic bytes
+        at the start of the file, a VHD by the footer in the last
+        512 bytes of the file
     """
+    COMPRESSION_MAGIC = [
+        ('xz', b'\xfd7zXZ\x00'),
+        ('gzip', b'\x1f\x8b'),
+        ('bzip2', b'BZh'),
+        ('zstd', b'\x28\xb5\x2f\xfd'),
+        # lzma alone header of the default properties and a
+        # dictionary size of a multiple of 64k
+        ('lzma', b'\x5d\x00\x00')
+    ]
+    QCOW2_MAGIC = b'QFI\xfb'
+    VHD_COOKIE = b'conectix'
+    VHD_FOOTER_SIZE = 512
+    VHD_DISK_TYPES = {2: 'fixed', 3: 'dynamic', 4: 'differencing'}
+    MAGIC_SIZE = 8
+
     def __init__(self, file_name):
         self.file_name = file_name
-        file_info = subprocess.Popen(
-            ['file', file_name],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        self.filetype = file_info.communicate()[0].decode()
+        self.compression = None
+        self.image_format = 'raw'
+        self.vhd_disk_type = None
+        with open(file_name, 'rb') as image:
+            header = image.read(self.MAGIC_SIZE)
+            for compression, magic in self.COMPRESSION_MAGIC:
+                if header.startswith(magic):
+                    self.compression = compression
+                    return
+            if header.startswith(self.QCOW2_MAGIC):
+                self.image_format = 'qcow2'
+                return
+            self.detect_vhd(self.__read_vhd_footer(image))
+
+    def detect_vhd(self, footer):
+        """
+            Detect a VHD by its footer, e.g the footer at the end of
+            the decompressed data of a compressed image
+        """
+        if footer.startswith(self.VHD_COOKIE):
+            self.image_format = 'vhd'
+            disk_type = struct.unpack('>I', footer[60:64])[0]
+            self.vhd_disk_type = self.VHD_DISK_TYPES.get(disk_type)
 
     def is_xz(self):
-        if re.match('.*: XZ compressed', self.filetype):
-            return True
-        return False
+        return self.compression == 'xz'
+
+    def is_lzma(self):
+        return self.compression == 'lzma'
+
+    def is_gzip(self):
+        return self.compression == 'gzip'
+
+    def is_bzip2(self):
+        return self.compression == 'bzip2'
+
+    def is_zstd(self):
+        return self.compression == 'zstd'
+
+    def is_compressed(self):
+        return self.compression is not None
+
+    def is_qcow2(self):
+        return self.image_format == 'qcow2'
+
+    def is_vhd(self):
+        return self.image_format == 'vhd'
+
+    def is_fixed_vhd(self):
+        """
+            A fixed VHD is the raw disk data followed by the footer
+            and can be uploaded as it is
+        """
+        return self.vhd_disk_type == 'fixed'
+
+    def is_raw(self):
+        return not self.compression and self.image_format == 'raw'
 
     def basename(self):
         name = os.path.basename(self.file_name)
-        if self.is_xz():
-            name = re.sub('\.(xz|lzma)$', '', name)
-            name = re.sub('\.(tgz|tlz)$', '.tar', name)
+        if self.is_compressed():
+            name = re.sub(r'\.(xz|lzma|gz|bz2|zst)$', '', name)
+            name = re.sub(r'\.(tgz|tlz|txz|tbz2?|tzst)$', '.tar', name)
         return name
+
+    def __read_vhd_footer(self, image):
+        # a dynamic VHD starts with a copy of its footer
+        file_size = image.seek(0, os.SEEK_END)
+        if file_size < self.VHD_FOOTER_SIZE:
+            return b''
+        image.seek(file_size - self.VHD_FOOTER_SIZE)
+        footer = image.read(self.VHD_FOOTER_SIZE)
+        if not footer.startswith(self.VHD_COOKIE):
+            image.seek(0)
+            footer = image.read(self.VHD_FOOTER_SIZE)
+        return footer
@@ -13,6 +13,7 @@
 #
 import json
 import os
+import sys
 from tempfile import NamedTemporaryFile
 
 # project
@@ -30,8 +31,17 @@ class DataOutput(object):
         self.color_json = self._which('pjson')
 
     def display(self):
-        # Currently only one output format is implemented
-        self._json()
+        if self.data_format == 'ndjson':
+            self._ndjson([self.data])
+        else:
+            self._json()
+
+    def stream(self, records):
+        """
+            Output the records of an iterable as newline delimited
+            JSON, every record is printed as soon as it is available
+        """
+        self._ndjson(records)
 
     def _json(self):
         if self.style == 'color':
@@ -49,6 +59,11 @@ class DataOutput(object):
             self.data, sort_keys=True, indent=2, separators=(',', ': ')
         ))
 
+    def _ndjson(self, records):
+        for record in records:
+            print(json.dumps(record, sort_keys=True))
+            sys.stdout.flush()
+
     def _color_json(self):
         out_file = NamedTemporaryFile()
         out_file.write(json.dumps(self.data, sort_keys=True))
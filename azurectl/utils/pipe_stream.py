@@ -0,0 +1,64 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+class PipeStream(object):
+    """
+        Implements reading from a pipe, e.g stdin, which can neither
+        seek nor tell its size. A read from a pipe may return less
+        data than requested at any time, a read from the pipe stream
+        returns the requested size unless the pipe ends. The last
+        data of the pipe is padded with zeros to a full page, such
+        that it can be written to a page blob
+    """
+    PAGE_SIZE = 512
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.byte_size = 0
+        self.eof = False
+
+    def read(self, size):
+        chunks = []
+        bytes_read = 0
+        while bytes_read < size and not self.eof:
+            data = self.pipe.read(size - bytes_read)
+            if not data:
+                self.eof = True
+                if self.byte_size % self.PAGE_SIZE:
+                    chunks.append(
+                        bytes(self.PAGE_SIZE - self.byte_size % self.PAGE_SIZE)
+                    )
+                break
+            chunks.append(data)
+            bytes_read += len(data)
+            self.byte_size += len(data)
+        return b''.join(chunks)
+
+    def is_exhausted(self):
+        """
+            True if the pipe holds no more data than was read from it
+        """
+        if not self.eof and not self.pipe.read(1):
+            self.eof = True
+        return self.eof
+
+    def close(self):
+        self.pipe.close()
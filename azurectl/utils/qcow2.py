@@ -0,0 +1,236 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import struct
+import zlib
+
+# project
+from azurectl.azurectl_exceptions import AzureQcow2FormatError
+
+
+class Qcow2(object):
+    """
+        Implements reading the virtual disk of a qcow2 image. The
+        clusters of the virtual disk are looked up in the two level
+        cluster tables of the image. Unallocated and zero clusters
+        are holes, which are skipped without reading them, compressed
+        clusters are decompressed. Images with a backing file or
+        encryption are not supported
+    """
+    MAGIC = b'QFI\xfb'
+    HEADER = struct.Struct('>4sIQIIQIIQQIIQ')
+    V3_HEADER = struct.Struct('>QQQII')
+    OFFSET_MASK = 0x00fffffffffffe00
+    COMPRESSED = 1 << 62
+    ZERO = 1
+    DIRTY = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, image_stream):
+        self.image_stream = image_stream
+        self.file_descriptor = image_stream.fileno()
+        (
+            magic, version, backing_file_offset, backing_file_size,
+            self.cluster_bits, self.byte_size, crypt_method, l1_size,
+            l1_table_offset, refcount_table_offset, refcount_table_clusters,
+            nb_snapshots, snapshots_offset
+        ) = self.HEADER.unpack(self.__pread(self.HEADER.size, 0))
+        if magic != self.MAGIC:
+            raise AzureQcow2FormatError('Not a qcow2 image')
+        if version not in (2, 3):
+            raise AzureQcow2FormatError(
+                'qcow2 version %d is not supported' % version
+            )
+        if version == 3:
+            incompatible_features = self.V3_HEADER.unpack(
+                self.__pread(self.V3_HEADER.size, self.HEADER.size)
+            )[0]
+            # a dirty image has stale reference counts only
+            if incompatible_features & ~self.DIRTY:
+                raise AzureQcow2FormatError(
+                    'qcow2 incompatible features 0x%x are not supported' %
+                    incompatible_features
+                )
+        if backing_file_offset:
+            raise AzureQcow2FormatError(
+                'qcow2 images with a backing file are not supported'
+            )
+        if crypt_method:
+            raise AzureQcow2FormatError(
+                'Encrypted qcow2 images are not supported'
+            )
+        if not 9 <= self.cluster_bits <= 21:
+            raise AzureQcow2FormatError(
+                'Invalid qcow2 cluster size of 2^%d bytes' % self.cluster_bits
+            )
+        self.cluster_size = 1 << self.cluster_bits
+        self.l2_bits = self.cluster_bits - 3
+        self.l1_table = struct.unpack(
+            '>%dQ' % l1_size, self.__pread(l1_size * 8, l1_table_offset)
+        )
+        self.l2_table = None
+        self.l2_table_offset = None
+        self.compressed_entry = None
+        self.compressed_cluster = None
+        self.position = 0
+
+    def read(self, size):
+        """
+            Read up to size bytes from the current position. A read
+            returns either data or the zeros of a hole, it ends where
+            the next hole or the next data starts
+        """
+        size = min(size, self.byte_size - self.position)
+        chunks = []
+        bytes_read = 0
+        # host ranges of consecutive clusters are read in one go
+        host_offset = host_size = 0
+        read_hole = self.__is_hole(self.__cluster(self.position))
+        while bytes_read < size:
+            offset = self.position + bytes_read
+            entry = self.__cluster(offset)
+            if self.__is_hole(entry) != read_hole:
+                break
+            cluster_offset = offset & (self.cluster_size - 1)
+            length = min(size - bytes_read, self.cluster_size - cluster_offset)
+            bytes_read += length
+            if read_hole:
+                chunks.append(bytes(length))
+            elif entry & self.COMPRESSED:
+                if host_size:
+                    chunks.append(self.__pread(host_size, host_offset))
+                    host_size = 0
+                chunks.append(
+                    self.__compressed_cluster(entry)[
+                        cluster_offset:cluster_offset + length
+                    ]
+                )
+            elif host_size and host_offset + host_size == \
+                    (entry & self.OFFSET_MASK) + cluster_offset:
+                host_size += length
+            else:
+                if host_size:
+                    chunks.append(self.__pread(host_size, host_offset))
+                host_offset = (entry & self.OFFSET_MASK) + cluster_offset
+                host_size = length
+        if host_size:
+            chunks.append(self.__pread(host_size, host_offset))
+        self.position += bytes_read
+        return b''.join(chunks)
+
+    def skip_hole(self):
+        """
+            Skip the hole at the current position up to the cluster
+            the next data starts in. Returns the number of bytes
+            skipped, which is zero if there is no hole to skip
+        """
+        hole_start = self.position
+        while self.position < self.byte_size:
+            entry = self.__cluster(self.position)
+            if entry is None:
+                # the whole range of the cluster table is unallocated
+                table_size = 1 << (self.cluster_bits + self.l2_bits)
+                self.position = self.__next_boundary(self.position, table_size)
+            elif self.__is_hole(entry):
+                self.position = self.__next_boundary(
+                    self.position, self.cluster_size
+                )
+            else:
+                break
+        self.position = min(self.position, self.byte_size)
+        return self.position - hole_start
+
+    def seek(self, offset):
+        self.position = offset
+
+    def close(self):
+        self.image_stream.close()
+
+    @classmethod
+    def open(self, file_name):
+        return Qcow2(open(file_name, 'rb', buffering=0))
+
+    @classmethod
+    def virtual_size(self, file_name):
+        with self.open(file_name) as qcow2:
+            return qcow2.byte_size
+
+    def __cluster(self, offset):
+        # the cluster table entry of the cluster at the virtual offset,
+        # None if the cluster table itself is not allocated
+        l1_index = offset >> (self.cluster_bits + self.l2_bits)
+        if l1_index >= len(self.l1_table):
+            return None
+        l2_table_offset = self.l1_table[l1_index] & self.OFFSET_MASK
+        if not l2_table_offset:
+            return None
+        if l2_table_offset != self.l2_table_offset:
+            self.l2_table = struct.unpack(
+                '>%dQ' % (1 << self.l2_bits),
+                self.__pread(self.cluster_size, l2_table_offset)
+            )
+            self.l2_table_offset = l2_table_offset
+        l2_index = offset >> self.cluster_bits & ((1 << self.l2_bits) - 1)
+        return self.l2_table[l2_index]
+
+    def __is_hole(self, entry):
+        if entry is None:
+            return True
+        if entry & self.COMPRESSED:
+            return False
+        return bool(entry & self.ZERO or not entry & self.OFFSET_MASK)
+
+    def __compressed_cluster(self, entry):
+        # the last decompressed cluster is kept for the reads of
+        # its remaining data
+        if entry != self.compressed_entry:
+            offset_bits = 62 - (self.cluster_bits - 8)
+            host_offset = entry & ((1 << offset_bits) - 1)
+            sectors = (
+                entry >> offset_bits & ((1 << (self.cluster_bits - 8)) - 1)
+            ) + 1
+            # the sector count is an upper bound of the compressed
+            # size, which may reach beyond the end of the image
+            compressed = os.pread(
+                self.file_descriptor,
+                sectors * 512 - (host_offset & 511),
+                host_offset
+            )
+            cluster = zlib.decompressobj(-12).decompress(
+                compressed, self.cluster_size
+            )
+            if len(cluster) != self.cluster_size:
+                raise AzureQcow2FormatError(
+                    'Corrupt compressed qcow2 cluster at offset %d' %
+                    host_offset
+                )
+            self.compressed_entry = entry
+            self.compressed_cluster = cluster
+        return self.compressed_cluster
+
+    def __pread(self, size, offset):
+        data = os.pread(self.file_descriptor, size, offset)
+        if len(data) != size:
+            raise AzureQcow2FormatError(
+                'qcow2 image ended before offset %d' % (offset + size)
+            )
+        return data
+
+    def __next_boundary(self, offset, alignment):
+        return (offset // alignment + 1) * alignment
@@ -0,0 +1,152 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import random
+import threading
+import time
+
+
+class TokenBucket(object):
+    """
+        Thread safe token bucket. Tokens accrue at rate per second up
+        to capacity, which defaults to one second worth of tokens.
+        Consuming more tokens than the capacity is possible once the
+        bucket is full and leaves a debt, which the following
+        consumers wait for
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.timestamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, count):
+        """
+            Take count tokens, wait until they are available
+        """
+        while True:
+            delay = self.__take(count)
+            if not delay:
+                return
+            time.sleep(delay)
+
+    def __take(self, count):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.timestamp) * self.rate
+            )
+            self.timestamp = now
+            required = min(count, self.capacity)
+            if self.tokens >= required:
+                self.tokens -= count
+                return 0
+            return (required - self.tokens) / self.rate
+
+
+class RateLimit(object):
+    """
+        Limit of the bytes and requests per second sent by all threads
+        of an upload. A server busy response pauses all requests for
+        a random time below an exponentially growing limit, such that
+        throttled clients do not all retry at the same time
+    """
+    BACKOFF = 0.5
+    MAX_BACKOFF = 60.0
+    SERVER_BUSY_STATUS = (500, 503)
+
+    def __init__(self, max_bandwidth=None, max_requests=None):
+        self.bandwidth = None
+        if max_bandwidth:
+            self.bandwidth = TokenBucket(int(max_bandwidth))
+        self.requests = None
+        if max_requests:
+            self.requests = TokenBucket(int(max_requests))
+        self.resume_time = 0
+        self.busy_responses = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def backoff_delay(cls, attempt):
+        """
+            Random delay before retry number attempt, the full jitter
+            spreads the retries of concurrent requests
+        """
+        return random.uniform(
+            0, min(cls.MAX_BACKOFF, cls.BACKOFF * 2 ** (attempt - 1))
+        )
+
+    def acquire(self, byte_count=0):
+        """
+            Wait until a request sending byte_count bytes is allowed
+        """
+        while True:
+            with self.lock:
+                delay = self.resume_time - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+        if self.requests:
+            self.requests.consume(1)
+        if self.bandwidth and byte_count:
+            self.bandwidth.consume(byte_count)
+
+    def server_busy(self):
+        """
+            Pause all requests after a server busy response
+        """
+        with self.lock:
+            self.busy_responses += 1
+            self.resume_time = max(
+                self.resume_time,
+                time.monotonic() + self.backoff_delay(self.busy_responses)
+            )
+
+    def retry(
+        self, error_class, message, max_attempts, byte_count, request,
+        *args, **kwargs
+    ):
+        """
+            Call request with the given arguments up to max_attempts
+            times and return its result. A server busy response pauses
+            all requests, any other failure waits for the backoff
+            delay of the attempt. If all attempts fail error_class is
+            raised with message and the errors of all attempts
+        """
+        errors = []
+        while len(errors) < max_attempts:
+            self.acquire(byte_count)
+            try:
+                result = request(*args, **kwargs)
+                self.success()
+                return result
+            except Exception as e:
+                errors.append('%s: %s' % (type(e).__name__, format(e)))
+                if len(errors) == max_attempts:
+                    break
+                if getattr(e, 'status_code', None) in \
+                        self.SERVER_BUSY_STATUS:
+                    self.server_busy()
+                else:
+                    time.sleep(self.backoff_delay(len(errors)))
+
+        raise error_class('%s: %s' % (message, '\n'.join(errors)))
+
+    def success(self):
+        """
+            Reset the backoff after a successful request
+        """
+        with self.lock:
+            self.busy_responses = 0
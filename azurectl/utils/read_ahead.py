@@ -0,0 +1,88 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+from queue import Queue, Empty
+
+
+class ReadAhead(object):
+    """
+        Implements reading from a data stream in a background thread.
+        Up to depth chunks of chunk_size bytes are read ahead into a
+        bounded queue while the consumer processes earlier data, e.g
+        to decompress while the previous chunk is uploaded
+    """
+    DEFAULT_DEPTH = 4
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, data_stream, chunk_size, depth=DEFAULT_DEPTH):
+        self.data_stream = data_stream
+        self.chunk_size = int(chunk_size)
+        self.chunks = Queue(maxsize=max(int(depth), 1))
+        self.chunk = memoryview(b'')
+        self.eof = False
+        self.closed = threading.Event()
+        self.reader = threading.Thread(target=self.__read_chunks)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def read(self, size):
+        parts = []
+        bytes_read = 0
+        while bytes_read < size:
+            if not self.chunk:
+                if self.eof:
+                    break
+                chunk = self.chunks.get()
+                if isinstance(chunk, Exception):
+                    self.eof = True
+                    raise chunk
+                if not chunk:
+                    self.eof = True
+                    break
+                self.chunk = memoryview(chunk)
+            part = self.chunk[:size - bytes_read]
+            self.chunk = self.chunk[len(part):]
+            bytes_read += len(part)
+            parts.append(part)
+
+        if not parts:
+            return None
+        return b''.join(parts)
+
+    def close(self):
+        self.closed.set()
+        # unblock the reader if it waits for space in the queue
+        try:
+            while True:
+                self.chunks.get_nowait()
+        except Empty:
+            pass
+        self.reader.join()
+        self.data_stream.close()
+
+    def __read_chunks(self):
+        while not self.closed.is_set():
+            try:
+                chunk = self.data_stream.read(self.chunk_size)
+            except Exception as e:
+                self.chunks.put(e)
+                return
+            self.chunks.put(chunk)
+            if not chunk:
+                return
@@ -0,0 +1,98 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import errno
+import os
+
+
+class SparseFile(object):
+    """
+        Implements reading of sparse files. The allocated extents of
+        the file are looked up with lseek(SEEK_DATA/SEEK_HOLE), such
+        that holes can be skipped instead of being read
+    """
+    PAGE_SIZE = 512
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, file_stream):
+        self.file_stream = file_stream
+        self.file_descriptor = file_stream.fileno()
+        self.file_size = os.fstat(self.file_descriptor).st_size
+        self.position = 0
+
+    def read(self, size):
+        """
+            Read up to size bytes from the current position. A read
+            never extends into the next hole by more than the page
+            the hole starts in
+        """
+        hole_start = self.__next_hole()
+        if hole_start > self.position:
+            size = min(size, self.__page_align_up(hole_start) - self.position)
+        data = os.pread(self.file_descriptor, size, self.position)
+        self.position += len(data)
+        return data
+
+    def skip_hole(self):
+        """
+            Skip the hole at the current position up to the page the
+            next data extent starts in. Returns the number of bytes
+            skipped, which is zero if there is no hole to skip
+        """
+        data_start = self.__page_align_down(self.__next_data())
+        if data_start > self.position:
+            hole_size = data_start - self.position
+            self.position = data_start
+            return hole_size
+        return 0
+
+    def seek(self, offset):
+        self.position = offset
+
+    def close(self):
+        self.file_stream.close()
+
+    @classmethod
+    def open(self, file_name):
+        return SparseFile(open(file_name, 'rb', buffering=0))
+
+    def __next_data(self):
+        if not hasattr(os, 'SEEK_DATA'):
+            # no hole detection available, the file is all data
+            return self.position
+        return self.__lseek(os.SEEK_DATA)
+
+    def __next_hole(self):
+        if not hasattr(os, 'SEEK_HOLE'):
+            return self.file_size
+        return self.__lseek(os.SEEK_HOLE)
+
+    def __lseek(self, whence):
+        try:
+            return os.lseek(self.file_descriptor, self.position, whence)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # position is behind the last data extent
+                return self.file_size
+            raise
+
+    def __page_align_up(self, offset):
+        return -(-offset // self.PAGE_SIZE) * self.PAGE_SIZE
+
+    def __page_align_down(self, offset):
+        return offset // self.PAGE_SIZE * self.PAGE_SIZE
@@ -0,0 +1,225 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import struct
+from datetime import datetime
+from uuid import uuid4
+
+
+class FixedVHD(object):
+    """
+        Implements reading a raw disk image as a fixed VHD. Azure
+        requires the virtual size of a VHD to be aligned to 1MB, the
+        image data is followed by zero padding up to the alignment
+        and the VHD footer. The padding is reported as a hole, such
+        that it is skipped like the holes of the image data
+    """
+    ALIGNMENT = 1048576
+    PAGE_SIZE = 512
+    FOOTER_SIZE = 512
+    SKIP_SIZE = 1048576
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __init__(self, data_stream, data_size=None):
+        """
+            Without a data_size the image data is read up to the end
+            of the data stream, which sets the size of the VHD
+        """
+        self.data_stream = data_stream
+        self.data_size = None
+        self.position = 0
+        if data_size is not None:
+            self.__set_data_size(data_size)
+
+    def read(self, size):
+        """
+            Read up to size bytes from the current position. The
+            last page of image data is filled up with zeros, such
+            that every read ends at a page boundary
+        """
+        if self.data_size is None:
+            data = self.data_stream.read(size)
+            if data:
+                self.position += len(data)
+                return data
+            self.__set_data_size(self.position)
+        if self.position < self.data_size:
+            data = self.data_stream.read(
+                min(size, self.data_size - self.position)
+            )
+            if not data:
+                raise EOFError(
+                    'Disk image ended at %d bytes before its size of %d '
+                    'bytes was reached' % (self.position, self.data_size)
+                )
+            self.position += len(data)
+            if self.position == self.data_size:
+                data += bytes(self.padded_size - self.data_size)
+                self.position = self.padded_size
+            return data
+        if self.position < self.virtual_size:
+            size = min(size, self.virtual_size - self.position)
+            self.position += size
+            return bytes(size)
+        footer_offset = self.position - self.virtual_size
+        data = self.vhd_footer[footer_offset:footer_offset + size]
+        self.position += len(data)
+        return data
+
+    def skip_hole(self):
+        """
+            Skip the hole at the current position, which is either a
+            hole in the image data or the padding up to the alignment.
+            Returns the number of bytes skipped
+        """
+        if self.data_size is None or self.position < self.data_size:
+            if not hasattr(self.data_stream, 'skip_hole'):
+                return 0
+            hole_size = self.data_stream.skip_hole()
+        elif self.position < self.virtual_size:
+            hole_size = self.virtual_size - self.position
+        else:
+            return 0
+        self.position += hole_size
+        return hole_size
+
+    def seek(self, offset):
+        data_offset = offset
+        if self.data_size is not None:
+            data_offset = min(offset, self.data_size)
+        if hasattr(self.data_stream, 'seek'):
+            self.data_stream.seek(data_offset)
+        else:
+            # streams which can not seek are read up to the offset
+            while self.position < data_offset:
+                data = self.data_stream.read(
+                    min(data_offset - self.position, self.SKIP_SIZE)
+                )
+                if not data:
+                    break
+                self.position += len(data)
+        self.position = offset
+
+    def close(self):
+        self.data_stream.close()
+
+    @classmethod
+    def vhd_byte_size(self, data_size):
+        return self.__align_up(data_size, self.ALIGNMENT) + self.FOOTER_SIZE
+
+    @classmethod
+    def footer(self, byte_size):
+        """
+        Kudos to Steven Edouard: https://gist.github.com/sedouard
+        who provided the original implementation of this method.
+
+        Generate the footer of a fixed VHD disk of the specified
+        byte_size. The footer must be conform to the VHD Footer Format
+        Specification at
+        https://technet.microsoft.com/en-us/virtualization/bb676673.aspx#E3B
+        which specifies the data structure as follows:
+        * Field         Size (bytes)
+        * Cookie        8
+        * Features      4
+        * Version       4
+        * Data Offset   8
+        * TimeStamp     4
+        * Creator App   4
+        * Creator Ver   4
+        * CreatorHostOS 4
+        * Original Size 8
+        * Current Size  8
+        * Disk Geo      4
+        * Disk Type     4
+        * Checksum      4
+        * Unique ID     16
+        * Saved State   1
+        * Reserved      427
+        """
+        cylinders, heads, sectors_per_track = self.__disk_geometry(byte_size)
+        # seconds since january 1st 2000
+        timestamp = int(datetime.now().strftime('%s')) - 946684800
+        footer = bytearray(
+            struct.pack(
+                '>8sIIQI4sI4sQQHBBII16s',
+                # the ascii string 'conectix'
+                b'conectix',
+                # no features enabled, the reserved bit is always set
+                0x00000002,
+                # current file version
+                0x00010000,
+                # in the case of a fixed disk, this is set to -1
+                0xffffffffffffffff,
+                timestamp & 0xffffffff,
+                # ascii code for 'wa' = windowsazure
+                b'wa\x00\x00',
+                # version of creator application
+                0x00070000,
+                # creator host os, ascii for 'Wi2k'
+                b'Wi2k',
+                byte_size,
+                byte_size,
+                cylinders,
+                heads,
+                sectors_per_track,
+                # 0x2 = fixed hard disk
+                0x00000002,
+                # the checksum is computed below
+                0,
+                uuid4().bytes
+            )
+        )
+        # saved state and reserved
+        footer += bytearray(self.FOOTER_SIZE - len(footer))
+        # the checksum is the ones complement of the sum of all bytes
+        # of the footer excluding the checksum field
+        footer[64:68] = struct.pack('>I', ~sum(footer) & 0xffffffff)
+        return bytes(footer)
+
+    def __set_data_size(self, data_size):
+        self.data_size = data_size
+        self.padded_size = self.__align_up(data_size, self.PAGE_SIZE)
+        self.virtual_size = self.__align_up(data_size, self.ALIGNMENT)
+        self.vhd_footer = self.footer(self.virtual_size)
+
+    @classmethod
+    def __disk_geometry(self, byte_size):
+        # CHS calculation as specified in appendix A of the VHD
+        # specification
+        total_sectors = min(byte_size // 512, 65535 * 16 * 255)
+        if total_sectors >= 65535 * 16 * 63:
+            sectors_per_track = 255
+            heads = 16
+        else:
+            sectors_per_track = 17
+            heads = max(
+                (total_sectors // sectors_per_track + 1023) // 1024, 4
+            )
+            if total_sectors // sectors_per_track >= heads * 1024 or \
+                    heads > 16:
+                sectors_per_track = 31
+                heads = 16
+            if total_sectors // sectors_per_track >= heads * 1024:
+                sectors_per_track = 63
+                heads = 16
+        cylinders = total_sectors // sectors_per_track // heads
+        return cylinders, heads, sectors_per_track
+
+    @staticmethod
+    def __align_up(offset, alignment):
+        return -(-offset // alignment) * alignment
@@ -13,53 +13,157 @@
 #
 import lzma
 import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+# project
+from azurectl.utils.decompressor import Decompressor
+from azurectl.utils.xz_index import XZIndex
+from azurectl.azurectl_exceptions import AzureXZIndexError
 
-class XZ(object):
+
+class XZ(Decompressor):
+    """
+        Implements decompression of xz compressed files
+    """
+    LZMA_STREAM_BUFFER_SIZE = Decompressor.STREAM_BUFFER_SIZE
+
+    def new_decompressor(self):
+        return lzma.LZMADecompressor()
+
+    @classmethod
+    def uncompressed_size(self, file_name):
+        # the xz index records the uncompressed size of all blocks,
+        # the size of files without a usable index is unknown
+        try:
+            return XZIndex(file_name).uncompressed_size()
+        except AzureXZIndexError:
+            return None
+
+    @classmethod
+    def uncompressed_tail(self, file_name, byte_size):
+        # only the last blocks listed in the xz index are decompressed
+        try:
+            blocks = XZIndex(file_name).blocks
+        except AzureXZIndexError:
+            return super(XZ, self).uncompressed_tail(file_name, byte_size)
+        tail = b''
+        for block in reversed(blocks):
+            if len(tail) >= byte_size:
+                break
+            tail = lzma.decompress(
+                XZIndex.block_stream(file_name, block)
+            ) + tail
+        return tail[-byte_size:]
+
+
+class LZMA(Decompressor):
+    """
+        Implements decompression of files in the legacy lzma format,
+        which records the uncompressed size in its header unless it
+        was compressed from a stream
+    """
+    HEADER = struct.Struct('<BIQ')
+    UNKNOWN_SIZE = 0xffffffffffffffff
+
+    def new_decompressor(self):
+        return lzma.LZMADecompressor(lzma.FORMAT_ALONE)
+
+    @classmethod
+    def uncompressed_size(self, file_name):
+        with open(file_name, 'rb') as lzma_file:
+            header = lzma_file.read(self.HEADER.size)
+        if len(header) == self.HEADER.size:
+            byte_size = self.HEADER.unpack(header)[2]
+            if byte_size != self.UNKNOWN_SIZE:
+                return byte_size
+        return super(LZMA, self).uncompressed_size(file_name)
+
+
+class ParallelXZ(object):
     """
-        Implements decompression of lzma compressed files
+        Implements decompression of xz compressed files with multiple
+        blocks. Independent blocks are decompressed in a process pool
+        while the decompressed data is handed out in order. The blocks
+        decompressed ahead are limited to max_buffer_size bytes
     """
-    LZMA_STREAM_BUFFER_SIZE = 8192
+    MAX_BUFFER_SIZE = 16777216
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.lzma_stream.close()
+        self.close()
 
-    def __init__(self, lzma_stream, buffer_size=LZMA_STREAM_BUFFER_SIZE):
-        self.buffer_size = int(buffer_size)
-        self.lzma = lzma.LZMADecompressor()
-        self.lzma_stream = lzma_stream
-        self.buffered_bytes = b''
+    def __init__(
+        self, file_name, xz_index, max_workers=None,
+        max_buffer_size=MAX_BUFFER_SIZE
+    ):
+        self.file_name = file_name
+        self.blocks = deque(xz_index.blocks)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_buffer_size = int(max_buffer_size or 0)
+        self.pending_size = 0
+        self.decompress_pool = ProcessPoolExecutor(
+            max_workers=self.max_workers
+        )
+        self.pending_blocks = deque()
+        self.block_data = memoryview(b'')
+        self.__submit_blocks()
 
     def read(self, size):
-        if self.lzma.eof and not self.buffered_bytes:
-            return None
+        chunks = []
+        bytes_read = 0
+        while bytes_read < size:
+            if not self.block_data:
+                if not self.pending_blocks:
+                    break
+                block, pending_block = self.pending_blocks.popleft()
+                self.pending_size -= block.uncompressed_size
+                self.block_data = memoryview(pending_block.result())
+                self.__submit_blocks()
+            chunk = self.block_data[:size - bytes_read]
+            self.block_data = self.block_data[len(chunk):]
+            bytes_read += len(chunk)
+            chunks.append(chunk)
 
-        chunks = self.buffered_bytes
-
-        bytes_uncompressed = len(chunks)
-        while not self.lzma.eof and bytes_uncompressed < size:
-            chunks += self.lzma.decompress(
-                self.lzma.unused_data + self.lzma_stream.read(self.buffer_size)
-            )
-            bytes_uncompressed = len(chunks)
-
-        self.buffered_bytes = chunks[size:]
-        return chunks[:size]
+        if not chunks:
+            return None
+        return b''.join(chunks)
 
-    @classmethod
     def close(self):
-        self.lzma_stream.close()
+        for block, pending_block in self.pending_blocks:
+            pending_block.cancel()
+        self.decompress_pool.shutdown()
 
     @classmethod
-    def open(self, file_name, buffer_size=LZMA_STREAM_BUFFER_SIZE):
-        self.lzma_stream = open(file_name, 'rb')
-        return XZ(self.lzma_stream, buffer_size)
+    def open(
+        self, file_name, max_workers=None, max_buffer_size=MAX_BUFFER_SIZE
+    ):
+        return ParallelXZ(
+            file_name, XZIndex(file_name), max_workers, max_buffer_size
+        )
 
-    @classmethod
-    def uncompressed_size(self, file_name):
-        with lzma.open(file_name) as lzma_stream:
-            lzma_stream.seek(0, os.SEEK_END)
-            return lzma_stream.tell()
+    @staticmethod
+    def decompress_block(file_name, block):
+        return lzma.decompress(XZIndex.block_stream(file_name, block))
+
+    def __submit_blocks(self):
+        # decompress ahead by up to two blocks per worker as long as
+        # the decompressed blocks fit into the buffer size, one block
+        # is always decompressed ahead however large it is
+        while self.blocks and \
+                len(self.pending_blocks) < 2 * self.max_workers:
+            block = self.blocks[0]
+            if self.pending_blocks and self.pending_size + \
+                    block.uncompressed_size > self.max_buffer_size:
+                break
+            self.blocks.popleft()
+            self.pending_size += block.uncompressed_size
+            self.pending_blocks.append((
+                block,
+                self.decompress_pool.submit(
+                    ParallelXZ.decompress_block, self.file_name, block
+                )
+            ))
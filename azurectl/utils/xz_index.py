@@ -0,0 +1,170 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+# project
+from azurectl.azurectl_exceptions import AzureXZIndexError
+
+XZBlock = namedtuple(
+    'XZBlock',
+    'stream_header offset unpadded_size uncompressed_size'
+)
+
+
+class XZIndex(object):
+    """
+        Implements reading of the block index of xz compressed files.
+        The index is located from the stream footer at the end of
+        the file, all streams of a multi stream file are covered
+    """
+    HEADER_MAGIC = b'\xfd7zXZ\x00'
+    FOOTER_MAGIC = b'YZ'
+    HEADER_SIZE = 12
+    FOOTER_SIZE = 12
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.blocks = []
+        try:
+            with open(file_name, 'rb') as xz_stream:
+                self.__read_streams(xz_stream)
+        except AzureXZIndexError:
+            raise
+        except Exception as e:
+            raise AzureXZIndexError(
+                '%s: %s' % (type(e).__name__, format(e))
+            )
+
+    def uncompressed_size(self):
+        return sum(block.uncompressed_size for block in self.blocks)
+
+    @classmethod
+    def block_stream(self, file_name, block):
+        """
+            Standalone xz stream holding only the given block, which
+            can be decompressed independent of all other blocks
+        """
+        with open(file_name, 'rb') as xz_stream:
+            xz_stream.seek(block.offset)
+            block_data = xz_stream.read(self.__padded(block.unpadded_size))
+        index = b'\x00' + \
+            self.__multibyte(1) + \
+            self.__multibyte(block.unpadded_size) + \
+            self.__multibyte(block.uncompressed_size)
+        index += b'\x00' * (self.__padded(len(index)) - len(index))
+        index += struct.pack('<I', zlib.crc32(index) & 0xffffffff)
+        footer = struct.pack('<I', len(index) // 4 - 1) + \
+            block.stream_header[6:8]
+        footer = struct.pack('<I', zlib.crc32(footer) & 0xffffffff) + \
+            footer + self.FOOTER_MAGIC
+        return block.stream_header + block_data + index + footer
+
+    def __read_streams(self, xz_stream):
+        stream_end = xz_stream.seek(0, os.SEEK_END)
+        while stream_end > 0:
+            stream_end = self.__skip_stream_padding(xz_stream, stream_end)
+            stream_end = self.__read_stream(xz_stream, stream_end)
+
+    def __skip_stream_padding(self, xz_stream, stream_end):
+        while True:
+            xz_stream.seek(stream_end - 4)
+            if xz_stream.read(4) != b'\x00' * 4:
+                return stream_end
+            stream_end -= 4
+
+    def __read_stream(self, xz_stream, stream_end):
+        footer_start = stream_end - self.FOOTER_SIZE
+        xz_stream.seek(footer_start)
+        footer = xz_stream.read(self.FOOTER_SIZE)
+        if len(footer) != self.FOOTER_SIZE or \
+                footer[10:12] != self.FOOTER_MAGIC:
+            raise AzureXZIndexError('xz stream footer not found')
+        if struct.unpack('<I', footer[0:4])[0] != \
+                zlib.crc32(footer[4:10]) & 0xffffffff:
+            raise AzureXZIndexError('xz stream footer CRC mismatch')
+        index_size = (struct.unpack('<I', footer[4:8])[0] + 1) * 4
+
+        index_start = footer_start - index_size
+        xz_stream.seek(index_start)
+        records = self.__read_index(xz_stream.read(index_size))
+
+        blocks_size = sum(
+            self.__padded(unpadded_size) for unpadded_size, _ in records
+        )
+        stream_start = index_start - blocks_size - self.HEADER_SIZE
+        xz_stream.seek(stream_start)
+        stream_header = xz_stream.read(self.HEADER_SIZE)
+        if stream_start < 0 or \
+                stream_header[0:6] != self.HEADER_MAGIC or \
+                stream_header[6:8] != footer[8:10]:
+            raise AzureXZIndexError('xz stream header not found')
+
+        stream_blocks = []
+        block_offset = stream_start + self.HEADER_SIZE
+        for unpadded_size, uncompressed_size in records:
+            stream_blocks.append(
+                XZBlock(
+                    stream_header, block_offset,
+                    unpadded_size, uncompressed_size
+                )
+            )
+            block_offset += self.__padded(unpadded_size)
+        self.blocks[0:0] = stream_blocks
+        return stream_start
+
+    def __read_index(self, index):
+        if len(index) < 8 or index[0:1] != b'\x00':
+            raise AzureXZIndexError('xz index not found')
+        if struct.unpack('<I', index[-4:])[0] != \
+                zlib.crc32(index[:-4]) & 0xffffffff:
+            raise AzureXZIndexError('xz index CRC mismatch')
+        position = 1
+        record_count, position = self.__read_multibyte(index, position)
+        records = []
+        for record in range(record_count):
+            unpadded_size, position = self.__read_multibyte(index, position)
+            uncompressed_size, position = self.__read_multibyte(
+                index, position
+            )
+            records.append((unpadded_size, uncompressed_size))
+        return records
+
+    @classmethod
+    def __read_multibyte(self, data, position):
+        value = 0
+        for shift in range(0, 63, 7):
+            if position >= len(data) - 4:
+                break
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value, position
+        raise AzureXZIndexError('xz index holds an invalid number')
+
+    @classmethod
+    def __multibyte(self, value):
+        encoded = bytearray()
+        while value >= 0x80:
+            encoded.append(value & 0x7f | 0x80)
+            value >>= 7
+        encoded.append(value)
+        return bytes(encoded)
+
+    @classmethod
+    def __padded(self, size):
+        return (size + 3) & ~3
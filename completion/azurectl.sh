@@ -32,7 +32,7 @@ function _azurectl {
                 return 0
                 ;;
             "container")
-                __comp_reply "help show create list sas --help delete"
+                __comp_reply "help show create list sas --help delete usage"
                 return 0
                 ;;
             "share")
@@ -60,7 +60,7 @@ function _azurectl {
                 return 0
                 ;;
             "disk")
-                __comp_reply "sas delete help --help upload"
+                __comp_reply "sas copy delete download help --help upload"
                 return 0
                 ;;
             "disassociate")
@@ -68,7 +68,7 @@ function _azurectl {
                 return 0
                 ;;
             "show")
-                __comp_reply "--disk-name attached --name --cloud-service-name --instance-name"
+                __comp_reply "--disk-name attached --name --cloud-service-name --instance-name --prefix --max-results"
                 return 0
                 ;;
             "shutdown")
@@ -147,8 +147,20 @@ function _azurectl {
                 __comp_reply "--cloud-service-name --instance-name"
                 return 0
                 ;;
+            "usage")
+                __comp_reply "--name --top"
+                return 0
+                ;;
+            "copy")
+                __comp_reply "--blob-name --target --target-blob-name --quiet"
+                return 0
+                ;;
+            "download")
+                __comp_reply "--blob-name --destination --xz --max-chunk-size --threads --max-bandwidth --quiet"
+                return 0
+                ;;
             "upload")
-                __comp_reply "--source --blob-name --max-chunk-size --quiet"
+                __comp_reply "--source --source-list --max-uploads --blob-name --convert-to-vhd --max-chunk-size --adaptive-chunk-size --max-page-gap --threads --max-bandwidth --max-requests --read-ahead --size --resume --delta --verify --quiet"
                 return 0
                 ;;
             "remove")
@@ -156,7 +168,7 @@ function _azurectl {
                 return 0
                 ;;
             "delete")
-                __comp_reply "--disk-name --name --delete-disk --wait --cloud-service-name --instance-name --blob-name"
+                __comp_reply "--disk-name --name --delete-disk --wait --cloud-service-name --instance-name --blob-name --prefix --older-than --threads --dry-run"
                 return 0
                 ;;
             "default")
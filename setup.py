@@ -18,7 +18,7 @@ config = {
     'install_requires': [
         'docopt>=0.6.2',
         'APScheduler>=3.0.2',
-        'azure-storage>=0.30.0',
+        'azure-storage>=0.32.0',
         'azure-servicemanagement-legacy>=0.20.1',
         'python-dateutil>=2.4',
         'pyOpenSSL',
@@ -0,0 +1,170 @@
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import threading
+import time
+from collections import namedtuple
+
+BlobProperties = namedtuple('BlobProperties', 'content_length etag')
+Blob = namedtuple('Blob', 'name properties metadata')
+ResourceProperties = namedtuple('ResourceProperties', 'etag')
+PageRange = namedtuple('PageRange', 'start end')
+
+
+class FakePageBlobService(object):
+    """
+        In-process stand-in for the PageBlobService of the storage
+        SDK. Requests are not sent anywhere, instead every request
+        sleeps for the configured latency plus the time needed to
+        transfer its payload at the configured bandwidth. Only the
+        page ranges are recorded, the page content is discarded
+        unless store_pages is set
+    """
+    MAX_CHUNK_GET_SIZE = 4 * 1024 * 1024
+    PAGE_SIZE = 512
+
+    def __init__(self, latency=0.0, bandwidth=None, store_pages=False):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.store_pages = store_pages
+        self.blobs = {}
+        self.pages = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_uploaded = 0
+        self.etags = {}
+        self.metadata = {}
+
+    def create_blob(self, container_name, blob_name, content_length, **kwargs):
+        self.__request(0)
+        with self.lock:
+            self.blobs[blob_name] = content_length
+            self.pages[blob_name] = {}
+            self.metadata[blob_name] = {}
+            self.__modified(blob_name)
+
+    def resize_blob(self, container_name, blob_name, content_length, **kwargs):
+        self.__request(0)
+        with self.lock:
+            self.blobs[blob_name] = content_length
+            self.pages[blob_name] = dict(
+                (start_range, page)
+                for start_range, page in self.pages[blob_name].items()
+                if start_range < content_length
+            )
+            self.__modified(blob_name)
+
+    def update_page(
+        self, container_name, blob_name, page, start_range, end_range,
+        **kwargs
+    ):
+        if not isinstance(page, bytes):
+            raise TypeError('page should be of type bytes')
+        if start_range % self.PAGE_SIZE or \
+                (end_range + 1) % self.PAGE_SIZE or \
+                end_range - start_range + 1 != len(page):
+            raise ValueError(
+                'invalid page range %d-%d' % (start_range, end_range)
+            )
+        if end_range >= self.blobs[blob_name]:
+            raise ValueError('page range exceeds the blob size')
+        self.__request(len(page))
+        with self.lock:
+            self.bytes_uploaded += len(page)
+            self.__clear(blob_name, start_range, end_range)
+            self.pages[blob_name][start_range] = \
+                page if self.store_pages else len(page)
+            self.__modified(blob_name)
+
+    def clear_page(
+        self, container_name, blob_name, start_range, end_range, **kwargs
+    ):
+        self.__request(0)
+        with self.lock:
+            self.__clear(blob_name, start_range, end_range)
+            self.__modified(blob_name)
+
+    def get_blob_properties(self, container_name, blob_name, **kwargs):
+        self.__request(0)
+        return Blob(
+            blob_name,
+            BlobProperties(self.blobs[blob_name], self.etags[blob_name]),
+            dict(self.metadata[blob_name])
+        )
+
+    def set_blob_metadata(
+        self, container_name, blob_name, metadata=None, **kwargs
+    ):
+        self.__request(0)
+        with self.lock:
+            self.metadata[blob_name] = dict(metadata or {})
+            self.__modified(blob_name)
+            return ResourceProperties(self.etags[blob_name])
+
+    def get_page_ranges(self, container_name, blob_name, **kwargs):
+        self.__request(0)
+        page_ranges = []
+        with self.lock:
+            for start_range, page in sorted(self.pages[blob_name].items()):
+                end_range = start_range - 1 + (
+                    page if isinstance(page, int) else len(page)
+                )
+                if page_ranges and page_ranges[-1].end + 1 == start_range:
+                    start_range = page_ranges.pop().start
+                page_ranges.append(PageRange(start_range, end_range))
+        return page_ranges
+
+    def blob_content(self, blob_name):
+        """
+            Content of a blob created with store_pages set
+        """
+        content = bytearray(self.blobs[blob_name])
+        for start_range, page in sorted(self.pages[blob_name].items()):
+            content[start_range:start_range + len(page)] = page
+        return bytes(content[:self.blobs[blob_name]])
+
+    def __clear(self, blob_name, start_range, end_range):
+        # pages are stored as written, a write or clear splits the
+        # stored pages it overlaps
+        pages = self.pages[blob_name]
+        for page_start, page in list(pages.items()):
+            page_length = page if isinstance(page, int) else len(page)
+            page_end = page_start + page_length
+            if page_end <= start_range or page_start > end_range:
+                continue
+            del pages[page_start]
+            if page_start < start_range:
+                pages[page_start] = self.__slice(
+                    page, 0, start_range - page_start
+                )
+            if page_end > end_range + 1:
+                pages[end_range + 1] = self.__slice(
+                    page, end_range + 1 - page_start, page_length
+                )
+
+    def __slice(self, page, start, end):
+        if isinstance(page, int):
+            return end - start
+        return page[start:end]
+
+    def __modified(self, blob_name):
+        self.etags[blob_name] = '"0x%x"' % self.requests
+
+    def __request(self, payload_size):
+        with self.lock:
+            self.requests += 1
+        delay = self.latency
+        if self.bandwidth:
+            delay += payload_size / self.bandwidth
+        if delay:
+            time.sleep(delay)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2015 SUSE Linux GmbH.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""
+    Throughput benchmark of the disk image upload
+
+    Runs Storage.upload for raw, sparse and xz compressed images of
+    the given sizes and zero ratios against an in-process fake page
+    blob service with configurable latency and bandwidth. Every
+    upload runs in its own process, such that CPU time and peak RSS
+    are measured per upload
+"""
+import argparse
+import json
+import logging
+import lzma
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from mock import patch
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+)
+
+# project
+import azurectl.logger  # noqa: E402
+azurectl.logger.init(logging.WARN)
+from azurectl.storage.storage import Storage  # noqa: E402
+from fake_page_blob_service import FakePageBlobService  # noqa: E402
+
+MB = 1024 * 1024
+SEGMENT_SIZE = MB
+EXTENT_ALIGNMENT = 65536
+
+
+class BenchmarkAccount(object):
+    """
+        Storage account which needs no configuration file
+    """
+    def storage_name(self):
+        return 'benchmark'
+
+    def storage_key(self):
+        return 'benchmark'
+
+    def get_blob_service_host_base(self):
+        return 'core.windows.net'
+
+
+def create_image(file_name, byte_size, zero_ratio, sparse):
+    """
+        Image of random data extents followed by zeros in every
+        segment, for a sparse image the zeros are holes
+    """
+    data_size = int(SEGMENT_SIZE * (1 - zero_ratio))
+    data_size -= data_size % EXTENT_ALIGNMENT
+    with open(file_name, 'wb') as image:
+        for offset in range(0, byte_size, SEGMENT_SIZE):
+            segment_size = min(SEGMENT_SIZE, byte_size - offset)
+            extent_size = min(data_size, segment_size)
+            image.seek(offset)
+            image.write(os.urandom(extent_size))
+            if not sparse:
+                image.write(bytes(segment_size - extent_size))
+        image.truncate(byte_size)
+
+
+def create_xz_image(file_name, raw_file_name, block_size):
+    """
+        Compress into one xz stream per block like a multi threaded
+        xz does, which allows parallel decompression
+    """
+    with open(raw_file_name, 'rb') as raw, open(file_name, 'wb') as image:
+        while True:
+            block = raw.read(block_size)
+            if not block:
+                break
+            image.write(lzma.compress(block, preset=0))
+
+
+def read_image(file_name, image_format):
+    if image_format == 'xz':
+        with lzma.open(file_name) as image:
+            return image.read()
+    with open(file_name, 'rb') as image:
+        return image.read()
+
+
+def upload(file_name, image_format, byte_size, zero_ratio, args, results):
+    # keep the upload manifests out of the cache of the user
+    os.environ['HOME'] = os.path.dirname(file_name)
+    service = FakePageBlobService(
+        args.latency / 1000.0, args.bandwidth * MB, args.verify
+    )
+    storage = Storage(BenchmarkAccount(), 'benchmark')
+    with patch(
+        'azurectl.storage.storage.PageBlobService', return_value=service
+    ):
+        start = time.time()
+        storage.upload(
+            file_name, 'benchmark', args.chunk_size,
+            max_threads=args.threads,
+            max_page_gap=args.max_page_gap,
+            adaptive_chunk_size=args.adaptive_chunk_size,
+            max_bandwidth=int(args.max_bandwidth * MB) or None,
+            read_ahead=args.read_ahead
+        )
+        elapsed = time.time() - start
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = {
+        'format': image_format,
+        'size_mb': byte_size // MB,
+        'zero_ratio': zero_ratio,
+        'seconds': round(elapsed, 3),
+        'mb_per_second': round(byte_size / MB / elapsed, 1),
+        'requests': service.requests,
+        'uploaded_mb': round(service.bytes_uploaded / MB, 1),
+        'skipped_mb': round((byte_size - service.bytes_uploaded) / MB, 1),
+        'cpu_seconds': round(
+            usage.ru_utime + usage.ru_stime +
+            children_usage.ru_utime + children_usage.ru_stime, 3
+        ),
+        # ru_maxrss is reported in kilobytes on linux
+        'peak_rss_mb': round(
+            max(usage.ru_maxrss, children_usage.ru_maxrss) / 1024.0, 1
+        )
+    }
+    if args.verify:
+        result['verified'] = \
+            service.blob_content('benchmark') == \
+            read_image(file_name, image_format)
+    results.put(result)
+
+
+def run(file_name, image_format, byte_size, zero_ratio, args):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(
+        target=upload,
+        args=(file_name, image_format, byte_size, zero_ratio, args, results)
+    )
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def print_table(results):
+    columns = [
+        ('format', 'format', '%-6s'),
+        ('size_mb', 'MB', '%6d'),
+        ('zero_ratio', 'zero', '%5.2f'),
+        ('mb_per_second', 'MB/s', '%8.1f'),
+        ('requests', 'requests', '%8d'),
+        ('uploaded_mb', 'sent MB', '%8.1f'),
+        ('skipped_mb', 'skip MB', '%8.1f'),
+        ('cpu_seconds', 'CPU s', '%7.2f'),
+        ('peak_rss_mb', 'RSS MB', '%7.1f')
+    ]
+    if 'verified' in results[0]:
+        columns.append(('verified', 'ok', '%3s'))
+    widths = [len(column_format % 0) for _, _, column_format in columns]
+    print(' '.join(
+        title.rjust(width)
+        for (_, title, _), width in zip(columns, widths)
+    ))
+    for result in results:
+        print(' '.join(
+            column_format % result[key]
+            for key, _, column_format in columns
+        ))
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the disk image upload against a fake '
+        'page blob service'
+    )
+    parser.add_argument(
+        '--sizes', default='64,256',
+        help='comma separated image sizes in MB (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--zero-ratios', default='0,0.5,0.9',
+        help='comma separated ratios of zero data (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--formats', default='raw,sparse,xz',
+        help='comma separated image formats (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--latency', type=float, default=10.0,
+        help='latency of a request in ms (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--bandwidth', type=float, default=100.0,
+        help='bandwidth of a request in MB/s (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--chunk-size', type=int,
+        help='max chunk size in bytes (default: the SDK max)'
+    )
+    parser.add_argument(
+        '--threads', type=int, default=4,
+        help='upload threads (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--max-bandwidth', type=float, default=0,
+        help='upload bandwidth limit in MB/s (default: unlimited)'
+    )
+    parser.add_argument(
+        '--adaptive-chunk-size', action='store_true',
+        help='adapt the page update size to the observed throughput'
+    )
+    parser.add_argument(
+        '--max-page-gap', type=int,
+        help='max zero gap in bytes within one request'
+    )
+    parser.add_argument(
+        '--read-ahead', type=int,
+        help='chunks decompressed ahead of the upload'
+    )
+    parser.add_argument(
+        '--xz-block-size', type=int, default=16,
+        help='uncompressed xz block size in MB (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--verify', action='store_true',
+        help='compare the uploaded blob with the image'
+    )
+    parser.add_argument(
+        '--json', action='store_true',
+        help='print the results as json'
+    )
+    parser.add_argument(
+        '--work-dir',
+        help='directory for the generated images (default: a temp dir)'
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    work_dir = tempfile.mkdtemp(prefix='azurectl-benchmark.', dir=args.work_dir)
+    formats = args.formats.split(',')
+    results = []
+    try:
+        for size in args.sizes.split(','):
+            byte_size = int(size) * MB
+            for zero_ratio in args.zero_ratios.split(','):
+                zero_ratio = float(zero_ratio)
+                raw = os.path.join(work_dir, 'image.raw')
+                sparse = os.path.join(work_dir, 'image.sparse')
+                images = {
+                    'raw': raw,
+                    'sparse': sparse,
+                    'xz': os.path.join(work_dir, 'image.raw.xz')
+                }
+                if 'sparse' in formats:
+                    create_image(sparse, byte_size, zero_ratio, True)
+                if 'raw' in formats or 'xz' in formats:
+                    create_image(raw, byte_size, zero_ratio, False)
+                if 'xz' in formats:
+                    create_xz_image(
+                        images['xz'], raw, args.xz_block_size * MB
+                    )
+                for image_format in formats:
+                    results.append(
+                        run(
+                            images[image_format], image_format,
+                            byte_size, zero_ratio, args
+                        )
+                    )
+                for image in images.values():
+                    if os.path.exists(image):
+                        os.remove(image)
+    finally:
+        shutil.rmtree(work_dir)
+
+    if args.json:
+        print(json.dumps(results, indent=4))
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
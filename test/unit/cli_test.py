@@ -32,9 +32,12 @@ class TestCli:
         self.help_command_args = {
             '--expiry-datetime': '30 days from start',
             '--help': False,
+            '--max-results': None,
             '--name': None,
             '--permissions': 'rl',
+            '--prefix': None,
             '--start-datetime': 'now',
+            '--top': None,
             '-h': False,
             'container': True,
             'create': False,
@@ -43,7 +46,8 @@ class TestCli:
             'list': True,
             'sas': False,
             'show': False,
-            'storage': True
+            'storage': True,
+            'usage': False
         }
         sys.argv = [
             sys.argv[0], 'storage', 'container', 'list'
@@ -8,6 +8,7 @@ import datetime
 import azurectl
 from pytest import raises
 from azurectl.commands.storage_container import StorageContainerTask
+from azurectl.storage.container_usage import ContainerUsage
 
 from azurectl.azurectl_exceptions import AzureInvalidCommand
 
@@ -43,12 +44,16 @@ class TestStorageContainerTask:
         self.task.command_args['delete'] = False
         self.task.command_args['list'] = False
         self.task.command_args['show'] = False
+        self.task.command_args['usage'] = False
+        self.task.command_args['--top'] = None
         self.task.command_args['sas'] = False
         self.task.command_args['--color'] = False
         self.task.command_args['--start-datetime'] = '2015-01-01'
         self.task.command_args['--expiry-datetime'] = '2015-12-31'
         self.task.command_args['--permissions'] = 'rl'
         self.task.command_args['--name'] = 'some-name'
+        self.task.command_args['--prefix'] = None
+        self.task.command_args['--max-results'] = None
         self.task.command_args['help'] = False
 
     def test_process_storage_container_delete(self):
@@ -74,10 +79,115 @@ class TestStorageContainerTask:
         self.__init_command_args()
         self.task.command_args['container'] = True
         self.task.command_args['show'] = True
+        azurectl.commands.storage_container.Container.return_value.\
+            blobs.return_value = iter([{'name': 'disk.vhd'}])
         self.task.process()
-        self.task.container.content.assert_called_once_with(
-            self.task.command_args['--name']
+        self.task.container.blobs.assert_called_once_with(
+            self.task.command_args['--name'], None, None
+        )
+        assert list(mock_out.call_args[0][0].get().values()) == [
+            {'some-name': ['disk.vhd']}
+        ]
+        mock_out.return_value.display.assert_called_once_with()
+
+    @patch('azurectl.commands.storage_container.DataOutput')
+    def test_process_storage_container_show_ndjson(self, mock_out):
+        self.__init_command_args()
+        self.task.command_args['show'] = True
+        self.task.command_args['--prefix'] = 'disk'
+        self.task.command_args['--max-results'] = '10'
+        self.task.global_args['--output-format'] = 'ndjson'
+        azurectl.commands.storage_container.Container.return_value.\
+            blobs.return_value = iter([{
+                'name': 'disk.vhd',
+                'byte_size': 1024,
+                'last_modified': datetime.datetime(2016, 1, 1),
+                'blob_type': 'PageBlob'
+            }])
+        self.task.process()
+        self.task.container.blobs.assert_called_once_with(
+            'some-name', 'disk', '10'
         )
+        records = mock_out.return_value.stream.call_args[0][0]
+        assert list(records) == [{
+            'name': 'disk.vhd',
+            'byte_size': 1024,
+            'last_modified': '2016-01-01T00:00:00Z',
+            'blob_type': 'PageBlob'
+        }]
+
+    @patch('azurectl.commands.storage_container.DataOutput')
+    def test_process_storage_container_usage(self, mock_out):
+        self.__init_command_args()
+        self.task.command_args['usage'] = True
+        self.task.command_args['--name'] = None
+        self.task.command_args['--top'] = '3'
+        container = azurectl.commands.storage_container.Container.\
+            return_value
+        container.list.return_value = ['images', 'backup']
+        container.usage.side_effect = self.__usage
+        self.task.process()
+        assert sorted(
+            call[0][:2] for call in container.usage.call_args_list
+        ) == [('backup', '3'), ('images', '3')]
+        usage = mock_out.call_args[0][0].get()
+        container_usage, total = [
+            usage[key] for key in sorted(usage)
+        ]
+        assert sorted(container_usage) == ['backup', 'images']
+        assert total['blob_count'] == 2
+        mock_out.return_value.display.assert_called_once_with()
+
+    @patch('azurectl.commands.storage_container.DataOutput')
+    def test_process_storage_container_usage_name(self, mock_out):
+        self.__init_command_args()
+        self.task.command_args['usage'] = True
+        container = azurectl.commands.storage_container.Container.\
+            return_value
+        container.usage.side_effect = self.__usage
+        self.task.process()
+        assert container.usage.call_args[0][:2] == ('some-name', 10)
+        assert not container.list.called
+        usage = mock_out.call_args[0][0].get()
+        assert [sorted(value) for value in usage.values()] == [['some-name']]
+
+    @patch('azurectl.commands.storage_container.DataOutput')
+    def test_process_storage_container_usage_no_containers(self, mock_out):
+        self.__init_command_args()
+        self.task.command_args['usage'] = True
+        self.task.command_args['--name'] = None
+        azurectl.commands.storage_container.Container.return_value.\
+            list.return_value = []
+        self.task.process()
+        usage = mock_out.call_args[0][0].get()
+        assert sorted(
+            value.get('blob_count', 0) for value in usage.values()
+        ) == [0, 0]
+
+    def test_process_storage_container_usage_invalid_top(self):
+        self.__init_command_args()
+        self.task.command_args['usage'] = True
+        self.task.command_args['--top'] = '-1'
+        with raises(AzureInvalidCommand):
+            self.task.process()
+
+    def __usage(self, container, top, now):
+        usage = ContainerUsage(container, top, now)
+        usage.add({
+            'name': 'disk.vhd',
+            'byte_size': 1024,
+            'last_modified': now,
+            'blob_type': 'PageBlob'
+        })
+        return usage
+
+    def test_process_storage_container_show_invalid_max_results(self):
+        self.__init_command_args()
+        self.task.command_args['show'] = True
+        for max_results in ['0', 'ten']:
+            self.task.command_args['--max-results'] = max_results
+            with raises(AzureInvalidCommand):
+                self.task.process()
 
     def test_start_date_validation(self):
         self.__init_command_args()
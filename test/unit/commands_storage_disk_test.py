@@ -6,10 +6,16 @@ import sys
 import mock
 from mock import patch
 from pytest import raises
+from tempfile import NamedTemporaryFile
 import azurectl
 from azurectl.commands.storage_disk import StorageDiskTask
 
-from azurectl.azurectl_exceptions import AzureInvalidCommand
+from azurectl.azurectl_exceptions import (
+    AzureInvalidCommand,
+    AzureStorageCopyError,
+    AzureStorageDeleteError,
+    AzureStorageUploadError
+)
 
 
 class TestStorageDiskTask:
@@ -43,12 +49,34 @@ class TestStorageDiskTask:
         self.task.command_args['disk'] = False
         self.task.command_args['delete'] = False
         self.task.command_args['upload'] = False
+        self.task.command_args['download'] = False
+        self.task.command_args['copy'] = False
+        self.task.command_args['--target'] = []
+        self.task.command_args['--target-blob-name'] = None
+        self.task.command_args['--destination'] = None
+        self.task.command_args['--xz'] = False
         self.task.command_args['sas'] = False
         self.task.command_args['--color'] = False
-        self.task.command_args['--source'] = 'some-file'
+        self.task.command_args['--source'] = ['some-file']
+        self.task.command_args['--source-list'] = None
+        self.task.command_args['--max-uploads'] = None
         self.task.command_args['--max-chunk-size'] = 1024
+        self.task.command_args['--threads'] = 4
+        self.task.command_args['--max-page-gap'] = 0
+        self.task.command_args['--adaptive-chunk-size'] = True
+        self.task.command_args['--max-bandwidth'] = 1048576
+        self.task.command_args['--max-requests'] = 100
+        self.task.command_args['--resume'] = True
+        self.task.command_args['--delta'] = True
+        self.task.command_args['--verify'] = True
+        self.task.command_args['--convert-to-vhd'] = True
+        self.task.command_args['--size'] = None
+        self.task.command_args['--read-ahead'] = 2
         self.task.command_args['--quiet'] = False
         self.task.command_args['--blob-name'] = 'some-name'
+        self.task.command_args['--prefix'] = None
+        self.task.command_args['--older-than'] = None
+        self.task.command_args['--dry-run'] = False
         self.task.command_args['--start-datetime'] = '2015-01-01'
         self.task.command_args['--expiry-datetime'] = '2015-12-31'
         self.task.command_args['--permissions'] = 'rl'
@@ -61,7 +89,11 @@ class TestStorageDiskTask:
         self.task.command_args['upload'] = True
         self.task.process()
         self.task.storage.upload.assert_called_once_with(
-            'some-file', self.task.command_args['--blob-name'], 1024
+            'some-file', self.task.command_args['--blob-name'], 1024,
+            max_threads=4, max_page_gap=0, adaptive_chunk_size=True,
+            max_bandwidth=1048576, max_requests=100,
+            resume=True, read_ahead=2, delta=True, verify=True,
+            convert_to_vhd=True, size=None
         )
 
     @patch('azurectl.commands.storage_disk.BackgroundScheduler')
@@ -83,6 +115,139 @@ class TestStorageDiskTask:
         with raises(SystemExit):
             self.task.process()
 
+    @patch('azurectl.commands.storage_disk.DataOutput')
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_upload_files(self, mock_job, mock_out):
+        self.__init_command_args()
+        self.task.command_args['upload'] = True
+        self.task.command_args['--blob-name'] = None
+        self.task.command_args['--source'] = ['file-a', 'file-b']
+        self.task.command_args['--max-uploads'] = 2
+        self.storage.upload_files.return_value = [
+            {'source': 'file-a', 'blob_name': 'a', 'status': 'uploaded'},
+            {'source': 'file-b', 'blob_name': 'b', 'status': 'uploaded'}
+        ]
+        self.task.process()
+        self.storage.upload_files.assert_called_once_with(
+            [('file-a', None), ('file-b', None)], 2, 1024,
+            max_threads=4, max_page_gap=0, adaptive_chunk_size=True,
+            max_bandwidth=1048576, max_requests=100,
+            resume=True, read_ahead=2, delta=True, verify=True,
+            convert_to_vhd=True
+        )
+        collector = mock_out.call_args[0][0]
+        assert sorted(collector.get()) == ['a', 'b']
+        mock_out.return_value.display.assert_called_once_with()
+        assert not self.storage.upload.called
+
+    @patch('azurectl.commands.storage_disk.DataOutput')
+    def test_process_storage_disk_upload_source_list(self, mock_out):
+        self.__init_command_args()
+        self.task.command_args['upload'] = True
+        self.task.command_args['--quiet'] = True
+        self.task.command_args['--blob-name'] = None
+        self.storage.upload_files.return_value = [
+            {'source': 'file-a', 'blob_name': 'a', 'status': 'uploaded'},
+            {'source': 'file-b', 'blob_name': 'b', 'status': 'failed'}
+        ]
+        with NamedTemporaryFile('w') as source_list:
+            source_list.write('# images\nfile-a a\n\n  file-b\n')
+            source_list.flush()
+            self.task.command_args['--source-list'] = source_list.name
+            with raises(AzureStorageUploadError):
+                self.task.process()
+        assert self.storage.upload_files.call_args[0][0] == [
+            ('file-a', 'a'), ('file-b', None)
+        ]
+
+    def test_process_storage_disk_upload_source_list_invalid(self):
+        self.__init_command_args()
+        self.task.command_args['upload'] = True
+        self.task.command_args['--blob-name'] = None
+        for content in ['# no images\n', 'file-a a b\n']:
+            with NamedTemporaryFile('w') as source_list:
+                source_list.write(content)
+                source_list.flush()
+                self.task.command_args['--source-list'] = source_list.name
+                with raises(AzureInvalidCommand):
+                    self.task.process()
+        self.task.command_args['--source-list'] = '../data/no-such-file'
+        with raises(AzureInvalidCommand):
+            self.task.process()
+
+    def test_process_storage_disk_upload_files_invalid(self):
+        self.__init_command_args()
+        self.task.command_args['upload'] = True
+        self.task.command_args['--source'] = ['file-a', 'file-b']
+        with raises(AzureInvalidCommand):
+            self.task.process()
+        self.task.command_args['--blob-name'] = None
+        self.task.command_args['--source'] = ['file-a', '-']
+        with raises(AzureInvalidCommand):
+            self.task.process()
+        self.task.command_args['--size'] = '1024'
+        for source in [['file-a'], ['file-a', 'file-b']]:
+            self.task.command_args['--source'] = source
+            with raises(AzureInvalidCommand):
+                self.task.process()
+        assert not self.storage.upload_files.called
+        assert not self.storage.upload.called
+
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_download(self, mock_job):
+        self.__init_command_args()
+        self.task.command_args['download'] = True
+        self.task.command_args['--destination'] = 'image.raw.xz'
+        self.task.command_args['--xz'] = True
+        self.task.process()
+        self.storage.download.assert_called_once_with(
+            'some-name', 'image.raw.xz', 1024, max_threads=4,
+            max_bandwidth=1048576, compress=True
+        )
+        mock_job.return_value.add_job.assert_called_once_with(
+            self.storage.print_download_status, 'interval', seconds=3
+        )
+        self.storage.print_download_status.assert_called_once_with()
+
+    def test_process_storage_disk_download_quiet(self):
+        self.__init_command_args()
+        self.task.command_args['download'] = True
+        self.task.command_args['--quiet'] = True
+        self.task.process()
+        assert self.storage.download.called
+        assert not self.storage.print_download_status.called
+
+    @patch('azurectl.commands.storage_disk.AzureAccount')
+    @patch('azurectl.commands.storage_disk.DataOutput')
+    @patch('azurectl.commands.storage_disk.BackgroundScheduler')
+    def test_process_storage_disk_copy(self, mock_job, mock_out, mock_account):
+        self.__init_command_args()
+        self.task.command_args['copy'] = True
+        self.task.command_args['--target'] = ['west', 'east/images']
+        self.task.command_args['--target-blob-name'] = 'copied-name'
+        self.storage.container = 'foo'
+        mock_account.return_value.storage_key.side_effect = \
+            lambda name: name + '-key'
+        self.storage.copy.return_value = [
+            {'account': 'west', 'container': 'foo', 'status': 'copied'},
+            {'account': 'east', 'container': 'images', 'status': 'failed'}
+        ]
+        with raises(AzureStorageCopyError):
+            self.task.process()
+        self.storage.copy.assert_called_once_with(
+            'some-name', [
+                ('west', 'west-key', 'foo'),
+                ('east', 'east-key', 'images')
+            ],
+            'copied-name'
+        )
+        mock_job.return_value.add_job.assert_called_once_with(
+            self.storage.print_copy_status, 'interval', seconds=3
+        )
+        assert sorted(mock_out.call_args[0][0].get()) == [
+            'east/images', 'west/foo'
+        ]
+
     def test_process_storage_disk_delete(self):
         self.__init_command_args()
         self.task.command_args['disk'] = True
@@ -91,6 +256,54 @@ class TestStorageDiskTask:
         self.task.storage.delete.assert_called_once_with(
             self.task.command_args['--blob-name']
         )
+        assert not self.task.storage.delete_blobs.called
+
+    @patch('azurectl.commands.storage_disk.DataOutput')
+    def test_process_storage_disk_delete_blobs(self, mock_out):
+        self.__init_command_args()
+        self.task.command_args['delete'] = True
+        self.task.command_args['--blob-name'] = 'image-*.vhd'
+        self.task.command_args['--older-than'] = '30'
+        self.storage.delete_blobs.return_value = [
+            {'blob_name': 'image-1.vhd', 'status': 'deleted'},
+            {'blob_name': 'image-2.vhd', 'status': 'failed'}
+        ]
+        with raises(AzureStorageDeleteError):
+            self.task.process()
+        self.storage.delete_blobs.assert_called_once_with(
+            'image-*.vhd', None, 30.0, max_threads=4, dry_run=False
+        )
+        assert not self.storage.delete.called
+        assert sorted(mock_out.call_args[0][0].get()) == [
+            'image-1.vhd', 'image-2.vhd'
+        ]
+
+    @patch('azurectl.commands.storage_disk.DataOutput')
+    def test_process_storage_disk_delete_dry_run(self, mock_out):
+        self.__init_command_args()
+        self.task.command_args['delete'] = True
+        self.task.command_args['--blob-name'] = 'image.vhd'
+        self.task.command_args['--dry-run'] = True
+        self.storage.delete_blobs.return_value = [
+            {'blob_name': 'image.vhd', 'status': 'matched'}
+        ]
+        self.task.process()
+        self.storage.delete_blobs.assert_called_once_with(
+            'image.vhd', None, None, max_threads=4, dry_run=True
+        )
+        mock_out.return_value.display.assert_called_once_with()
+
+    def test_process_storage_disk_delete_validation(self):
+        self.__init_command_args()
+        self.task.command_args['delete'] = True
+        self.task.command_args['--blob-name'] = None
+        with raises(AzureInvalidCommand):
+            self.task.process()
+        for older_than in ['a week', '-1', 'nan', 'inf', '1e12']:
+            self.task.command_args['--older-than'] = older_than
+            with raises(AzureInvalidCommand):
+                self.task.process()
+        assert not self.storage.delete_blobs.called
 
     def test_with_storage_container_arg(self):
         self.__init_command_args()
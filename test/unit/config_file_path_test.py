@@ -37,6 +37,10 @@ class TestConfigFilePath:
         assert self.paths.default_new_account_config() == \
             os.environ['HOME'] + '/.config/azurectl/bob.config'
 
+    def test_cache_directory(self):
+        assert self.paths.cache_directory() == \
+            os.environ['HOME'] + '/.cache/azurectl'
+
     @patch('glob.iglob')
     def test_account_config(self, mock_glob):
         mock_glob.return_value = ['a', 'b', 'c']
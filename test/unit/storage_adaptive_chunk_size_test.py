@@ -0,0 +1,56 @@
+from .test_helper import argv_kiwi_tests
+
+from azurectl.storage.adaptive_chunk_size import AdaptiveChunkSize
+
+
+class TestAdaptiveChunkSize:
+    def setup(self):
+        self.chunk_size = AdaptiveChunkSize(1048576)
+
+    def test_init(self):
+        assert self.chunk_size.current() == 1048576
+        assert AdaptiveChunkSize(8388608).current() == 4194304
+        chunk_size = AdaptiveChunkSize(4000, min_size=65536)
+        assert chunk_size.current() == 3584
+        assert chunk_size.min_size == 3584
+
+    def test_errors_decrease(self):
+        self.__window(1048576, 1.0, errors=1)
+        assert self.chunk_size.current() == 524288
+        for size in [262144, 131072, 65536, 65536]:
+            self.chunk_size.record_error()
+            self.__window(size, 1.0, errors=0, requests=7)
+            assert self.chunk_size.current() == size
+
+    def test_increase_after_hold(self):
+        self.__window(1048576, 1.0, errors=1)
+        for window in range(AdaptiveChunkSize.HOLD_WINDOWS):
+            assert self.chunk_size.current() == 524288
+            self.__window(524288, 0.5)
+        assert self.chunk_size.current() == 1048576
+
+    def test_throughput_drop_decreases(self):
+        self.chunk_size.size = 262144
+        self.__window(262144, 0.5)
+        assert self.chunk_size.current() == 524288
+        self.__window(524288, 1.0)
+        assert self.chunk_size.current() == 1048576
+        self.__window(1048576, 4.0)
+        assert self.chunk_size.current() == 524288
+        assert self.chunk_size.ceiling == 524288
+        self.__window(524288, 1.0)
+        assert self.chunk_size.current() == 524288
+
+    def test_small_requests_do_not_measure(self):
+        self.chunk_size.size = 262144
+        self.__window(4096, 10.0)
+        assert self.chunk_size.current() == 262144
+        assert self.chunk_size.throughput is None
+
+    def __window(self, byte_count, seconds, errors=0, requests=None):
+        if requests is None:
+            requests = AdaptiveChunkSize.WINDOW - errors
+        for error in range(errors):
+            self.chunk_size.record_error()
+        for request in range(requests):
+            self.chunk_size.record(byte_count, seconds)
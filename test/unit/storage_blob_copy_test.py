@@ -0,0 +1,66 @@
+from .test_helper import argv_kiwi_tests
+
+import mock
+from azure.storage.blob.models import CopyProperties
+
+from azurectl.storage.blob_copy import BlobCopy
+
+
+class TestBlobCopy:
+    def setup(self):
+        self.blob_service = mock.Mock()
+        self.blob_copy = BlobCopy(self.blob_service, 'container', 'blob')
+
+    def test_start(self):
+        self.blob_service.copy_blob.return_value = self.__copy('pending')
+        self.blob_copy.start('https://source?sas')
+        self.blob_service.copy_blob.assert_called_once_with(
+            'container', 'blob', 'https://source?sas'
+        )
+        assert self.blob_copy.is_pending()
+        assert self.blob_copy.copied_bytes == 0
+
+    def test_start_failed(self):
+        self.blob_service.copy_blob.side_effect = Exception('no container')
+        self.blob_copy.start('https://source?sas')
+        assert self.blob_copy.status == BlobCopy.FAILED
+        assert self.blob_copy.error == 'Exception: no container'
+
+    def test_poll(self):
+        for copy in [
+            self.__copy('pending', '512/1024'),
+            self.__copy('success', '1024/1024')
+        ]:
+            self.blob_service.get_blob_properties.return_value.properties.\
+                copy = copy
+            self.blob_copy.poll()
+            assert self.blob_copy.copied_bytes == \
+                int(copy.progress.split('/')[0])
+        self.blob_service.get_blob_properties.assert_called_with(
+            'container', 'blob'
+        )
+        assert self.blob_copy.status == BlobCopy.SUCCESS
+        assert self.blob_copy.error is None
+
+    def test_poll_aborted(self):
+        self.blob_service.get_blob_properties.return_value.properties.\
+            copy = self.__copy('aborted', '512/1024', 'copy aborted')
+        self.blob_copy.poll()
+        assert not self.blob_copy.is_pending()
+        assert self.blob_copy.error == 'copy aborted'
+
+    def test_poll_errors(self):
+        self.blob_copy.status = BlobCopy.PENDING
+        self.blob_service.get_blob_properties.side_effect = Exception
+        for poll in range(BlobCopy.MAX_POLL_ERRORS - 1):
+            self.blob_copy.poll()
+        assert self.blob_copy.is_pending()
+        self.blob_copy.poll()
+        assert self.blob_copy.status == BlobCopy.FAILED
+
+    def __copy(self, status, progress=None, status_description=None):
+        copy = CopyProperties()
+        copy.status = status
+        copy.progress = progress
+        copy.status_description = status_description
+        return copy
@@ -98,10 +98,74 @@ class TestContainer:
 
     @patch('azurectl.storage.container.BaseBlobService.list_blobs')
     def test_content(self, mock_list_blobs):
-        mock_list_blobs.return_value = self.name_list
+        mock_list_blobs.return_value = self.__page(['a', 'b'])
         assert self.container.content('some-container') == \
             {'some-container': ['a', 'b']}
 
+    @patch('azurectl.storage.container.BaseBlobService.list_blobs')
+    def test_blobs(self, mock_list_blobs):
+        mock_list_blobs.side_effect = [
+            self.__page(['a', 'b'], 'marker-1'),
+            self.__page(['c'])
+        ]
+        blobs = self.container.blobs('some-container', prefix='disk')
+        assert next(blobs) == {
+            'name': 'a',
+            'byte_size': 1024,
+            'last_modified': datetime.datetime(2016, 1, 1),
+            'blob_type': 'PageBlob'
+        }
+        assert mock_list_blobs.call_count == 1
+        assert [blob['name'] for blob in blobs] == ['b', 'c']
+        assert mock_list_blobs.call_args_list == [
+            mock.call(
+                'some-container', prefix='disk', marker=None,
+                num_results=5000
+            ),
+            mock.call(
+                'some-container', prefix='disk', marker='marker-1',
+                num_results=5000
+            )
+        ]
+
+    @patch('azurectl.storage.container.BaseBlobService.list_blobs')
+    def test_blobs_max_results(self, mock_list_blobs):
+        mock_list_blobs.side_effect = [
+            self.__page(['a', 'b'], 'marker-1'),
+            self.__page(['c'], 'marker-2')
+        ]
+        assert [
+            blob['name'] for blob in
+            self.container.blobs('some-container', max_results='3')
+        ] == ['a', 'b', 'c']
+        assert [
+            call[1]['num_results'] for call in mock_list_blobs.call_args_list
+        ] == [3, 1]
+
+    @patch('azurectl.storage.container.BaseBlobService.list_blobs')
+    def test_usage(self, mock_list_blobs):
+        mock_list_blobs.return_value = self.__page(['a', 'b'])
+        now = datetime.datetime(2016, 1, 2)
+        usage = self.container.usage('some-container', top=1, now=now)
+        assert usage.container == 'some-container'
+        assert usage.blob_count == 2
+        assert usage.page_blob_byte_size == 2048
+        assert usage.age['week']['blob_count'] == 2
+        assert len(usage.largest) == 1
+
+    def __page(self, names, next_marker=None):
+        page = mock.Mock()
+        page.items = []
+        for name in names:
+            blob = mock.Mock()
+            blob.name = name
+            blob.properties.content_length = 1024
+            blob.properties.last_modified = datetime.datetime(2016, 1, 1)
+            blob.properties.blob_type = 'PageBlob'
+            page.items.append(blob)
+        page.next_marker = next_marker
+        return page
+
     @patch('azurectl.storage.container.BaseBlobService.list_blobs')
     def test_content_raises(self, mock_list_blobs):
         mock_list_blobs.side_effect = AzureContainerListContentError
@@ -0,0 +1,86 @@
+from .test_helper import argv_kiwi_tests
+
+import datetime
+
+from azurectl.storage.container_usage import ContainerUsage
+
+NOW = datetime.datetime(2016, 6, 1, tzinfo=datetime.timezone.utc)
+
+
+def blob(name, byte_size, days, blob_type='PageBlob'):
+    return {
+        'name': name,
+        'byte_size': byte_size,
+        'last_modified': NOW - datetime.timedelta(days=days),
+        'blob_type': blob_type
+    }
+
+
+class TestContainerUsage:
+    def setup(self):
+        self.usage = ContainerUsage('images', top=2, now=NOW)
+        for listed_blob in [
+            blob('new.vhd', 300, 0.5),
+            blob('week.vhd', 100, 3),
+            blob('notes.txt', 5, 20, 'BlockBlob'),
+            blob('quarter.vhd', 200, 60),
+            blob('year.vhd', 400, 200),
+            blob('stale.vhd', 50, 800)
+        ]:
+            self.usage.add(listed_blob)
+
+    def test_report(self):
+        report = self.usage.report()
+        assert report['blob_count'] == 6
+        assert report['byte_size'] == 1055
+        assert report['page_blob_count'] == 5
+        assert report['page_blob_byte_size'] == 1050
+        assert report['age'] == {
+            'day': {'blob_count': 1, 'byte_size': 300},
+            'week': {'blob_count': 1, 'byte_size': 100},
+            'month': {'blob_count': 1, 'byte_size': 5},
+            'quarter': {'blob_count': 1, 'byte_size': 200},
+            'year': {'blob_count': 1, 'byte_size': 400},
+            'older': {'blob_count': 1, 'byte_size': 50}
+        }
+        assert report['largest'] == [
+            {
+                'container': 'images',
+                'name': 'year.vhd',
+                'byte_size': 400,
+                'last_modified': '2015-11-14T00:00:00Z'
+            },
+            {
+                'container': 'images',
+                'name': 'new.vhd',
+                'byte_size': 300,
+                'last_modified': '2016-05-31T12:00:00Z'
+            }
+        ]
+
+    def test_largest_is_bounded(self):
+        for index in range(100):
+            self.usage.add(blob('small-%d' % index, 1, 1))
+        assert len(self.usage.largest) == 2
+
+    def test_merge(self):
+        total = ContainerUsage(None, top=2, now=NOW)
+        other = ContainerUsage('backup', top=2, now=NOW)
+        other.add(blob('full.vhd', 1000, 400))
+        total.merge(self.usage)
+        total.merge(other)
+        report = total.report()
+        assert report['blob_count'] == 7
+        assert report['byte_size'] == 2055
+        assert report['page_blob_byte_size'] == 2050
+        assert report['age']['older'] == {'blob_count': 2, 'byte_size': 1050}
+        assert [
+            (largest['container'], largest['name'])
+            for largest in report['largest']
+        ] == [('backup', 'full.vhd'), ('images', 'year.vhd')]
+
+    def test_no_largest(self):
+        usage = ContainerUsage('images', top=0, now=NOW)
+        usage.add(blob('new.vhd', 300, 0))
+        assert usage.report()['largest'] == []
+        assert usage.report()['age']['day']['blob_count'] == 1
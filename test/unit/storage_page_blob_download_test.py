@@ -0,0 +1,131 @@
+from .test_helper import argv_kiwi_tests
+
+import os
+import mock
+from mock import patch
+from pytest import raises
+from azure.storage.blob.models import PageRange
+
+from azurectl.storage.page_blob_download import PageBlobDownload
+from azurectl.utils.rate_limit import RateLimit
+from azurectl.azurectl_exceptions import AzurePageBlobDownloadError
+
+DATA = os.urandom(8192)
+
+
+class TestPageBlobDownload:
+    def setup(self):
+        self.blob_service = mock.Mock()
+        self.blob_service.MAX_CHUNK_GET_SIZE = 1024
+        self.blob_service.get_blob_properties.return_value.properties.\
+            content_length = len(DATA)
+        self.blob_service.get_page_ranges.return_value = [
+            PageRange(512, 2559),
+            PageRange(3072, 3583, is_cleared=True),
+            PageRange(6144, 6655)
+        ]
+        self.blob_service.get_blob_to_bytes.side_effect = self.__get_range
+        self.rate_limit = RateLimit()
+        self.rate_limit.acquire = mock.Mock()
+        self.rate_limit.server_busy = mock.Mock()
+
+    def test_chunks(self):
+        download = PageBlobDownload(
+            self.blob_service, 'blob', 'container', rate_limit=self.rate_limit
+        )
+        assert download.byte_size == 8192
+        assert download.max_threads == 4
+        assert download.chunks == [
+            (512, 1536), (1536, 2560), (6144, 6656)
+        ]
+        assert download.data_byte_size == 2560
+        self.blob_service.get_page_ranges.assert_called_once_with(
+            'container', 'blob', start_range=0, end_range=8191
+        )
+
+    def test_max_chunk_size(self):
+        download = PageBlobDownload(
+            self.blob_service, 'blob', 'container', max_chunk_size='512'
+        )
+        assert len(download.chunks) == 5
+        download = PageBlobDownload(
+            self.blob_service, 'blob', 'container', max_chunk_size='4096'
+        )
+        assert len(download.chunks) == 3
+
+    @patch.object(PageBlobDownload, 'PAGE_RANGE_QUERY_SIZE', 4096)
+    def test_page_range_segments(self):
+        PageBlobDownload(self.blob_service, 'blob', 'container')
+        assert self.blob_service.get_page_ranges.call_args_list == [
+            mock.call('container', 'blob', start_range=0, end_range=4095),
+            mock.call('container', 'blob', start_range=4096, end_range=8191)
+        ]
+
+    def test_setup_error(self):
+        self.blob_service.get_page_ranges.side_effect = Exception
+        with raises(AzurePageBlobDownloadError):
+            PageBlobDownload(self.blob_service, 'blob', 'container')
+
+    def test_read(self):
+        for max_threads in [1, 2, 8]:
+            download = PageBlobDownload(
+                self.blob_service, 'blob', 'container',
+                max_threads=max_threads, rate_limit=self.rate_limit
+            )
+            assert list(download.read()) == [
+                (512, DATA[512:1536]),
+                (1536, DATA[1536:2560]),
+                (6144, DATA[6144:6656])
+            ]
+        self.blob_service.get_blob_to_bytes.assert_called_with(
+            'container', 'blob', start_range=6144, end_range=6655,
+            validate_content=True, max_connections=1
+        )
+        self.rate_limit.acquire.assert_called_with(512)
+
+    def test_read_closed(self):
+        download = PageBlobDownload(
+            self.blob_service, 'blob', 'container', max_threads=1
+        )
+        chunks = download.read()
+        assert next(chunks) == (512, DATA[512:1536])
+        chunks.close()
+        assert self.blob_service.get_blob_to_bytes.call_count <= 3
+
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_read_retry(self, mock_sleep):
+        busy = Exception('server busy')
+        busy.status_code = 503
+        errors = [busy, Exception('connection reset')]
+
+        def get_range(*args, **kwargs):
+            if errors:
+                raise errors.pop()
+            return self.__get_range(*args, **kwargs)
+
+        self.blob_service.get_blob_to_bytes.side_effect = get_range
+        download = PageBlobDownload(
+            self.blob_service, 'blob', 'container', max_threads=1,
+            rate_limit=self.rate_limit
+        )
+        assert len(list(download.read())) == 3
+        assert mock_sleep.call_count == 1
+        self.rate_limit.server_busy.assert_called_once_with()
+
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_read_failed(self, mock_sleep):
+        self.blob_service.get_blob_to_bytes.side_effect = None
+        self.blob_service.get_blob_to_bytes.return_value.content = b'short'
+        download = PageBlobDownload(
+            self.blob_service, 'blob', 'container'
+        )
+        with raises(AzurePageBlobDownloadError) as error:
+            list(download.read(max_attempts=3))
+        assert format(error.value).count('Got 5 of 1024 bytes') == 3
+
+    def __get_range(
+        self, container, blob, start_range, end_range, **kwargs
+    ):
+        blob = mock.Mock()
+        blob.content = DATA[start_range:end_range + 1]
+        return blob
@@ -1,34 +1,28 @@
 from .test_helper import argv_kiwi_tests
 
+import hashlib
 import sys
 import mock
 from mock import patch
 from mock import call
 from pytest import raises
 from azurectl.storage.page_blob import PageBlob
+from azurectl.utils.rate_limit import RateLimit
 import azurectl
 
 from azurectl.azurectl_exceptions import (
     AzurePageBlobAlignmentViolation,
     AzurePageBlobSetupError,
-    AzurePageBlobUpdateError,
-    AzurePageBlobZeroPageError
+    AzurePageBlobUpdateError
 )
 
 
 class TestPageBlob:
     def setup(self):
-        self.data_stream = mock.MagicMock()
+        self.data_stream = mock.MagicMock(spec=['read'])
         self.blob_service = mock.Mock()
         self.blob_service.MAX_CHUNK_GET_SIZE = 4096
-
-        self.context_manager_mock = mock.Mock()
-        self.file_mock = mock.Mock()
-        self.enter_mock = mock.Mock()
-        self.exit_mock = mock.Mock()
-        self.enter_mock.return_value = self.file_mock
-        setattr(self.context_manager_mock, '__enter__', self.enter_mock)
-        setattr(self.context_manager_mock, '__exit__', self.exit_mock)
+        self.data_stream.read.return_value = b'some-data'
 
         self.page_blob = PageBlob(
             self.blob_service, 'blob-name', 'container-name', 1024
@@ -50,52 +44,634 @@ class TestPageBlob:
         with raises(AzurePageBlobAlignmentViolation):
             PageBlob(self.blob_service, 'blob-name', 'container-name', 12)
 
-    @patch('builtins.open')
-    def test_zero_page_read_failed(self, mock_open):
-        mock_open.side_effect = Exception
-        with raises(AzurePageBlobZeroPageError):
-            self.page_blob.next(self.data_stream)
-
-    @patch('builtins.open')
-    def test_zero_page_for_max_chunk_size(self, mock_open):
-        self.page_blob.rest_bytes = self.blob_service.MAX_CHUNK_GET_SIZE
-        mock_open.return_value = self.context_manager_mock
+    def test_read_max_chunk_size(self):
+        self.page_blob.rest_bytes = 8192
         self.page_blob.next(self.data_stream)
-        self.file_mock.read.assert_called_once_with(
+        self.data_stream.read.assert_called_once_with(
             self.blob_service.MAX_CHUNK_GET_SIZE
         )
 
-    @patch('builtins.open')
-    def test_zero_page_for_chunk(self, mock_open):
+    def test_read_rest_bytes(self):
         self.page_blob.rest_bytes = 42
-        mock_open.return_value = self.context_manager_mock
         self.page_blob.next(self.data_stream)
-        self.file_mock.read.assert_called_once_with(42)
+        self.data_stream.read.assert_called_once_with(42)
 
     def test_update_page(self):
-        self.data_stream.read.return_value = 'some-data'
         self.page_blob.next(self.data_stream)
         self.blob_service.update_page.assert_called_once_with(
-            'container-name', 'blob-name', 'some-data', 0, 8
+            'container-name', 'blob-name', b'some-data', 0, 8,
+            validate_content=True
         )
 
-    def test_update_page_max_retries_reached(self):
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_update_page_max_retries_reached(self, mock_sleep):
         self.blob_service.update_page.side_effect = Exception
         with raises(AzurePageBlobUpdateError):
             self.page_blob.next(self.data_stream)
+        assert mock_sleep.call_count == 4
 
-    def test_update_page_retried_two_times(self):
+    @patch('azurectl.utils.rate_limit.RateLimit.backoff_delay')
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_update_page_retried_two_times(
+        self, mock_sleep, mock_backoff_delay
+    ):
         retries = [True, False, False]
 
-        def side_effect(container, blob, data, start, end):
+        def side_effect(container, blob, data, start, end, **kwargs):
             if not retries.pop():
                 raise Exception
 
+        mock_backoff_delay.side_effect = lambda attempt: attempt / 10.0
         self.blob_service.update_page.side_effect = side_effect
         self.page_blob.next(self.data_stream)
         assert len(self.blob_service.update_page.call_args_list) == 3
+        assert mock_sleep.call_args_list == [call(0.1), call(0.2)]
+
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_update_page_server_busy(self, mock_sleep):
+        rate_limit = RateLimit()
+        rate_limit.acquire = mock.Mock()
+        rate_limit.server_busy = mock.Mock()
+        rate_limit.success = mock.Mock()
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 1024,
+            rate_limit=rate_limit
+        )
+        server_busy = Exception('server busy')
+        server_busy.status_code = 503
+        self.blob_service.update_page.side_effect = [server_busy, None]
+        page_blob.next(self.data_stream)
+        assert rate_limit.acquire.call_args_list == [call(9), call(9)]
+        rate_limit.server_busy.assert_called_once_with()
+        rate_limit.success.assert_called_once_with()
+        assert not mock_sleep.called
 
     def test_next_page_update_no_data(self):
         self.data_stream.read.return_value = None
         with raises(StopIteration):
             self.page_blob.next(self.data_stream)
+
+    def test_zero_page_skipped(self):
+        self.data_stream.read.return_value = bytes(1024)
+        assert self.page_blob.next(self.data_stream) == 1024
+        assert not self.blob_service.update_page.called
+
+    def test_zero_border_pages_skipped(self):
+        data = bytes(512) + b'a' * 512 + b'b' + bytes(511) + bytes(512)
+        self.data_stream.read.return_value = data
+        assert self.page_blob.next(self.data_stream) == 2048
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', data[512:1536], 512, 1535,
+            validate_content=True
+        )
+
+    def test_zero_border_pages_skipped_short_chunk(self):
+        data = b'a' * 512 + bytes(100)
+        self.data_stream.read.return_value = data
+        assert self.page_blob.next(self.data_stream) == 612
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', data[0:512], 0, 511,
+            validate_content=True
+        )
+
+    def test_default_max_page_gap(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 1024,
+            max_page_gap=None
+        )
+        assert page_blob.max_page_gap == PageBlob.MAX_PAGE_GAP
+
+    def test_data_ranges_split(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 2048,
+            max_page_gap=0
+        )
+        data = b'a' * 512 + bytes(512) + b'b' * 512 + b'c' * 512
+        self.data_stream.read.return_value = data
+        assert page_blob.next(self.data_stream) == 2048
+        assert self.blob_service.update_page.call_args_list == [
+            call(
+                'container-name', 'blob-name', data[0:512], 0, 511,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', data[1024:2048], 1024, 2047,
+                validate_content=True
+            )
+        ]
+
+    def test_data_ranges_merged(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 2048,
+            max_page_gap=512
+        )
+        data = b'a' * 512 + bytes(512) + b'b' * 512 + bytes(512)
+        self.data_stream.read.return_value = data
+        assert page_blob.next(self.data_stream) == 2048
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', data[0:1536], 0, 1535,
+            validate_content=True
+        )
+
+    def test_data_ranges_scan_blocks(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4 * 65536,
+            max_page_gap=0
+        )
+        data = bytes(65536) + b'a' * 65536 + \
+            bytes(512) + b'b' * 65024 + b'c' * 65536
+        self.data_stream.read.return_value = data
+        page_blob.next(self.data_stream, 4 * 65536)
+        assert self.blob_service.update_page.call_args_list == [
+            call(
+                'container-name', 'blob-name', data[65536:131072],
+                65536, 131071,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', data[131584:],
+                131584, 262143,
+                validate_content=True
+            )
+        ]
+
+    def test_adaptive_chunk_size(self):
+        adaptive_chunk_size = mock.Mock()
+        adaptive_chunk_size.current.return_value = 1024
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            max_page_gap=0, adaptive_chunk_size=adaptive_chunk_size
+        )
+        data = b'a' * 2560 + bytes(512) + b'b' * 1024
+        self.data_stream.read.return_value = data
+        page_blob.next(self.data_stream, 4096)
+        assert self.blob_service.update_page.call_args_list == [
+            call(
+                'container-name', 'blob-name', data[0:1024], 0, 1023,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', data[1024:2048], 1024, 2047,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', data[2048:2560], 2048, 2559,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', data[3072:], 3072, 4095,
+                validate_content=True
+            )
+        ]
+        assert [
+            record_call[0][0]
+            for record_call in adaptive_chunk_size.record.call_args_list
+        ] == [1024, 1024, 512, 1024]
+
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_adaptive_chunk_size_records_errors(self, mock_sleep):
+        adaptive_chunk_size = mock.Mock()
+        adaptive_chunk_size.current.return_value = 1024
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 1024,
+            adaptive_chunk_size=adaptive_chunk_size
+        )
+        self.blob_service.update_page.side_effect = [Exception, None]
+        self.data_stream.read.return_value = b'a' * 1024
+        page_blob.next(self.data_stream)
+        adaptive_chunk_size.record_error.assert_called_once_with()
+        assert adaptive_chunk_size.record.call_count == 1
+
+    def test_skip_hole(self):
+        data_stream = mock.Mock()
+        data_stream.skip_hole.return_value = 512
+        assert self.page_blob.next(data_stream) == 512
+        assert self.page_blob.rest_bytes == 512
+        assert self.page_blob.page_start == 512
+        assert not data_stream.read.called
+        data_stream.skip_hole.return_value = 0
+        data_stream.read.return_value = b'a' * 512
+        assert self.page_blob.next(data_stream) == 1024
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', b'a' * 512, 512, 1023,
+            validate_content=True
+        )
+
+    def test_skip_hole_committed(self):
+        journal = mock.Mock()
+        journal.is_resumable.return_value = False
+        journal.committed_range_size.return_value = 0
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 1024,
+            journal=journal
+        )
+        data_stream = mock.Mock()
+        data_stream.skip_hole.return_value = 512
+        page_blob.next(data_stream)
+        journal.commit.assert_called_once_with(0, 512)
+
+    def test_next_returns_uploaded_bytes(self):
+        self.data_stream.read.return_value = b'some-data'
+        assert self.page_blob.next(self.data_stream) == 9
+
+
+class TestPageBlobJournal:
+    def setup(self):
+        self.data_stream = mock.MagicMock(spec=['read'])
+        self.blob_service = mock.Mock()
+        self.blob_service.MAX_CHUNK_GET_SIZE = 1024
+        self.blob_service.get_blob_properties.return_value.properties.\
+            content_length = 4096
+        self.journal = mock.Mock()
+        self.journal.is_resumable.return_value = True
+        self.journal.committed_range_size.return_value = 0
+
+    def test_resume_existing_blob(self):
+        PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            journal=self.journal
+        )
+        assert not self.blob_service.create_blob.called
+        assert not self.journal.reset.called
+
+    def test_resume_blob_size_mismatch(self):
+        PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 2048,
+            journal=self.journal
+        )
+        self.journal.reset.assert_called_once_with()
+        self.blob_service.create_blob.assert_called_once_with(
+            'container-name', 'blob-name', 2048
+        )
+
+    def test_resume_blob_not_found(self):
+        self.blob_service.get_blob_properties.side_effect = Exception
+        PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            journal=self.journal
+        )
+        self.journal.reset.assert_called_once_with()
+        assert self.blob_service.create_blob.called
+
+    def test_skip_committed_by_read(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            journal=self.journal
+        )
+        self.journal.committed_range_size.return_value = 3072
+        self.data_stream.read.side_effect = [b'a' * 1024, b'b' * 1024, None]
+        assert page_blob.next(self.data_stream) == 3072
+        assert page_blob.page_start == 3072
+        assert page_blob.rest_bytes == 1024
+        assert self.data_stream.read.call_args_list == [
+            call(1024), call(1024), call(1024)
+        ]
+        assert not self.blob_service.update_page.called
+
+    def test_skip_committed_by_seek(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            journal=self.journal
+        )
+        data_stream = mock.Mock()
+        self.journal.committed_range_size.side_effect = [2048, 0]
+        data_stream.skip_hole.return_value = 0
+        data_stream.read.return_value = b'a' * 1024
+        assert page_blob.next(data_stream) == 2048
+        data_stream.seek.assert_called_once_with(2048)
+        assert page_blob.next(data_stream) == 3072
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', b'a' * 1024, 2048, 3071,
+            validate_content=True
+        )
+        self.journal.commit.assert_called_once_with(2048, 3072)
+
+    def test_commit_zero_chunk(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            journal=self.journal
+        )
+        self.data_stream.read.return_value = bytes(1024)
+        page_blob.next(self.data_stream)
+        self.journal.commit.assert_called_once_with(0, 1024)
+
+
+class TestPageBlobThreaded:
+    def setup(self):
+        self.data_stream = mock.MagicMock(spec=['read'])
+        self.blob_service = mock.Mock()
+        self.blob_service.MAX_CHUNK_GET_SIZE = 512
+
+        self.page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 2048,
+            max_threads=2
+        )
+
+    def test_upload_pool(self):
+        assert self.page_blob.upload_pool
+        assert PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 1024
+        ).upload_pool is None
+
+    def test_update_pages_concurrently(self):
+        self.data_stream.read.side_effect = [
+            b'a' * 512, b'b' * 512, b'c' * 512, b'd' * 512, None
+        ]
+        with raises(StopIteration):
+            while True:
+                self.page_blob.next(self.data_stream)
+        assert sorted(self.blob_service.update_page.call_args_list) == [
+            call(
+                'container-name', 'blob-name', b'a' * 512, 0, 511,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', b'b' * 512, 512, 1023,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', b'c' * 512, 1024, 1535,
+                validate_content=True
+            ),
+            call(
+                'container-name', 'blob-name', b'd' * 512, 1536, 2047,
+                validate_content=True
+            )
+        ]
+        assert self.page_blob.uploaded_bytes == 2048
+        assert not self.page_blob.pending_uploads
+
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_update_page_max_retries_reached(self, mock_sleep):
+        self.blob_service.update_page.side_effect = Exception
+        self.data_stream.read.side_effect = [
+            b'a' * 512, b'b' * 512, b'c' * 512, b'd' * 512, None
+        ]
+        with raises(AzurePageBlobUpdateError):
+            while True:
+                self.page_blob.next(self.data_stream)
+        assert self.page_blob.uploaded_bytes == 0
+
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_update_page_retried_two_times(self, mock_sleep):
+        retries = [True, False, False]
+
+        def side_effect(container, blob, data, start, end, **kwargs):
+            if not retries.pop():
+                raise Exception
+
+        self.blob_service.update_page.side_effect = side_effect
+        self.data_stream.read.side_effect = [b'a' * 512, None]
+        with raises(StopIteration):
+            while True:
+                self.page_blob.next(self.data_stream)
+        assert len(self.blob_service.update_page.call_args_list) == 3
+
+
+class TestPageBlobManifest:
+    def setup(self):
+        self.data_stream = mock.MagicMock(spec=['read'])
+        self.blob_service = mock.Mock()
+        self.blob_service.MAX_CHUNK_GET_SIZE = 4096
+        self.blob_service.get_blob_properties.return_value.properties.\
+            content_length = 4096
+        self.blob_service.get_blob_properties.return_value.properties.\
+            etag = 'etag'
+        self.manifest = mock.Mock()
+        self.manifest.chunk_size = 1024
+        self.manifest.etag = 'etag'
+        self.manifest.previous_chunk.return_value = None
+
+        self.page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            max_page_gap=0, manifest=self.manifest
+        )
+
+    def test_reuse_blob(self):
+        assert not self.blob_service.create_blob.called
+        assert not self.blob_service.resize_blob.called
+        assert not self.manifest.discard_previous.called
+
+    def test_reuse_blob_resized(self):
+        PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 2048,
+            manifest=self.manifest
+        )
+        self.blob_service.resize_blob.assert_called_once_with(
+            'container-name', 'blob-name', 2048
+        )
+        assert not self.blob_service.create_blob.called
+
+    def test_reuse_blob_resize_raises(self):
+        self.blob_service.resize_blob.side_effect = Exception
+        with raises(AzurePageBlobSetupError):
+            PageBlob(
+                self.blob_service, 'blob-name', 'container-name', 2048,
+                manifest=self.manifest
+            )
+
+    def test_blob_modified(self):
+        self.blob_service.get_blob_properties.return_value.properties.\
+            etag = 'other-etag'
+        PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            manifest=self.manifest
+        )
+        self.manifest.discard_previous.assert_called_once_with()
+        self.blob_service.create_blob.assert_called_once_with(
+            'container-name', 'blob-name', 4096
+        )
+
+    def test_blob_not_found(self):
+        self.blob_service.get_blob_properties.side_effect = Exception
+        PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            manifest=self.manifest
+        )
+        self.manifest.discard_previous.assert_called_once_with()
+        assert self.blob_service.create_blob.called
+
+    def test_read_manifest_chunk(self):
+        self.page_blob.page_start = 512
+        self.data_stream.read.return_value = b'a' * 512
+        self.page_blob.next(self.data_stream, max_chunk_byte_size=4096)
+        self.data_stream.read.assert_called_once_with(512)
+
+    def test_read_manifest_chunk_in_parts(self):
+        self.data_stream.read.side_effect = [b'a' * 512, b'b' * 512]
+        self.page_blob.next(self.data_stream)
+        assert not self.manifest.add.called
+        self.page_blob.next(self.data_stream)
+        assert self.data_stream.read.call_args_list == [
+            call(1024), call(512)
+        ]
+        self.manifest.add.assert_called_once_with(
+            0, 1024, hashlib.md5(b'a' * 512 + b'b' * 512).digest()
+        )
+        assert self.blob_service.update_page.call_count == 2
+
+    def test_read_manifest_chunk_at_end(self):
+        self.data_stream.read.side_effect = [b'a' * 512, None]
+        self.page_blob.next(self.data_stream)
+        with raises(StopIteration):
+            self.page_blob.next(self.data_stream)
+        self.manifest.add.assert_called_once_with(
+            0, 512, hashlib.md5(b'a' * 512).digest()
+        )
+
+    def test_unchanged_chunk(self):
+        data = b'a' * 1024
+        self.manifest.previous_chunk.return_value = \
+            (1024, hashlib.md5(data).digest())
+        self.data_stream.read.return_value = data
+        assert self.page_blob.next(self.data_stream) == 1024
+        assert not self.blob_service.update_page.called
+
+    def test_changed_chunk(self):
+        data = b'a' * 512 + bytes(512)
+        self.manifest.previous_chunk.return_value = (1024, b'digest')
+        self.data_stream.read.return_value = data
+        assert self.page_blob.next(self.data_stream) == 1024
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', data, 0, 1023,
+            validate_content=True
+        )
+
+    def test_changed_chunk_former_zero(self):
+        data = b'a' * 512 + bytes(512)
+        self.manifest.previous_chunk.return_value = (1024, None)
+        self.data_stream.read.return_value = data
+        assert self.page_blob.next(self.data_stream) == 1024
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', b'a' * 512, 0, 511,
+            validate_content=True
+        )
+
+    def test_changed_zero_chunk(self):
+        self.manifest.previous_chunk.return_value = (1024, b'digest')
+        self.data_stream.read.return_value = bytes(1024)
+        assert self.page_blob.next(self.data_stream) == 1024
+        self.manifest.add.assert_called_once_with(0, 1024, None)
+        self.blob_service.clear_page.assert_called_once_with(
+            'container-name', 'blob-name', 0, 1023
+        )
+        assert not self.blob_service.update_page.called
+
+    @patch('azurectl.utils.rate_limit.time.sleep')
+    def test_clear_page_max_retries_reached(self, mock_sleep):
+        self.manifest.previous_chunk.return_value = (1024, b'digest')
+        self.blob_service.clear_page.side_effect = Exception
+        self.data_stream.read.return_value = bytes(1024)
+        with raises(AzurePageBlobUpdateError):
+            self.page_blob.next(self.data_stream)
+
+    def test_skip_hole_whole_chunks(self):
+        self.manifest.previous_chunk.side_effect = [
+            (1024, b'digest'), None, None
+        ]
+        data_stream = mock.Mock()
+        data_stream.skip_hole.return_value = 2560
+        assert self.page_blob.next(data_stream) == 2560
+        assert not data_stream.seek.called
+        assert self.manifest.add.call_args_list == [
+            call(0, 1024, None), call(1024, 1024, None)
+        ]
+        self.blob_service.clear_page.assert_called_once_with(
+            'container-name', 'blob-name', 0, 1023
+        )
+        assert self.page_blob.page_start == 2560
+
+    def test_skip_hole_committed(self):
+        journal = mock.Mock()
+        journal.is_resumable.return_value = False
+        journal.committed_range_size.return_value = 0
+        self.manifest.etag = None
+        self.manifest.previous_chunk.side_effect = [
+            None, (1024, b'digest'), None
+        ]
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            journal=journal, manifest=self.manifest
+        )
+        data_stream = mock.Mock()
+        data_stream.skip_hole.return_value = 2560
+        assert page_blob.next(data_stream) == 2560
+        assert journal.commit.call_args_list == [
+            call(0, 1024), call(1024, 2048), call(2048, 2560)
+        ]
+
+    def test_skip_hole_to_end(self):
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 2560,
+            manifest=self.manifest
+        )
+        data_stream = mock.Mock()
+        data_stream.skip_hole.return_value = 4096
+        assert page_blob.next(data_stream) == 2560
+        assert not data_stream.seek.called
+        assert self.manifest.add.call_args_list == [
+            call(0, 1024, None), call(1024, 1024, None), call(2048, 512, None)
+        ]
+
+    def test_skip_hole_inside_chunk(self):
+        data = b'a' * 512
+        data_stream = mock.Mock()
+        data_stream.skip_hole.side_effect = [512, 0, 3072]
+        data_stream.read.return_value = data
+        for uploaded_bytes in [512, 1024, 4096]:
+            assert self.page_blob.next(data_stream) == uploaded_bytes
+        data_stream.read.assert_called_once_with(512)
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', data, 512, 1023,
+            validate_content=True
+        )
+        assert self.manifest.add.call_args_list == [
+            call(0, 1024, hashlib.md5(bytes(512) + data).digest()),
+            call(1024, 1024, None),
+            call(2048, 1024, None),
+            call(3072, 1024, None)
+        ]
+
+    def test_skip_hole_inside_changed_chunk(self):
+        data = b'a' * 512
+        self.manifest.previous_chunk.return_value = (1024, b'digest')
+        data_stream = mock.Mock()
+        data_stream.skip_hole.side_effect = [512, 0]
+        data_stream.read.return_value = data
+        assert self.page_blob.next(data_stream) == 0
+        assert self.page_blob.next(data_stream) == 1024
+        self.blob_service.update_page.assert_called_once_with(
+            'container-name', 'blob-name', bytes(512) + data, 0, 1023,
+            validate_content=True
+        )
+        assert not self.blob_service.clear_page.called
+
+    def test_skip_hole_inside_unchanged_chunk(self):
+        data = b'a' * 512
+        self.manifest.previous_chunk.return_value = \
+            (1024, hashlib.md5(data + bytes(512)).digest())
+        data_stream = mock.Mock()
+        data_stream.skip_hole.side_effect = [0, 512]
+        data_stream.read.return_value = data
+        assert self.page_blob.next(data_stream) == 0
+        assert self.page_blob.next(data_stream) == 1024
+        assert not self.blob_service.update_page.called
+
+    def test_skip_committed_restarts_chunk(self):
+        journal = mock.Mock()
+        journal.is_resumable.return_value = False
+        journal.committed_range_size.side_effect = [512, 0]
+        self.manifest.etag = None
+        page_blob = PageBlob(
+            self.blob_service, 'blob-name', 'container-name', 4096,
+            journal=journal, manifest=self.manifest
+        )
+        data_stream = mock.Mock()
+        data_stream.skip_hole.return_value = 0
+        data_stream.read.return_value = b'a' * 512
+        page_blob.next(data_stream)
+        page_blob.next(data_stream)
+        data_stream.seek.assert_called_once_with(512)
+        self.manifest.add.assert_called_once_with(
+            512, 512, hashlib.md5(b'a' * 512).digest()
+        )
@@ -1,22 +1,33 @@
 from .test_helper import argv_kiwi_tests
 
 import datetime
+import io
+import lzma
 import os
+import shutil
+import struct
 import sys
 import mock
 from mock import patch
 from mock import call
 from urllib.parse import urlparse
 from pytest import raises
+from tempfile import mkdtemp
+from azure.common import AzureMissingResourceHttpError
 from azurectl.storage.storage import Storage
 import azurectl
 from collections import namedtuple
 
 from azurectl.azurectl_exceptions import (
+    AzureStorageCopyError,
     AzureStorageDeleteError,
+    AzureStorageDownloadError,
     AzureStorageFileNotFound,
     AzureStorageStreamError,
-    AzureStorageUploadError
+    AzureStorageUploadError,
+    AzureStorageVerifyError,
+    AzureUploadManifestError,
+    AzureXZIndexError
 )
 
 
@@ -45,6 +56,26 @@ class TestStorage:
             )
         )
         self.storage = Storage(account, 'some-container')
+        self.test_dir = os.getcwd()
+
+        # no upload may reach out to the storage service
+        self.blob_service_patch = patch(
+            'azurectl.storage.storage.PageBlobService'
+        )
+        self.blob_service = self.blob_service_patch.start().return_value
+        self.blob_service.MAX_CHUNK_GET_SIZE = 4194304
+        self.manifest_patch = patch('azurectl.storage.storage.UploadManifest')
+        self.manifest = self.manifest_patch.start().return_value
+        self.manifest.chunk_size = 4194304
+        self.manifest.etag = None
+        self.rate_limit_patch = patch('azurectl.storage.storage.RateLimit')
+        self.mock_rate_limit = self.rate_limit_patch.start()
+        self.rate_limit = self.mock_rate_limit.return_value
+
+    def teardown(self):
+        self.blob_service_patch.stop()
+        self.manifest_patch.stop()
+        self.rate_limit_patch.stop()
 
     @patch('os.path.exists')
     def test_upload_storage_file_not_found(self, mock_exists):
@@ -68,13 +99,20 @@ class TestStorage:
         with raises(AzureStorageUploadError):
             self.storage.upload('../data/blob.xz')
 
+    @patch('azurectl.storage.storage.ReadAhead')
     @patch('azurectl.storage.storage.PageBlob')
     @patch('azurectl.storage.storage.XZ.uncompressed_size')
     @patch('azurectl.storage.storage.XZ.open')
-    def test_upload(self, mock_xz_open, mock_uncompressed_size, mock_page_blob):
-        stream = mock.Mock
+    def test_upload(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_read_ahead
+    ):
+        xz_stream = mock.Mock()
+        mock_xz_open.return_value = xz_stream
+        stream = mock.Mock()
         stream.close = mock.Mock()
-        mock_xz_open.return_value = stream
+        mock_read_ahead.return_value = stream
+        mock_read_ahead.DEFAULT_DEPTH = 4
         page_blob = mock.Mock()
         next_results = [3, 2, 1]
 
@@ -90,16 +128,337 @@ class TestStorage:
 
         self.storage.upload('../data/blob.xz')
 
+        mock_read_ahead.assert_called_once_with(xz_stream, 4194304, 4)
         assert page_blob.next.call_args_list == [
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5)
+            call(stream, 4194304, 5),
+            call(stream, 4194304, 5),
+            call(stream, 4194304, 5),
+            call(stream, 4194304, 5)
         ]
         stream.close.assert_called_once_with()
 
+    @patch('azurectl.storage.storage.ReadAhead')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_without_read_ahead(
+        self, mock_xz_open, mock_page_blob, mock_read_ahead
+    ):
+        page_blob = mock.Mock()
+        page_blob.next.side_effect = StopIteration
+        mock_page_blob.return_value = page_blob
+
+        self.storage.upload('../data/blob.xz', read_ahead='0')
+
+        assert not mock_read_ahead.called
+        page_blob.next.assert_called_once_with(
+            mock_xz_open.return_value, 4194304, 5
+        )
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.uncompressed_size')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_resume(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal
+    ):
+        stream = mock.Mock()
+        mock_xz_open.return_value = stream
+        page_blob = mock.Mock()
+        page_blob.next.side_effect = StopIteration
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 1024
+        journal = mock.Mock()
+        mock_journal.return_value = journal
+
+        self.storage.upload('../data/blob.xz', resume=True)
+
+        mock_journal.assert_called_once_with(
+            'mock-storage-name', 'some-container', 'blob'
+        )
+        journal.open.assert_called_once_with('../data/blob.xz', 1024, None)
+        mock_page_blob.assert_called_once_with(
+            self.blob_service, 'blob', 'some-container', 1024, 1, None,
+            journal, self.manifest, None, self.rate_limit
+        )
+        journal.remove.assert_called_once_with()
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.UploadManifest')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.uncompressed_size')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_delta(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_blob_service, mock_manifest, mock_journal
+    ):
+        page_blob = mock.Mock()
+        page_blob.next.side_effect = StopIteration
+        mock_page_blob.return_value = page_blob
+        mock_uncompressed_size.return_value = 1024
+        blob_service = mock_blob_service.return_value
+        blob_service.MAX_CHUNK_GET_SIZE = 4096
+        blob_service.get_blob_properties.return_value.properties.\
+            content_length = 1024
+        blob_service.get_blob_properties.return_value.metadata = {
+            'owner': 'me', 'azurectl_manifest_md5': 'former-digest'
+        }
+        blob_service.set_blob_metadata.return_value.etag = 'new-etag'
+        manifest = mock_manifest.return_value
+        manifest.chunk_size = 2048
+        manifest.etag = 'etag'
+        manifest.blob_metadata.return_value = {
+            'azurectl_manifest_md5': 'digest'
+        }
+        journal = mock_journal.return_value
+
+        self.storage.upload(
+            '../data/blob.xz', read_ahead=0, delta=True, resume=True
+        )
+
+        mock_manifest.assert_called_once_with(
+            'mock-storage-name', 'some-container', 'blob', 4096
+        )
+        manifest.load.assert_called_once_with()
+        journal.open.assert_called_once_with(
+            '../data/blob.xz', 1024, 'etag'
+        )
+        mock_page_blob.assert_called_once_with(
+            blob_service, 'blob', 'some-container', 1024, 1, None,
+            journal, manifest, None, self.rate_limit
+        )
+        page_blob.next.assert_called_once_with(
+            mock_xz_open.return_value, 2048, 5
+        )
+        manifest.blob_metadata.assert_called_once_with(1024)
+        blob_service.set_blob_metadata.assert_called_once_with(
+            'some-container', 'blob',
+            {'owner': 'me', 'azurectl_manifest_md5': 'digest'}
+        )
+        manifest.save.assert_called_once_with(1024, 'new-etag')
+
+    @patch('azurectl.storage.storage.AdaptiveChunkSize')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.uncompressed_size')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_adaptive_chunk_size(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_adaptive_chunk_size
+    ):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        mock_uncompressed_size.return_value = 1024
+        self.storage.upload(
+            '../data/blob.xz', read_ahead=0, adaptive_chunk_size=True
+        )
+        mock_adaptive_chunk_size.assert_called_once_with(4194304)
+        mock_page_blob.assert_called_once_with(
+            self.blob_service, 'blob', 'some-container', 1024, 1, None,
+            None, self.manifest, mock_adaptive_chunk_size.return_value,
+            self.rate_limit
+        )
+        self.mock_rate_limit.assert_called_once_with(None, None)
+
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_rate_limit(self, mock_xz_open, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        self.storage.upload(
+            '../data/blob.xz', read_ahead=0,
+            max_bandwidth='1048576', max_requests='100'
+        )
+        self.mock_rate_limit.assert_called_once_with('1048576', '100')
+
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_verify(self, mock_xz_open, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        self.manifest.verify.return_value = []
+        self.storage.upload('../data/blob.xz', read_ahead=0, verify=True)
+        self.blob_service.get_page_ranges.assert_called_once_with(
+            'some-container', 'blob'
+        )
+        self.manifest.verify.assert_called_once_with(
+            self.blob_service.get_page_ranges.return_value
+        )
+
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_verify_mismatch(self, mock_xz_open, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        self.manifest.verify.return_value = [1024, 4096]
+        with raises(AzureStorageVerifyError) as e:
+            self.storage.upload(
+                '../data/blob.xz', read_ahead=0, verify=True
+            )
+        assert 'do not match 2 uploaded chunks' in format(e.value)
+        assert 'first mismatch at offset 1024' in format(e.value)
+
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_verify_raises(self, mock_xz_open, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        self.blob_service.get_page_ranges.side_effect = Exception
+        with raises(AzureStorageVerifyError):
+            self.storage.upload(
+                '../data/blob.xz', read_ahead=0, verify=True
+            )
+
+    def test_upload_writes_manifest(self):
+        with patch('azurectl.storage.storage.PageBlob') as mock_page_blob:
+            mock_page_blob.return_value.next.side_effect = StopIteration
+            self.blob_service.get_blob_properties.return_value.metadata = \
+                None
+            self.manifest.blob_metadata.return_value = {}
+            self.storage.upload('../data/blob.xz', read_ahead=0)
+        assert not self.manifest.load.called
+        self.blob_service.set_blob_metadata.assert_called_once_with(
+            'some-container', 'blob', {}
+        )
+        assert self.manifest.save.called
+
+    @patch('azurectl.logger.log.info')
+    @patch('azurectl.storage.storage.UploadManifest')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_delta_without_base(
+        self, mock_xz_open, mock_page_blob, mock_blob_service,
+        mock_manifest, mock_log_info
+    ):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        mock_manifest.return_value.etag = None
+        self.storage.upload('../data/blob.xz', delta=True)
+        assert mock_log_info.call_args_list[-1] == call(
+            'No unmodified former upload of %s found, uploading all data',
+            'blob'
+        )
+
+    @patch('azurectl.logger.log.warning')
+    @patch('azurectl.storage.storage.UploadManifest')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_delta_manifest_load_raises(
+        self, mock_xz_open, mock_page_blob, mock_blob_service,
+        mock_manifest, mock_log_warning
+    ):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        manifest = mock_manifest.return_value
+        manifest.load.side_effect = AzureUploadManifestError('truncated')
+        manifest.save.return_value = True
+        self.storage.upload('../data/blob.xz', delta=True)
+        manifest.discard_previous.assert_called_once_with()
+        mock_log_warning.assert_called_once_with(
+            'Upload manifest not read, uploading all data: %s: %s',
+            'AzureUploadManifestError', "'truncated'"
+        )
+        assert mock_page_blob.called
+
+    @patch('azurectl.logger.log.warning')
+    @patch('azurectl.storage.storage.UploadManifest')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_delta_manifest_not_saved(
+        self, mock_xz_open, mock_page_blob, mock_blob_service,
+        mock_manifest, mock_log_warning
+    ):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        mock_manifest.return_value.save.return_value = False
+        self.storage.upload('../data/blob.xz', delta=True)
+        mock_log_warning.assert_called_once_with(
+            'Upload of %s was resumed, no upload manifest written', 'blob'
+        )
+
+    @patch('azurectl.logger.log.warning')
+    @patch('azurectl.storage.storage.UploadManifest')
+    @patch('azurectl.storage.storage.PageBlobService')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_delta_manifest_save_raises(
+        self, mock_xz_open, mock_page_blob, mock_blob_service,
+        mock_manifest, mock_log_warning
+    ):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        mock_manifest.return_value.save.side_effect = Exception('failed')
+        self.storage.upload('../data/blob.xz', delta=True)
+        mock_log_warning.assert_called_once_with(
+            'Upload manifest not written: %s: %s', 'Exception', 'failed'
+        )
+
+    @patch('azurectl.storage.storage.UploadJournal')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.uncompressed_size')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_resume_raises(
+        self, mock_xz_open, mock_uncompressed_size, mock_page_blob,
+        mock_journal
+    ):
+        mock_page_blob.side_effect = Exception
+        mock_uncompressed_size.return_value = 1024
+        journal = mock.Mock()
+        mock_journal.return_value = journal
+        with raises(AzureStorageUploadError):
+            self.storage.upload('../data/blob.xz', resume=True)
+        assert journal.close.called
+        assert not journal.remove.called
+
+    @patch('azurectl.storage.storage.os.cpu_count')
     @patch('azurectl.storage.storage.PageBlob')
-    @patch('builtins.open')
+    @patch('azurectl.storage.storage.ParallelXZ')
+    def test_upload_parallel_xz(
+        self, mock_parallel_xz, mock_page_blob, mock_cpu_count
+    ):
+        mock_cpu_count.return_value = 2
+        page_blob = mock.Mock()
+        page_blob.next.side_effect = StopIteration
+        mock_page_blob.return_value = page_blob
+
+        self.storage.upload('../data/blob.blocks.xz', read_ahead=0)
+
+        mock_parallel_xz.assert_called_once_with(
+            '../data/blob.blocks.xz', mock.ANY, max_buffer_size=0
+        )
+        page_blob.next.assert_called_once_with(
+            mock_parallel_xz.return_value, 4194304, 5
+        )
+
+    @patch('azurectl.storage.storage.os.cpu_count')
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_xz_single_core(
+        self, mock_xz_open, mock_page_blob, mock_cpu_count
+    ):
+        mock_cpu_count.return_value = None
+        page_blob = mock.Mock()
+        page_blob.next.side_effect = StopIteration
+        mock_page_blob.return_value = page_blob
+
+        self.storage.upload('../data/blob.blocks.xz')
+
+        mock_xz_open.assert_called_once_with('../data/blob.blocks.xz')
+
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.XZIndex')
+    @patch('azurectl.storage.storage.XZ.uncompressed_size')
+    @patch('azurectl.storage.storage.XZ.open')
+    def test_upload_xz_without_index(
+        self, mock_xz_open, mock_uncompressed_size, mock_xz_index,
+        mock_page_blob
+    ):
+        mock_xz_index.side_effect = AzureXZIndexError('no index')
+        mock_uncompressed_size.return_value = 1024
+        page_blob = mock.Mock()
+        page_blob.next.side_effect = StopIteration
+        mock_page_blob.return_value = page_blob
+
+        self.storage.upload('../data/blob.xz')
+
+        mock_xz_open.assert_called_once_with('../data/blob.xz')
+
+    @patch('azurectl.storage.storage.PageBlob')
+    @patch('azurectl.storage.storage.SparseFile.open')
     @patch('os.path.getsize')
     def test_upload_uncompressed(
         self, mock_uncompressed_size, mock_open, mock_page_blob
@@ -122,14 +481,300 @@ class TestStorage:
 
         self.storage.upload('../data/blob.raw')
 
+        mock_open.assert_called_once_with('../data/blob.raw')
+
         assert page_blob.next.call_args_list == [
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5),
-            call(stream, None, 5)
+            call(stream, 4194304, 5),
+            call(stream, 4194304, 5),
+            call(stream, 4194304, 5),
+            call(stream, 4194304, 5)
         ]
         stream.close.assert_called_once_with()
 
+    @patch('azurectl.storage.storage.ReadAhead')
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_compressed(self, mock_page_blob, mock_read_ahead):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        mock_page_blob.return_value.page_start = 512
+        mock_read_ahead.DEFAULT_DEPTH = 4
+        for image, byte_size in [
+            ('../data/blob.gz', None), ('../data/blob.bz2', None),
+            ('../data/blob.zst', 52), ('../data/blob.lzma', None)
+        ]:
+            mock_page_blob.reset_mock()
+            mock_read_ahead.reset_mock()
+            self.blob_service.resize_blob.reset_mock()
+            self.storage.upload(image)
+            if byte_size is None:
+                # the size is not recorded, the page blob is cut to
+                # the size of the data at the end
+                assert mock_page_blob.call_args[0][3] == \
+                    mock_page_blob.MAX_BYTE_SIZE
+                self.blob_service.resize_blob.assert_called_once_with(
+                    'some-container', 'blob', 512
+                )
+                # the data is padded to a full page
+                stream = mock_page_blob.return_value.next.call_args[0][0]
+                assert stream.pipe == mock_read_ahead.return_value
+            else:
+                assert mock_page_blob.call_args[0][3] == byte_size
+                assert not self.blob_service.resize_blob.called
+            stream = mock_read_ahead.call_args[0][0]
+            assert stream.read(52) == \
+                b'Some data so that we can read it as multiple chunks\n'
+            stream.close()
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_convert_to_vhd(self, mock_page_blob):
+        uploads = []
+
+        def side_effect(stream, max_chunk_size, max_attempts):
+            data = bytearray()
+            while True:
+                data += bytes(stream.skip_hole())
+                chunk = stream.read(max_chunk_size)
+                if not chunk:
+                    break
+                data += chunk
+            uploads.append(bytes(data))
+            raise StopIteration
+
+        mock_page_blob.return_value.next.side_effect = side_effect
+        for image in ['../data/blob.qcow2', '../data/blob.raw']:
+            self.storage.upload(image, convert_to_vhd=True)
+            assert mock_page_blob.call_args[0][:4] == (
+                self.blob_service, 'blob.vhd', 'some-container',
+                1048576 + 512
+            )
+        qcow2_vhd, raw_vhd = uploads
+        assert qcow2_vhd[512:534] == b'qcow2 data cluster one'
+        assert qcow2_vhd[2560:2582] == b'qcow2 data cluster two'
+        assert qcow2_vhd[4096:1048576] == bytes(1048576 - 4096)
+        with open('../data/blob.raw', 'rb') as raw:
+            assert raw_vhd[:1024] == raw.read()
+        for vhd in uploads:
+            assert struct.unpack('>Q', vhd[-464:-456])[0] == 1048576
+            assert vhd[-512:-504] == b'conectix'
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_convert_to_vhd_named(self, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        self.storage.upload(
+            '../data/blob.raw', name='disk', convert_to_vhd=True
+        )
+        assert mock_page_blob.call_args[0][1] == 'disk'
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_convert_to_vhd_is_vhd(self, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        self.storage.upload('../data/blob.vhd', convert_to_vhd=True)
+        assert mock_page_blob.call_args[0][:4] == (
+            self.blob_service, 'blob.vhd', 'some-container', 1536
+        )
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_dynamic_vhd(self, mock_page_blob):
+        temp_dir = mkdtemp()
+        try:
+            with open('../data/blob.vhd', 'rb') as vhd:
+                footer = bytearray(vhd.read()[-512:])
+            footer[60:64] = b'\x00\x00\x00\x03'
+            image = os.sep.join([temp_dir, 'dynamic.vhd'])
+            with open(image, 'wb') as vhd:
+                vhd.write(footer + bytes(1024) + footer)
+            for convert_to_vhd in [False, True]:
+                with raises(AzureStorageUploadError):
+                    self.storage.upload(image, convert_to_vhd=convert_to_vhd)
+            compressed_image = image + '.xz'
+            with open(compressed_image, 'wb') as compressed:
+                compressed.write(lzma.compress(bytes(1024) + footer))
+            with raises(AzureStorageUploadError):
+                self.storage.upload(compressed_image, convert_to_vhd=True)
+            assert not mock_page_blob.called
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_convert_to_vhd_compressed_vhd(self, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        temp_dir = mkdtemp()
+        try:
+            image = os.sep.join([temp_dir, 'disk.vhd.xz'])
+            with open('../data/blob.vhd', 'rb') as vhd:
+                with open(image, 'wb') as compressed:
+                    compressed.write(lzma.compress(vhd.read()))
+            self.storage.upload(image, convert_to_vhd=True, read_ahead=0)
+            assert mock_page_blob.call_args[0][:4] == (
+                self.blob_service, 'disk.vhd', 'some-container', 1536
+            )
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('azurectl.storage.storage.sys')
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_pipe(self, mock_page_blob, mock_sys):
+        data = os.urandom(1000)
+        uploads = self.__read_uploads(mock_page_blob)
+        for convert_to_vhd, blob_size in [(False, 1024), (True, 1049088)]:
+            mock_sys.stdin.buffer = io.BytesIO(data)
+            self.storage.upload(
+                '-', 'blob.vhd', size=1000, convert_to_vhd=convert_to_vhd
+            )
+            assert mock_page_blob.call_args[0][:4] == (
+                self.blob_service, 'blob.vhd', 'some-container', blob_size
+            )
+            assert uploads[-1][:1024] == data + bytes(24)
+            assert len(uploads[-1]) == blob_size
+        assert not self.blob_service.resize_blob.called
+
+    @patch('azurectl.storage.storage.sys')
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_pipe_unknown_size(self, mock_page_blob, mock_sys):
+        data = os.urandom(1000)
+        uploads = self.__read_uploads(mock_page_blob)
+        for convert_to_vhd, blob_size in [(False, 1024), (True, 1049088)]:
+            mock_sys.stdin.buffer = io.BytesIO(data)
+            self.storage.upload(
+                '-', 'blob.vhd', convert_to_vhd=convert_to_vhd
+            )
+            assert mock_page_blob.call_args[0][3] == 8796093022208
+            assert uploads[-1][:1024] == data + bytes(24)
+            self.blob_service.resize_blob.assert_called_once_with(
+                'some-container', 'blob.vhd', blob_size
+            )
+            self.blob_service.resize_blob.reset_mock()
+        assert uploads[-1][-512:-504] == b'conectix'
+
+    @patch('azurectl.storage.storage.sys')
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_pipe_resize_failed(self, mock_page_blob, mock_sys):
+        mock_sys.stdin.buffer = io.BytesIO(bytes(512))
+        self.__read_uploads(mock_page_blob)
+        self.blob_service.resize_blob.side_effect = Exception
+        with raises(AzureStorageUploadError):
+            self.storage.upload('-', 'blob')
+        assert mock_sys.stdin.buffer.closed
+
+    @patch('azurectl.storage.storage.sys')
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_pipe_size_mismatch(self, mock_page_blob, mock_sys):
+        self.__read_uploads(mock_page_blob)
+        for data in [bytes(1000), bytes(1025)]:
+            mock_sys.stdin.buffer = io.BytesIO(data)
+            with raises(AzureStorageUploadError):
+                self.storage.upload('-', 'blob', size=1024)
+
+    def test_upload_pipe_invalid(self):
+        with raises(AzureStorageUploadError):
+            self.storage.upload('-')
+        with raises(AzureStorageUploadError):
+            self.storage.upload('-', 'blob', resume=True)
+        with raises(AzureStorageUploadError):
+            self.storage.upload('../data/blob.xz', size='1024')
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_files(self, mock_page_blob):
+        def page_blob(blob_service, name, *args):
+            if name == 'failing':
+                raise Exception('page blob failed')
+            blob = mock.Mock()
+            blob.next.side_effect = StopIteration
+            return blob
+
+        mock_page_blob.side_effect = page_blob
+        results = self.storage.upload_files(
+            [
+                ('../data/blob.raw', None),
+                ('../data/blob.gz', 'failing'),
+                ('../data/blob.qcow2', 'disk.vhd')
+            ],
+            max_uploads=2, max_threads=4, max_bandwidth='1048576',
+            convert_to_vhd=True
+        )
+        assert [
+            (result['source'], result['blob_name'], result['status'])
+            for result in results
+        ] == [
+            ('../data/blob.raw', 'blob.vhd', 'uploaded'),
+            ('../data/blob.gz', 'failing', 'failed'),
+            ('../data/blob.qcow2', 'disk.vhd', 'uploaded')
+        ]
+        assert results[0]['byte_size'] == 1048576 + 512
+        assert results[1]['error'] == \
+            "AzureStorageUploadError: 'Exception: page blob failed'"
+        assert 'byte_size' not in results[1]
+        assert self.storage.upload_status == {
+            'current_bytes': 2 * (1048576 + 512),
+            'total_bytes': 2 * (1048576 + 512)
+        }
+        # all uploads share one blob service and rate limit
+        self.mock_rate_limit.assert_called_once_with('1048576', None)
+        assert set(
+            call_args[0][0] for call_args in mock_page_blob.call_args_list
+        ) == set([self.blob_service])
+        request_session = azurectl.storage.storage.PageBlobService.call_args[
+            1
+        ]['request_session']
+        assert request_session.get_adapter(
+            'https://mock-storage-name.blob.core.windows.net'
+        )._pool_maxsize == 8
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_files_defaults(self, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        results = self.storage.upload_files([('../data/blob.raw', None)])
+        assert results[0]['status'] == 'uploaded'
+        request_session = azurectl.storage.storage.PageBlobService.call_args[
+            1
+        ]['request_session']
+        assert request_session.get_adapter(
+            'https://mock-storage-name.blob.core.windows.net'
+        )._pool_maxsize == Storage.MAX_UPLOADS
+
+    @patch('azurectl.storage.storage.PageBlob')
+    def test_upload_connection_pool(self, mock_page_blob):
+        mock_page_blob.return_value.next.side_effect = StopIteration
+        self.storage.upload('../data/blob.raw', max_threads='16')
+        request_session = azurectl.storage.storage.PageBlobService.call_args[
+            1
+        ]['request_session']
+        assert request_session.get_adapter(
+            'https://mock-storage-name.blob.core.windows.net'
+        )._pool_maxsize == 16
+
+    def test_upload_files_invalid(self):
+        with raises(AzureStorageFileNotFound):
+            self.storage.upload_files(
+                [('../data/blob.raw', None), ('some-file', None)]
+            )
+        with raises(AzureStorageUploadError):
+            self.storage.upload_files(
+                [('../data/blob.raw', 'blob'), ('../data/blob.xz', 'blob')]
+            )
+
+    def __read_uploads(self, mock_page_blob):
+        # the mocked page blob reads the data stream up to its end
+        uploads = []
+        mock_page_blob.MAX_BYTE_SIZE = 8796093022208
+        page_blob = mock_page_blob.return_value
+
+        def side_effect(stream, max_chunk_size, max_attempts):
+            byte_size = mock_page_blob.call_args[0][3]
+            data = bytearray()
+            while len(data) < byte_size:
+                data += bytes(stream.skip_hole()) \
+                    if hasattr(stream, 'skip_hole') else b''
+                chunk = stream.read(min(max_chunk_size, byte_size - len(data)))
+                if not chunk:
+                    break
+                data += chunk
+            uploads.append(bytes(data))
+            page_blob.page_start = len(data)
+            raise StopIteration
+
+        page_blob.next.side_effect = side_effect
+        return uploads
+
     @patch('azurectl.storage.storage.PageBlobService')
     @patch('azurectl.storage.storage.PageBlob')
     def test_upload_empty_raises(self, mock_page_blob_class, mock_blob_service):
@@ -164,12 +809,241 @@ class TestStorage:
             gb - 1
         )
 
-    @patch('azurectl.storage.storage.PageBlobService.delete_blob')
-    def test_delete(self, mock_delete_blob):
-        mock_delete_blob.side_effect = Exception
+    @patch('azurectl.storage.storage.PageBlobDownload')
+    def test_download(self, mock_download):
+        data = os.urandom(1024)
+        download = mock_download.return_value
+        download.byte_size = 4 * 1048576
+        download.data_byte_size = 2048
+        download.read.return_value = [(512, data), (2097152, data)]
+        temp_dir = mkdtemp()
+        try:
+            image = os.sep.join([temp_dir, 'image.raw'])
+            assert self.storage.download(
+                'blob', image, '1024', max_threads=8, max_bandwidth='100'
+            ) == image
+            mock_download.assert_called_once_with(
+                self.blob_service, 'blob', 'some-container', '1024', 8,
+                self.rate_limit
+            )
+            self.mock_rate_limit.assert_called_once_with('100')
+            download.read.assert_called_once_with(5)
+            with open(image, 'rb') as raw:
+                assert raw.read() == bytes(512) + data + \
+                    bytes(2097152 - 1536) + data + bytes(2097152 - 1024)
+            assert self.storage.download_status == {
+                'current_bytes': 2048, 'total_bytes': 2048
+            }
+            self.storage.print_download_status()
+
+            os.chdir(temp_dir)
+            assert self.storage.download('disks/blob', compress=True) == \
+                'blob.xz'
+            with lzma.open('blob.xz') as xz:
+                with open(image, 'rb') as raw:
+                    assert xz.read() == raw.read()
+        finally:
+            os.chdir(self.test_dir)
+            shutil.rmtree(temp_dir)
+
+    @patch('azurectl.storage.storage.PageBlobDownload')
+    def test_download_raises(self, mock_download):
+        temp_dir = mkdtemp()
+        try:
+            image = os.sep.join([temp_dir, 'image.raw'])
+            mock_download.return_value.read.side_effect = Exception
+            with raises(AzureStorageDownloadError):
+                self.storage.download('blob', image)
+            assert not os.path.exists(image)
+            open(image, 'w').close()
+            mock_download.side_effect = Exception
+            with raises(AzureStorageDownloadError):
+                self.storage.download('blob', image)
+            assert os.path.exists(image)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    @patch('azurectl.storage.storage.time.sleep')
+    def test_copy(self, mock_sleep):
+        progress = {
+            'west': ['512/1024', '1024/1024'],
+            'east': ['1024/1024']
+        }
+
+        def copy_blob(container, blob_name, copy_source):
+            if container == 'missing':
+                raise Exception('container not found')
+            assert copy_source.startswith(
+                'https://mock-storage-name.blob.core.windows.net/'
+                'some-container/blob?'
+            )
+            assert 'sp=r' in copy_source
+            return self.__copy_properties('pending', '0/1024')
+
+        def get_blob_properties(container, blob_name):
+            blob = mock.Mock()
+            blob.properties.content_length = 1024
+            if container != 'some-container':
+                blob.properties.copy = self.__copy_properties(
+                    'pending' if len(progress[container]) > 1 else 'success',
+                    progress[container].pop(0)
+                )
+            return blob
+
+        self.blob_service.copy_blob.side_effect = copy_blob
+        self.blob_service.get_blob_properties.side_effect = \
+            get_blob_properties
+        results = self.storage.copy(
+            'blob', [
+                ('west-account', 'west-key', 'west'),
+                ('east-account', 'east-key', 'east'),
+                ('other-account', 'other-key', 'missing')
+            ],
+            'copied-blob'
+        )
+        assert [
+            (result['account'], result['container'], result['status'])
+            for result in results
+        ] == [
+            ('west-account', 'west', 'copied'),
+            ('east-account', 'east', 'copied'),
+            ('other-account', 'missing', 'failed')
+        ]
+        assert results[0]['blob_name'] == 'copied-blob'
+        assert results[2]['error'] == 'Exception: container not found'
+        assert mock_sleep.call_count == 2
+        assert self.storage.copy_status == {
+            'current_bytes': 2048, 'total_bytes': 3072
+        }
+        assert azurectl.storage.storage.PageBlobService.call_args_list[
+            -3:
+        ] == [
+            call(
+                account_name, account_key,
+                endpoint_suffix='core.windows.net'
+            ) for account_name, account_key in [
+                ('west-account', 'west-key'),
+                ('east-account', 'east-key'),
+                ('other-account', 'other-key')
+            ]
+        ]
+        self.storage.print_copy_status()
+
+    def test_copy_source_not_found(self):
+        self.blob_service.get_blob_properties.side_effect = Exception
+        with raises(AzureStorageCopyError):
+            self.storage.copy('blob', [('account', 'key', 'container')])
+        assert not self.blob_service.copy_blob.called
+
+    def __copy_properties(self, status, progress):
+        copy = mock.Mock()
+        copy.status = status
+        copy.progress = progress
+        copy.status_description = None
+        return copy
+
+    def test_delete(self):
+        self.blob_service.delete_blob.side_effect = Exception
         with raises(AzureStorageDeleteError):
             self.storage.delete('some-blob')
 
+    @patch('azurectl.storage.storage.Container')
+    def test_delete_blobs(self, mock_container):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        mock_container.return_value.blobs.return_value = [
+            {'name': name, 'last_modified': now - datetime.timedelta(days=days)}
+            for name, days in [
+                ('image-1.vhd', 10), ('image-2.vhd', 1), ('image-3.raw', 10),
+                ('image-4.vhd', 20)
+            ]
+        ]
+
+        def delete_blob(container, blob_name):
+            if blob_name == 'image-4.vhd':
+                raise Exception('lease')
+        self.blob_service.delete_blob.side_effect = delete_blob
+        assert self.storage.delete_blobs(
+            'image-*.vhd', older_than='7', max_threads=2
+        ) == [
+            {'blob_name': 'image-1.vhd', 'status': 'deleted'},
+            {
+                'blob_name': 'image-4.vhd',
+                'status': 'failed',
+                'error': 'Exception: lease'
+            }
+        ]
+        mock_container.assert_called_once_with(
+            account_name='mock-storage-name',
+            key='bW9jay1zdG9yYWdlLWtleQ==',
+            blob_service_host_base='core.windows.net'
+        )
+        mock_container.return_value.blobs.assert_called_once_with(
+            'some-container', prefix='image-'
+        )
+        assert self.blob_service.delete_blob.call_count == 2
+
+    @patch('azurectl.storage.storage.Container')
+    def test_delete_blobs_dry_run(self, mock_container):
+        mock_container.return_value.blobs.return_value = [
+            {'name': 'old/a.vhd'}, {'name': 'older/b.vhd'}
+        ]
+        assert self.storage.delete_blobs(
+            '*.vhd', prefix='old/', dry_run=True
+        ) == [{'blob_name': 'old/a.vhd', 'status': 'matched'}]
+        mock_container.return_value.blobs.assert_called_once_with(
+            'some-container', prefix='old/'
+        )
+        assert not self.blob_service.delete_blob.called
+
+    @patch('azurectl.storage.storage.Container')
+    def test_delete_blobs_no_match(self, mock_container):
+        mock_container.return_value.blobs.return_value = []
+        assert self.storage.delete_blobs('*.vhd') == []
+        mock_container.return_value.blobs.assert_called_once_with(
+            'some-container', prefix=None
+        )
+        assert not self.blob_service.delete_blob.called
+
+    @patch('azurectl.storage.storage.Container')
+    def test_delete_blobs_by_name(self, mock_container):
+        assert self.storage.delete_blobs('image.vhd') == [
+            {'blob_name': 'image.vhd', 'status': 'deleted'}
+        ]
+        assert not mock_container.called
+        self.blob_service.delete_blob.assert_called_once_with(
+            'some-container', 'image.vhd'
+        )
+
+    @patch('azurectl.storage.storage.Container')
+    def test_delete_blobs_invalid_older_than(self, mock_container):
+        for older_than in ['nan', 'inf', '1e12']:
+            with raises(AzureStorageDeleteError):
+                self.storage.delete_blobs(prefix='image-', older_than=older_than)
+        assert not mock_container.called
+
+    @patch('azurectl.storage.storage.Container')
+    def test_delete_blobs_by_name_dry_run(self, mock_container):
+        assert self.storage.delete_blobs('image.vhd', dry_run=True) == [
+            {'blob_name': 'image.vhd', 'status': 'matched'}
+        ]
+        self.blob_service.get_blob_properties.assert_called_once_with(
+            'some-container', 'image.vhd'
+        )
+        self.blob_service.get_blob_properties.side_effect = \
+            AzureMissingResourceHttpError('not found', 404)
+        assert self.storage.delete_blobs('image.vhd', dry_run=True) == []
+        self.blob_service.get_blob_properties.side_effect = Exception
+        with raises(AzureStorageDeleteError):
+            self.storage.delete_blobs('image.vhd', dry_run=True)
+        assert not mock_container.called
+        assert not self.blob_service.delete_blob.called
+
+    @patch('azurectl.storage.storage.Container')
+    def test_delete_blobs_listing_failed(self, mock_container):
+        mock_container.return_value.blobs.side_effect = Exception
+        with raises(AzureStorageDeleteError):
+            self.storage.delete_blobs(prefix='image-')
+
     def test_print_upload_status(self):
         self.storage.print_upload_status()
         assert self.storage.upload_status == \
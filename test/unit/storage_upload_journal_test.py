@@ -0,0 +1,104 @@
+from .test_helper import argv_kiwi_tests
+
+import os
+import mock
+from mock import patch
+from pytest import raises
+from tempfile import mkdtemp, NamedTemporaryFile
+import shutil
+
+from azurectl.storage.upload_journal import UploadJournal
+from azurectl.azurectl_exceptions import AzureUploadJournalError
+
+
+class TestUploadJournal:
+    def setup(self):
+        self.journal_dir = mkdtemp()
+        self.image = NamedTemporaryFile()
+        self.image.write(b'a' * 4096)
+        self.image.flush()
+        self.journal = UploadJournal(
+            'account', 'container', 'some/blob', self.journal_dir + '/upload'
+        )
+
+    def teardown(self):
+        self.journal.close()
+        self.image.close()
+        shutil.rmtree(self.journal_dir)
+
+    @patch.dict('os.environ', {'HOME': 'foo'})
+    def test_default_journal_dir(self):
+        journal = UploadJournal('account', 'container', 'some/blob')
+        assert journal.journal_file == \
+            'foo/.cache/azurectl/upload/account%2Fcontainer%2Fsome%2Fblob'
+
+    def test_open_new(self):
+        assert self.journal.open(self.image.name, 4096) is False
+        assert self.journal.is_resumable() is False
+        assert os.path.exists(self.journal.journal_file)
+
+    def test_open_other_delta_base(self):
+        self.journal.open(self.image.name, 4096, 'etag')
+        self.journal.commit(0, 1024)
+        self.journal.close()
+        journal = UploadJournal(
+            'account', 'container', 'some/blob', self.journal_dir + '/upload'
+        )
+        assert journal.open(self.image.name, 4096, 'other-etag') is False
+        journal.close()
+
+    def test_open_failed(self):
+        journal = UploadJournal(
+            'account', 'container', 'blob', '/proc/azurectl'
+        )
+        with raises(AzureUploadJournalError):
+            journal.open(self.image.name, 4096)
+
+    def test_commit_and_resume(self):
+        self.journal.open(self.image.name, 4096)
+        self.journal.commit(0, 1024)
+        self.journal.commit(2048, 3072)
+        self.journal.commit(1024, 1536)
+        self.journal.commit(512, 512)
+        self.journal.close()
+
+        journal = UploadJournal(
+            'account', 'container', 'some/blob', self.journal_dir + '/upload'
+        )
+        assert journal.open(self.image.name, 4096) is True
+        assert journal.is_resumable() is True
+        assert journal.committed_range_size(0) == 1536
+        assert journal.committed_range_size(512) == 1024
+        assert journal.committed_range_size(1536) == 0
+        assert journal.committed_range_size(2048) == 1024
+        assert journal.committed_range_size(4000) == 0
+        journal.commit(1536, 2048)
+        assert journal.committed_range_size(0) == 3072
+        journal.close()
+
+    def test_resume_modified_image(self):
+        self.journal.open(self.image.name, 4096)
+        self.journal.commit(0, 1024)
+        self.journal.close()
+        assert self.journal.open(self.image.name, 8192) is False
+        assert self.journal.committed_range_size(0) == 0
+
+    def test_resume_corrupted_journal(self):
+        os.makedirs(os.path.dirname(self.journal.journal_file))
+        with open(self.journal.journal_file, 'w') as journal:
+            journal.write('{garbage')
+        assert self.journal.open(self.image.name, 4096) is False
+
+    def test_resume_incomplete_record(self):
+        self.journal.open(self.image.name, 4096)
+        self.journal.commit(0, 1024)
+        self.journal.journal.write('1024')
+        self.journal.close()
+        assert self.journal.open(self.image.name, 4096) is True
+        assert self.journal.committed_range_size(0) == 1024
+
+    def test_remove(self):
+        self.journal.open(self.image.name, 4096)
+        self.journal.remove()
+        assert not os.path.exists(self.journal.journal_file)
+        self.journal.remove()
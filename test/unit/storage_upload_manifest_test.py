@@ -0,0 +1,141 @@
+from .test_helper import argv_kiwi_tests
+
+import os
+from mock import patch
+from pytest import raises
+from tempfile import mkdtemp
+import shutil
+
+from azure.storage.blob.models import PageRange
+
+from azurectl.storage.upload_manifest import UploadManifest
+from azurectl.azurectl_exceptions import AzureUploadManifestError
+
+
+class TestUploadManifest:
+    def setup(self):
+        self.manifest_dir = mkdtemp()
+        self.manifest = self.__new_manifest()
+
+    def teardown(self):
+        shutil.rmtree(self.manifest_dir)
+
+    @patch.dict('os.environ', {'HOME': 'foo'})
+    def test_default_manifest_dir(self):
+        manifest = UploadManifest('account', 'container', 'some/blob', 1024)
+        assert manifest.manifest_file == \
+            'foo/.cache/azurectl/manifest/account%2Fcontainer%2Fsome%2Fblob'
+
+    def test_load_not_existing(self):
+        assert self.manifest.load() is False
+        assert self.manifest.etag is None
+        assert self.manifest.previous_chunk(0) is None
+
+    def test_save_and_load(self):
+        self.manifest.add(0, 1024, b'a' * 16)
+        self.manifest.add(1024, 1024, None)
+        self.manifest.add(2048, 512, b'b' * 16)
+        assert self.manifest.save(2560, '"etag"') is True
+
+        manifest = self.__new_manifest(chunk_size=4096)
+        assert manifest.load() is True
+        assert manifest.chunk_size == 1024
+        assert manifest.etag == '"etag"'
+        assert manifest.previous_chunk(0) == (1024, b'a' * 16)
+        assert manifest.previous_chunk(1024) == (1024, None)
+        assert manifest.previous_chunk(2048) == (512, b'b' * 16)
+        assert manifest.previous_chunk(512) is None
+        assert os.path.getsize(manifest.manifest_file) == \
+            UploadManifest.HEADER.size + 6 + 3 * UploadManifest.RECORD.size
+
+    def test_blob_metadata(self):
+        self.manifest.add(0, 1024, b'a' * 16)
+        self.manifest.add(1024, 512, None)
+        metadata = self.manifest.blob_metadata(1536)
+        assert metadata == {
+            'azurectl_manifest_md5': self.manifest.content_digest(),
+            'azurectl_manifest_chunk_size': '1024'
+        }
+        assert self.manifest.blob_metadata(2048) == {}
+
+    def test_content_digest(self):
+        manifest = self.__new_manifest()
+        for chunk_manifest in [self.manifest, manifest]:
+            chunk_manifest.add(0, 1024, b'a' * 16)
+            chunk_manifest.add(1024, 1024, None)
+        assert self.manifest.content_digest() == manifest.content_digest()
+        other_manifest = self.__new_manifest()
+        other_manifest.add(0, 1024, b'b' * 16)
+        other_manifest.add(1024, 1024, None)
+        assert self.manifest.content_digest() != \
+            other_manifest.content_digest()
+
+    def test_verify(self):
+        self.manifest.add(0, 1024, b'a' * 16)
+        self.manifest.add(1024, 1024, None)
+        self.manifest.add(2048, 1024, b'b' * 16)
+        self.manifest.add(3072, 1024, b'c' * 16)
+        self.manifest.add(4096, 1024, None)
+        assert self.manifest.verify(
+            [PageRange(3584, 3583 + 512), PageRange(512, 1023),
+             PageRange(2048, 2559)]
+        ) == []
+        assert self.manifest.verify(
+            [PageRange(0, 2559), PageRange(4096, 4607)]
+        ) == [1024, 3072, 4096]
+        assert self.manifest.verify([]) == [0, 2048, 3072]
+
+    def test_discard_previous(self):
+        self.manifest.add(0, 1024, b'a' * 16)
+        self.manifest.save(1024, 'etag')
+        manifest = self.__new_manifest()
+        manifest.load()
+        manifest.discard_previous()
+        assert manifest.etag is None
+        assert manifest.previous_chunk(0) is None
+
+    def test_save_incomplete(self):
+        self.manifest.add(0, 1024, b'a' * 16)
+        self.manifest.save(1024, 'etag')
+        manifest = self.__new_manifest()
+        manifest.add(1024, 1024, b'a' * 16)
+        assert manifest.save(2048, 'etag') is False
+        assert not os.path.exists(manifest.manifest_file)
+
+    def test_save_unaligned(self):
+        self.manifest.add(0, 512, b'a' * 16)
+        self.manifest.add(512, 512, b'a' * 16)
+        assert self.manifest.save(1024, 'etag') is False
+
+    def test_save_short(self):
+        self.manifest.add(0, 1024, b'a' * 16)
+        assert self.manifest.save(2048, 'etag') is False
+        assert not os.path.exists(self.manifest.manifest_file)
+
+    def test_save_failed(self):
+        manifest = UploadManifest(
+            'account', 'container', 'blob', 1024, '/proc/azurectl'
+        )
+        manifest.add(0, 1024, None)
+        with raises(AzureUploadManifestError):
+            manifest.save(1024, 'etag')
+
+    def test_load_invalid(self):
+        os.makedirs(os.path.dirname(self.manifest.manifest_file))
+        with open(self.manifest.manifest_file, 'wb') as manifest:
+            manifest.write(b'AZMF')
+        assert self.manifest.load() is False
+        with open(self.manifest.manifest_file, 'wb') as manifest:
+            manifest.write(UploadManifest.HEADER.pack(b'garbage!', 1, 1, 0))
+        assert self.manifest.load() is False
+
+    def test_load_failed(self):
+        os.makedirs(self.manifest.manifest_file)
+        with raises(AzureUploadManifestError):
+            self.manifest.load()
+
+    def __new_manifest(self, chunk_size=1024):
+        return UploadManifest(
+            'account', 'container', 'some/blob', chunk_size,
+            self.manifest_dir + '/manifest'
+        )
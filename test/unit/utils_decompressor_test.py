@@ -0,0 +1,190 @@
+from .test_helper import argv_kiwi_tests
+
+from mock import patch
+from pytest import raises
+import bz2
+import importlib.util
+import io
+import os
+import shutil
+import sys
+import zstandard
+from tempfile import mkdtemp
+
+from azurectl.utils.decompressor import (
+    Decompressor,
+    GZip,
+    BZip2,
+    ZStd
+)
+from azurectl.azurectl_exceptions import AzureDecompressorNotAvailable
+
+DATA = b'Some data so that we can read it as multiple chunks\n'
+
+
+class TestDecompressor:
+    def test_new_decompressor(self):
+        with raises(NotImplementedError):
+            Decompressor(io.BytesIO())
+
+
+class TestGZip:
+    def test_read_chunks(self):
+        with GZip.open('../data/blob.gz') as gzip:
+            assert gzip.read(30) == DATA[:30]
+            assert gzip.read(30) == DATA[30:]
+            assert gzip.read(30) is None
+
+    def test_read_with_small_input_buffer(self):
+        with GZip.open('../data/blob.gz', buffer_size=4) as gzip:
+            assert gzip.read(100) == DATA
+            assert gzip.read(100) is None
+
+    def test_read_members(self):
+        with open('../data/blob.gz', 'rb') as gzip_file:
+            member = gzip_file.read()
+        gzip = GZip(io.BytesIO(member + bytes(8) + member), 16)
+        assert gzip.read(200) == DATA + DATA
+        assert gzip.read(200) is None
+
+    def test_read_truncated(self):
+        with open('../data/blob.gz', 'rb') as gzip_file:
+            truncated = io.BytesIO(gzip_file.read()[:-10])
+        gzip = GZip(truncated)
+        with raises(EOFError):
+            gzip.read(1024)
+
+    def test_uncompressed_size(self):
+        assert GZip.uncompressed_size('../data/blob.gz') is None
+
+    def test_uncompressed_tail(self):
+        assert GZip.uncompressed_tail('../data/blob.gz', 100) == DATA
+        with patch.object(GZip, 'STREAM_BUFFER_SIZE', 8):
+            assert GZip.uncompressed_tail('../data/blob.gz', 10) == \
+                DATA[-10:]
+
+
+class TestBZip2:
+    def test_read_chunks(self):
+        with BZip2.open('../data/blob.bz2', buffer_size=8) as bzip2:
+            assert bzip2.read(8) == DATA[:8]
+            assert bzip2.read(100) == DATA[8:]
+            assert bzip2.read(8) is None
+
+    @patch.object(BZip2, 'new_decompressor')
+    def test_read_chunks_without_max_length(self, mock_new_decompressor):
+        mock_new_decompressor.side_effect = UnlimitedDecompressor
+        with open('../data/blob.bz2', 'rb') as bzip2_file:
+            stream = bzip2_file.read()
+        bzip2 = BZip2(io.BytesIO(stream + stream), 16)
+        assert bzip2.read(8) == DATA[:8]
+        assert bzip2.read(30) == DATA[8:38]
+        assert bzip2.read(30) == DATA[38:] + DATA[:16]
+        assert bzip2.read(100) == DATA[16:]
+        assert bzip2.read(8) is None
+
+    def test_uncompressed_size(self):
+        assert BZip2.uncompressed_size('../data/blob.bz2') is None
+
+
+class TestZStd:
+    def setup(self):
+        self.temp_dir = mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_read_chunks(self):
+        with ZStd.open('../data/blob.zst', buffer_size=8) as zstd:
+            assert zstd.read(30) == DATA[:30]
+            assert zstd.read(30) == DATA[30:]
+            assert zstd.read(30) is None
+
+    def test_read_frames(self):
+        with ZStd.open(self.__frames()) as zstd:
+            assert zstd.read(1000) == b'a' * 1000
+            assert zstd.read(2000) == b'b' * 600 + b'c' * 1400
+            assert zstd.read(200000) == b'c' * 198600
+            assert zstd.read(10) is None
+
+    def test_zstandard_not_available(self):
+        with patch('azurectl.utils.decompressor.zstandard', None):
+            with raises(AzureDecompressorNotAvailable):
+                ZStd.open('../data/blob.zst')
+
+    def test_zstandard_not_installed(self):
+        spec = importlib.util.find_spec('azurectl.utils.decompressor')
+        decompressor = importlib.util.module_from_spec(spec)
+        with patch.dict(sys.modules, {'zstandard': None}):
+            spec.loader.exec_module(decompressor)
+        assert decompressor.zstandard is None
+
+    def test_uncompressed_size(self):
+        assert ZStd.uncompressed_size('../data/blob.zst') == 52
+        assert ZStd.uncompressed_size(self.__frames()) == 201600
+
+    def test_uncompressed_size_without_content_size(self):
+        compressor = zstandard.ZstdCompressor(write_content_size=False)
+        image = self.__write(
+            'unknown.zst',
+            compressor.compress(DATA) + compressor.compress(DATA)
+        )
+        assert ZStd.uncompressed_size(image) is None
+
+    def test_uncompressed_size_not_zstd(self):
+        with open('../data/blob.zst', 'rb') as zstd_file:
+            image = self.__write(
+                'garbage.zst', zstd_file.read() + b'garbage!'
+            )
+        assert ZStd.uncompressed_size(image) is None
+        with ZStd.open(image) as zstd:
+            with raises(zstandard.ZstdError):
+                zstd.read(1024)
+
+    def test_truncated(self):
+        with open(self.__frames(), 'rb') as zstd_file:
+            data = zstd_file.read()
+        for size in [len(data) - 10, 5, 30, 37]:
+            image = self.__write('truncated.zst', data[:size])
+            with raises(EOFError):
+                ZStd.uncompressed_size(image)
+            with raises(EOFError):
+                ZStd.open(image)
+
+    def __frames(self):
+        # a frame with a two byte content size and a checksum, a
+        # skippable frame, and a frame of run length encoded blocks
+        skippable_frame = b'\x50\x2a\x4d\x18\x04\x00\x00\x00skip'
+        return self.__write(
+            'frames.zst',
+            zstandard.ZstdCompressor(write_checksum=True).compress(
+                b'a' * 1000 + b'b' * 600
+            ) +
+            skippable_frame +
+            zstandard.ZstdCompressor().compress(b'c' * 200000)
+        )
+
+    def __write(self, name, data):
+        image = os.sep.join([self.temp_dir, name])
+        with open(image, 'wb') as zstd_file:
+            zstd_file.write(data)
+        return image
+
+
+class UnlimitedDecompressor(object):
+    """
+        bz2 decompressor object of Python 3.4 without max_length
+    """
+    def __init__(self):
+        self.bz2 = bz2.BZ2Decompressor()
+
+    @property
+    def eof(self):
+        return self.bz2.eof
+
+    @property
+    def unused_data(self):
+        return self.bz2.unused_data
+
+    def decompress(self, data):
+        return self.bz2.decompress(data)
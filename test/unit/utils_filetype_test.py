@@ -1,5 +1,9 @@
 from .test_helper import argv_kiwi_tests
 
+import os
+import shutil
+from tempfile import mkdtemp
+
 from azurectl.utils.filetype import FileType
 
 
@@ -10,10 +14,61 @@ class TestFileType:
 
     def test_is_xz(self):
         assert self.filetype_xz.is_xz() is True
+        assert self.filetype_xz.is_compressed() is True
+        assert self.filetype_xz.compression == 'xz'
 
     def test_not_xz(self):
         assert self.filetype_not_xz.is_xz() is False
+        assert self.filetype_not_xz.is_compressed() is False
+        assert self.filetype_not_xz.is_raw() is True
+
+    def test_compressions(self):
+        assert FileType('../data/blob.lzma').is_lzma() is True
+        assert FileType('../data/blob.gz').is_gzip() is True
+        assert FileType('../data/blob.bz2').is_bzip2() is True
+        assert FileType('../data/blob.zst').is_zstd() is True
+        assert FileType('../data/blob.gz').is_raw() is False
+
+    def test_qcow2(self):
+        filetype = FileType('../data/blob.qcow2')
+        assert filetype.is_qcow2() is True
+        assert filetype.is_compressed() is False
+        assert filetype.is_raw() is False
+        assert filetype.is_vhd() is False
+
+    def test_vhd(self):
+        filetype = FileType('../data/blob.vhd')
+        assert filetype.is_vhd() is True
+        assert filetype.is_fixed_vhd() is True
+        assert filetype.vhd_disk_type == 'fixed'
+        assert filetype.is_raw() is False
+
+    def test_dynamic_vhd_header(self):
+        temp_dir = mkdtemp()
+        try:
+            image = os.sep.join([temp_dir, 'dynamic.vhd'])
+            with open('../data/blob.vhd', 'rb') as vhd:
+                footer = bytearray(vhd.read()[-512:])
+            footer[60:64] = b'\x00\x00\x00\x03'
+            with open(image, 'wb') as vhd:
+                vhd.write(footer + bytes(1024))
+            filetype = FileType(image)
+            assert filetype.is_vhd() is True
+            assert filetype.is_fixed_vhd() is False
+            assert filetype.vhd_disk_type == 'dynamic'
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_raw(self):
+        filetype = FileType('../data/blob.raw')
+        assert filetype.is_raw() is True
+        assert filetype.is_vhd() is False
+        assert filetype.vhd_disk_type is None
+        assert FileType('../data/customdata').is_raw() is True
 
     def test_basename(self):
         assert self.filetype_xz.basename() == 'blob'
         assert self.filetype_not_xz.basename() == 'id_test'
+        assert FileType('../data/blob.gz').basename() == 'blob'
+        assert FileType('../data/blob.zst').basename() == 'blob'
+        assert FileType('../data/blob.vhd').basename() == 'blob.vhd'
@@ -48,3 +48,21 @@ class TestDataOutput:
         mock_warn.assert_any_call(
             'run: pip install pjson'
         )
+
+    @patch('sys.stdout')
+    def test_display_ndjson(self, mock_stdout):
+        self.out.data_format = 'ndjson'
+        self.out.display()
+        mock_stdout.write.assert_any_call('{"some-name": "some-data"}')
+
+    @patch('sys.stdout')
+    def test_stream(self, mock_stdout):
+        self.out.stream(
+            {'name': name, 'size': 1} for name in ['b', 'a']
+        )
+        assert [
+            call[0][0] for call in mock_stdout.write.call_args_list
+        ] == [
+            '{"name": "b", "size": 1}', '\n', '{"name": "a", "size": 1}', '\n'
+        ]
+        assert mock_stdout.flush.call_count == 2
@@ -0,0 +1,35 @@
+from .test_helper import argv_kiwi_tests
+
+import io
+import os
+
+from azurectl.utils.pipe_stream import PipeStream
+
+DATA = os.urandom(1000)
+
+
+class Pipe(object):
+    # a pipe which returns at most 300 bytes per read
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def read(self, size):
+        return self.data.read(min(size, 300))
+
+    def close(self):
+        self.data.close()
+
+
+class TestPipeStream:
+    def test_read(self):
+        with PipeStream(Pipe(DATA)) as pipe:
+            assert pipe.read(512) == DATA[:512]
+            assert pipe.read(4096) == DATA[512:] + bytes(24)
+            assert pipe.read(4096) == b''
+            assert pipe.byte_size == 1000
+
+    def test_read_page_aligned(self):
+        pipe = PipeStream(Pipe(DATA[:512]))
+        assert pipe.read(512) == DATA[:512]
+        assert pipe.read(512) == b''
+        assert pipe.byte_size == 512
@@ -0,0 +1,169 @@
+from .test_helper import argv_kiwi_tests
+
+import os
+import shutil
+import struct
+import zlib
+from pytest import raises
+from tempfile import mkdtemp
+
+from azurectl.utils.qcow2 import Qcow2
+from azurectl.azurectl_exceptions import AzureQcow2FormatError
+
+CLUSTER_ONE = b'qcow2 data cluster one'.ljust(512, b'\x00')
+CLUSTER_TWO = b'qcow2 data cluster two'.ljust(512, b'\x00')
+
+# offsets in ../data/blob.qcow2
+L1_TABLE = 0x200
+L2_TABLE = 0x800
+END_OF_IMAGE = 0xe00
+
+
+class TestQcow2:
+    def setup(self):
+        self.temp_dir = mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_virtual_size(self):
+        assert Qcow2.virtual_size('../data/blob.qcow2') == 4096
+
+    def test_read_with_holes(self):
+        with Qcow2.open('../data/blob.qcow2') as qcow2:
+            assert qcow2.skip_hole() == 512
+            assert qcow2.read(4096) == CLUSTER_ONE
+            assert qcow2.skip_hole() == 1536
+            assert qcow2.skip_hole() == 0
+            assert qcow2.read(100) == CLUSTER_TWO[:100]
+            assert qcow2.read(4096) == CLUSTER_TWO[100:]
+            assert qcow2.skip_hole() == 1024
+            assert qcow2.read(4096) == b''
+
+    def test_read_hole(self):
+        with Qcow2.open('../data/blob.qcow2') as qcow2:
+            assert qcow2.read(4096) == bytes(512)
+            qcow2.seek(1024)
+            assert qcow2.read(4096) == bytes(1536)
+            assert qcow2.read(4096) == CLUSTER_TWO
+
+    def test_read_consecutive_clusters(self):
+        image = self.__image({
+            L2_TABLE + 16: self.__entry(0xc00),
+            L2_TABLE + 40: 0
+        })
+        with Qcow2.open(image) as qcow2:
+            qcow2.skip_hole()
+            assert qcow2.read(4096) == CLUSTER_ONE + CLUSTER_TWO
+            assert qcow2.skip_hole() == 2560
+
+    def test_read_clusters_out_of_order(self):
+        image = self.__image({
+            L2_TABLE + 8: self.__entry(0xc00),
+            L2_TABLE + 16: self.__entry(0xa00),
+            L2_TABLE + 40: 0
+        })
+        with Qcow2.open(image) as qcow2:
+            qcow2.skip_hole()
+            assert qcow2.read(4096) == CLUSTER_TWO + CLUSTER_ONE
+
+    def test_read_compressed_cluster(self):
+        data = b'qcow2 compressed cluster'.ljust(512, b'\x00')
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -12)
+        image = self.__image(
+            {L2_TABLE + 16: self.__entry(END_OF_IMAGE, compressed=True)},
+            compressor.compress(data) + compressor.flush()
+        )
+        with Qcow2.open(image) as qcow2:
+            qcow2.seek(512)
+            assert qcow2.read(4096) == CLUSTER_ONE + data
+            qcow2.seek(1024)
+            assert qcow2.read(100) == data[:100]
+            assert qcow2.read(4096) == data[100:]
+
+    def test_read_corrupt_compressed_cluster(self):
+        image = self.__image(
+            {L2_TABLE + 8: self.__entry(END_OF_IMAGE, compressed=True)},
+            zlib.compress(b'short')[2:-4]
+        )
+        with Qcow2.open(image) as qcow2:
+            qcow2.seek(512)
+            with raises(AzureQcow2FormatError):
+                qcow2.read(512)
+
+    def test_zero_clusters(self):
+        image = self.__image({
+            4: struct.pack('>I', 3),
+            72: struct.pack('>Q', Qcow2.DIRTY),
+            L2_TABLE + 8: self.__entry(0xa00) | Qcow2.ZERO
+        })
+        with Qcow2.open(image) as qcow2:
+            assert qcow2.skip_hole() == 2560
+            assert qcow2.read(4096) == CLUSTER_TWO
+
+    def test_unallocated_cluster_table(self):
+        for image in [
+            self.__image({L1_TABLE: 0}),
+            self.__image({36: struct.pack('>I', 0)})
+        ]:
+            with Qcow2.open(image) as qcow2:
+                assert qcow2.skip_hole() == 4096
+                assert qcow2.read(4096) == b''
+
+    def test_not_qcow2(self):
+        with raises(AzureQcow2FormatError):
+            Qcow2.open('../data/blob.raw')
+
+    def test_unsupported_version(self):
+        with raises(AzureQcow2FormatError):
+            Qcow2.open(self.__image({4: struct.pack('>I', 1)}))
+
+    def test_incompatible_features(self):
+        image = self.__image({
+            4: struct.pack('>I', 3),
+            72: struct.pack('>Q', 2)
+        })
+        with raises(AzureQcow2FormatError):
+            Qcow2.open(image)
+
+    def test_backing_file(self):
+        with raises(AzureQcow2FormatError):
+            Qcow2.open(self.__image({8: struct.pack('>Q', 0x400)}))
+
+    def test_encrypted(self):
+        with raises(AzureQcow2FormatError):
+            Qcow2.open(self.__image({32: struct.pack('>I', 1)}))
+
+    def test_invalid_cluster_size(self):
+        with raises(AzureQcow2FormatError):
+            Qcow2.open(self.__image({20: struct.pack('>I', 8)}))
+
+    def test_truncated(self):
+        with open('../data/blob.qcow2', 'rb') as qcow2_file:
+            image = self.__write(qcow2_file.read()[:0xa80])
+        with Qcow2.open(image) as qcow2:
+            qcow2.skip_hole()
+            with raises(AzureQcow2FormatError):
+                qcow2.read(512)
+
+    def __entry(self, host_offset, compressed=False):
+        if compressed:
+            return Qcow2.COMPRESSED | host_offset
+        return 0x8000000000000000 | host_offset
+
+    def __image(self, patches, appended_data=b''):
+        with open('../data/blob.qcow2', 'rb') as qcow2_file:
+            data = bytearray(qcow2_file.read())
+        for offset, value in patches.items():
+            if isinstance(value, int):
+                value = struct.pack('>Q', value)
+            data[offset:offset + len(value)] = value
+        return self.__write(bytes(data) + appended_data)
+
+    def __write(self, data):
+        image = os.sep.join([
+            self.temp_dir, 'image%d.qcow2' % len(os.listdir(self.temp_dir))
+        ])
+        with open(image, 'wb') as qcow2_file:
+            qcow2_file.write(data)
+        return image
@@ -0,0 +1,128 @@
+from .test_helper import argv_kiwi_tests
+
+import mock
+from mock import patch
+from mock import call
+from pytest import raises
+
+from azurectl.utils.rate_limit import TokenBucket, RateLimit
+from azurectl.azurectl_exceptions import AzurePageBlobUpdateError
+
+
+class TestTokenBucket:
+    def setup(self):
+        self.time_patch = patch('azurectl.utils.rate_limit.time')
+        self.time = self.time_patch.start()
+        self.now = 100.0
+        self.time.monotonic.side_effect = lambda: self.now
+        self.time.sleep.side_effect = self.__sleep
+        self.bucket = TokenBucket(1000)
+
+    def teardown(self):
+        self.time_patch.stop()
+
+    def test_consume_within_capacity(self):
+        self.bucket.consume(400)
+        self.bucket.consume(600)
+        assert not self.time.sleep.called
+        assert self.bucket.tokens == 0
+
+    def test_consume_waits_for_tokens(self):
+        self.bucket.consume(1000)
+        self.bucket.consume(500)
+        assert self.time.sleep.call_args_list == [call(0.5)]
+        assert self.now == 100.5
+
+    def test_consume_more_than_capacity(self):
+        self.bucket.consume(3000)
+        assert self.bucket.tokens == -2000
+        self.bucket.consume(1000)
+        assert self.time.sleep.call_args_list == [call(3.0)]
+
+    def test_tokens_capped_to_capacity(self):
+        bucket = TokenBucket(1024, capacity=128)
+        self.now += 10
+        bucket.consume(128)
+        bucket.consume(64)
+        assert self.time.sleep.call_args_list == [call(0.0625)]
+
+    def __sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimit:
+    def setup(self):
+        self.time_patch = patch('azurectl.utils.rate_limit.time')
+        self.time = self.time_patch.start()
+        self.now = 100.0
+        self.time.monotonic.side_effect = lambda: self.now
+        self.time.sleep.side_effect = self.__sleep
+
+    def teardown(self):
+        self.time_patch.stop()
+
+    def test_unlimited(self):
+        rate_limit = RateLimit()
+        assert rate_limit.bandwidth is None
+        assert rate_limit.requests is None
+        rate_limit.acquire(4194304)
+        assert not self.time.sleep.called
+
+    def test_acquire(self):
+        rate_limit = RateLimit('1024', '2')
+        rate_limit.acquire(1024)
+        rate_limit.acquire()
+        rate_limit.acquire(1024)
+        assert self.time.sleep.call_args_list == [call(0.5), call(0.5)]
+
+    @patch('azurectl.utils.rate_limit.random.uniform')
+    def test_backoff_delay(self, mock_uniform):
+        mock_uniform.side_effect = lambda low, high: high
+        assert RateLimit.backoff_delay(1) == 0.5
+        assert RateLimit.backoff_delay(3) == 2.0
+        assert RateLimit.backoff_delay(20) == RateLimit.MAX_BACKOFF
+
+    @patch('azurectl.utils.rate_limit.random.uniform')
+    def test_server_busy_pauses_requests(self, mock_uniform):
+        mock_uniform.side_effect = lambda low, high: high
+        rate_limit = RateLimit()
+        rate_limit.server_busy()
+        rate_limit.server_busy()
+        assert rate_limit.resume_time == 101.0
+        rate_limit.acquire()
+        assert self.time.sleep.call_args_list == [call(1.0)]
+        rate_limit.success()
+        rate_limit.server_busy()
+        assert rate_limit.resume_time == 101.5
+
+    @patch('azurectl.utils.rate_limit.random.uniform')
+    def test_retry(self, mock_uniform):
+        mock_uniform.side_effect = lambda low, high: high
+        busy = Exception('server busy')
+        busy.status_code = 503
+        request = mock.Mock(
+            side_effect=[busy, Exception('connection reset'), 'result']
+        )
+        rate_limit = RateLimit('1024')
+        assert rate_limit.retry(
+            AzurePageBlobUpdateError, 'Page update failed with', 3, 512,
+            request, 'container', end=511
+        ) == 'result'
+        assert request.call_args_list == [call('container', end=511)] * 3
+        assert self.time.sleep.call_args_list == [call(0.5), call(1.0)]
+        assert rate_limit.busy_responses == 0
+
+    def test_retry_failed(self):
+        request = mock.Mock(side_effect=Exception('connection reset'))
+        with raises(AzurePageBlobUpdateError) as error:
+            RateLimit().retry(
+                AzurePageBlobUpdateError, 'Page clear failed with', 2, 0,
+                request
+            )
+        assert error.value.message == \
+            'Page clear failed with: ' + \
+            '\n'.join(['Exception: connection reset'] * 2)
+        assert request.call_count == 2
+
+    def __sleep(self, seconds):
+        self.now += seconds
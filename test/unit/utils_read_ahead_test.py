@@ -0,0 +1,50 @@
+from .test_helper import argv_kiwi_tests
+
+import mock
+from pytest import raises
+
+from azurectl.utils.read_ahead import ReadAhead
+from azurectl.utils.xz import XZ
+
+
+class TestReadAhead:
+    def setup(self):
+        self.read_ahead = ReadAhead(XZ.open('../data/blob.more.xz'), 8, 2)
+
+    def teardown(self):
+        self.read_ahead.close()
+
+    def test_read(self):
+        assert self.read_ahead.read(4) == b'Some'
+        assert self.read_ahead.read(8) == b' data so'
+        assert self.read_ahead.read(20) == b' that we can read it'
+        assert self.read_ahead.read(100) == \
+            b' as multiple chunks\n'
+        assert self.read_ahead.read(8) is None
+        assert self.read_ahead.read(8) is None
+
+    def test_read_eof_on_empty_chunk(self):
+        data_stream = mock.Mock()
+        data_stream.read.side_effect = [b'data', b'']
+        with ReadAhead(data_stream, 4) as read_ahead:
+            assert read_ahead.read(8) == b'data'
+            assert read_ahead.read(8) is None
+
+    def test_read_raises(self):
+        data_stream = mock.Mock()
+        data_stream.read.side_effect = [b'data', ValueError('corrupt')]
+        with ReadAhead(data_stream, 4) as read_ahead:
+            assert read_ahead.read(4) == b'data'
+            with raises(ValueError):
+                read_ahead.read(4)
+            assert read_ahead.read(4) is None
+
+    def test_close_unblocks_reader(self):
+        data_stream = mock.Mock()
+        data_stream.read.return_value = b'data'
+        data_stream.close = mock.Mock()
+        read_ahead = ReadAhead(data_stream, 4, 1)
+        assert read_ahead.read(4) == b'data'
+        read_ahead.close()
+        assert not read_ahead.reader.is_alive()
+        data_stream.close.assert_called_once_with()
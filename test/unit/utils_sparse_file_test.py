@@ -0,0 +1,55 @@
+from .test_helper import argv_kiwi_tests
+
+import errno
+import os
+from tempfile import NamedTemporaryFile
+from mock import patch
+from pytest import raises
+
+from azurectl.utils.sparse_file import SparseFile
+
+
+class TestSparseFile:
+    def setup(self):
+        self.image = NamedTemporaryFile()
+        self.image.truncate(1048576)
+        self.image.seek(524288)
+        self.image.write(b'a' * 4096)
+        self.image.flush()
+        self.sparse_file = SparseFile.open(self.image.name)
+
+    def teardown(self):
+        self.sparse_file.close()
+        self.image.close()
+
+    def test_context_manager(self):
+        with SparseFile.open(self.image.name) as sparse_file:
+            assert sparse_file.file_size == 1048576
+
+    def test_skip_holes(self):
+        assert self.sparse_file.skip_hole() == 524288
+        assert self.sparse_file.skip_hole() == 0
+        assert self.sparse_file.read(65536) == b'a' * 4096
+        assert self.sparse_file.skip_hole() == 520192
+        assert self.sparse_file.read(65536) == b''
+
+    def test_seek(self):
+        self.sparse_file.seek(1048576 - 512)
+        assert self.sparse_file.read(1024) == bytes(512)
+
+    def test_read_without_skip_hole(self):
+        data = self.sparse_file.read(1048576)
+        assert len(data) == 1048576
+        assert data.count(0) == 1048576 - 4096
+
+    @patch('azurectl.utils.sparse_file.os.lseek')
+    def test_lseek_failed(self, mock_lseek):
+        mock_lseek.side_effect = OSError(errno.EINVAL, 'invalid')
+        with raises(OSError):
+            self.sparse_file.skip_hole()
+
+    @patch('azurectl.utils.sparse_file.hasattr')
+    def test_no_hole_detection(self, mock_hasattr):
+        mock_hasattr.return_value = False
+        assert self.sparse_file.skip_hole() == 0
+        assert len(self.sparse_file.read(1048576)) == 1048576
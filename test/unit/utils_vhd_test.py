@@ -0,0 +1,157 @@
+from .test_helper import argv_kiwi_tests
+
+import io
+import os
+import shutil
+import struct
+from pytest import raises
+from tempfile import mkdtemp
+
+from azurectl.utils.vhd import FixedVHD
+from azurectl.utils.filetype import FileType
+from azurectl.utils.sparse_file import SparseFile
+from azurectl.utils.pipe_stream import PipeStream
+
+DATA = os.urandom(1000)
+
+
+class Stream(object):
+    # a data stream which can not seek
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def read(self, size):
+        return self.data.read(size)
+
+    def close(self):
+        self.data.close()
+
+
+class TestFixedVHD:
+    def setup(self):
+        self.vhd = FixedVHD(Stream(DATA), len(DATA))
+
+    def test_vhd_byte_size(self):
+        assert FixedVHD.vhd_byte_size(1) == 1048576 + 512
+        assert FixedVHD.vhd_byte_size(1048576) == 1048576 + 512
+        assert FixedVHD.vhd_byte_size(1048577) == 2 * 1048576 + 512
+
+    def test_footer(self):
+        footer = FixedVHD.footer(30 * 1073741824)
+        assert len(footer) == 512
+        assert footer[0:8] == b'conectix'
+        assert struct.unpack('>QQ', footer[40:56]) == (
+            30 * 1073741824, 30 * 1073741824
+        )
+        assert struct.unpack('>I', footer[60:64])[0] == 2
+        checksum = struct.unpack('>I', footer[64:68])[0]
+        assert checksum == \
+            ~sum(footer[:64] + footer[68:]) & 0xffffffff
+
+    def test_footer_disk_geometry(self):
+        for byte_size, geometry in [
+            (1048576, (30, 4, 17)),
+            (204800000, (806, 16, 31)),
+            (268435456, (520, 16, 63)),
+            (30 * 1073741824, (62415, 16, 63)),
+            (200 * 1073741824, (65535, 16, 255))
+        ]:
+            footer = FixedVHD.footer(byte_size)
+            assert struct.unpack('>HBB', footer[56:60]) == geometry
+
+    def test_read(self):
+        assert self.vhd.skip_hole() == 0
+        assert self.vhd.read(4096) == DATA + bytes(24)
+        assert self.vhd.skip_hole() == 1048576 - 1024
+        footer = self.vhd.read(4096)
+        assert footer == self.vhd.vhd_footer
+        assert self.vhd.skip_hole() == 0
+        assert self.vhd.read(4096) == b''
+
+    def test_read_padding(self):
+        self.vhd.seek(1048576 - 1024)
+        assert self.vhd.read(4096) == bytes(1024)
+        assert self.vhd.read(100) == self.vhd.vhd_footer[:100]
+        assert self.vhd.read(4096) == self.vhd.vhd_footer[100:]
+
+    def test_read_sparse_file(self):
+        with FixedVHD(SparseFile.open('../data/blob.raw'), 1024) as vhd:
+            with open('../data/blob.raw', 'rb') as raw:
+                assert vhd.read(4096) == raw.read()
+            assert vhd.skip_hole() == 1048576 - 1024
+
+    def test_read_sparse_hole(self):
+        temp_dir = mkdtemp()
+        try:
+            image = os.sep.join([temp_dir, 'sparse.raw'])
+            with open(image, 'wb') as raw:
+                raw.truncate(8192)
+                raw.seek(8192)
+                raw.write(DATA)
+            with FixedVHD(SparseFile.open(image), 9192) as vhd:
+                # holes are only reported by file systems which
+                # support them
+                hole_size = vhd.skip_hole()
+                assert hole_size in (0, 8192)
+                assert vhd.read(16384) == \
+                    bytes(8192 - hole_size) + DATA + bytes(24)
+                assert vhd.skip_hole() == 1048576 - 9216
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_read_unknown_size(self):
+        vhd = FixedVHD(PipeStream(Stream(DATA)))
+        assert vhd.skip_hole() == 0
+        assert vhd.read(4096) == DATA + bytes(24)
+        assert vhd.skip_hole() == 0
+        assert vhd.read(4096) == bytes(4096)
+        assert vhd.virtual_size == 1048576
+        assert vhd.skip_hole() == 1048576 - 1024 - 4096
+        assert vhd.read(4096) == vhd.vhd_footer
+
+    def test_seek_unknown_size(self):
+        vhd = FixedVHD(Stream(DATA))
+        vhd.seek(100)
+        assert vhd.read(4096) == DATA[100:]
+
+    def test_read_truncated(self):
+        vhd = FixedVHD(Stream(DATA), 2048)
+        vhd.read(4096)
+        with raises(EOFError):
+            vhd.read(4096)
+
+    def test_seek(self):
+        self.vhd.seek(500)
+        assert self.vhd.read(4096) == DATA[500:] + bytes(24)
+        vhd = FixedVHD(io.BytesIO(DATA), len(DATA))
+        vhd.seek(100)
+        assert vhd.read(4096) == DATA[100:] + bytes(24)
+
+    def test_seek_truncated(self):
+        vhd = FixedVHD(Stream(DATA), 2048)
+        vhd.seek(1500)
+        assert vhd.position == 1500
+        with raises(EOFError):
+            vhd.read(4096)
+
+    def test_seek_beyond_data(self):
+        self.vhd.seek(1048576)
+        assert self.vhd.position == 1048576
+        assert self.vhd.data_stream.data.tell() == len(DATA)
+
+    def test_file_type(self):
+        temp_dir = mkdtemp()
+        try:
+            image = os.sep.join([temp_dir, 'image.vhd'])
+            with open(image, 'wb') as vhd_file:
+                while True:
+                    self.vhd.skip_hole()
+                    vhd_file.seek(self.vhd.position)
+                    data = self.vhd.read(1048576)
+                    if not data:
+                        break
+                    vhd_file.write(data)
+            assert os.path.getsize(image) == 1048576 + 512
+            assert FileType(image).is_fixed_vhd() is True
+        finally:
+            shutil.rmtree(temp_dir)
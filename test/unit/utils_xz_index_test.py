@@ -0,0 +1,109 @@
+from .test_helper import argv_kiwi_tests
+
+import lzma
+import os
+import zlib
+from tempfile import NamedTemporaryFile
+from pytest import raises
+
+from azurectl.utils.xz_index import XZIndex
+from azurectl.azurectl_exceptions import AzureXZIndexError
+
+
+class TestXZIndex:
+    def setup(self):
+        self.xz_index = XZIndex('../data/blob.blocks.xz')
+
+    def temporary_file(self, data):
+        xz = NamedTemporaryFile()
+        xz.write(data)
+        xz.flush()
+        return xz
+
+    def test_blocks(self):
+        assert [
+            (block.offset, block.unpadded_size, block.uncompressed_size)
+            for block in self.xz_index.blocks
+        ] == [(12, 40, 16), (52, 40, 16), (92, 40, 16), (132, 29, 5)]
+
+    def test_uncompressed_size(self):
+        assert self.xz_index.uncompressed_size() == 53
+
+    def test_multiple_streams(self):
+        xz_index = XZIndex('../data/blob.streams.xz')
+        assert len(xz_index.blocks) == 5
+        assert xz_index.blocks[4].offset == 208
+        assert xz_index.uncompressed_size() == 105
+
+    def test_block_stream(self):
+        assert lzma.decompress(
+            XZIndex.block_stream(
+                '../data/blob.blocks.xz', self.xz_index.blocks[1]
+            )
+        ) == b't it is stored i'
+
+    def test_block_stream_large_block(self):
+        data = os.urandom(1024)
+        with self.temporary_file(lzma.compress(data)) as xz:
+            xz_index = XZIndex(xz.name)
+            assert xz_index.blocks[0].unpadded_size > 1024
+            assert lzma.decompress(
+                XZIndex.block_stream(xz.name, xz_index.blocks[0])
+            ) == data
+
+    def test_file_not_found(self):
+        with raises(AzureXZIndexError):
+            XZIndex('../data/does-not-exist')
+
+    def test_footer_not_found(self):
+        with raises(AzureXZIndexError):
+            XZIndex('../data/id_test')
+
+    def test_footer_crc_mismatch(self):
+        with open('../data/blob.xz', 'rb') as xz:
+            data = bytearray(xz.read())
+        data[-12] ^= 0xff
+        with self.temporary_file(data) as xz:
+            with raises(AzureXZIndexError):
+                XZIndex(xz.name)
+
+    def test_index_crc_mismatch(self):
+        with open('../data/blob.xz', 'rb') as xz:
+            data = bytearray(xz.read())
+        data[-15] ^= 0xff
+        with self.temporary_file(data) as xz:
+            with raises(AzureXZIndexError):
+                XZIndex(xz.name)
+
+    def test_index_not_found(self):
+        with open('../data/blob.xz', 'rb') as xz:
+            data = bytearray(xz.read())
+        # backward size pointing to a too small index
+        data[-8] = 0
+        crc = zlib.crc32(bytes(data[-8:-2])) & 0xffffffff
+        data[-12:-8] = crc.to_bytes(4, 'little')
+        with self.temporary_file(data) as xz:
+            with raises(AzureXZIndexError):
+                XZIndex(xz.name)
+
+    def test_header_not_found(self):
+        with open('../data/blob.xz', 'rb') as xz:
+            data = bytearray(xz.read())
+        data[0] = 0
+        with self.temporary_file(data) as xz:
+            with raises(AzureXZIndexError):
+                XZIndex(xz.name)
+
+    def test_invalid_multibyte_number(self):
+        with open('../data/blob.xz', 'rb') as xz:
+            data = bytearray(xz.read())
+        index_start = len(data) - 12 - 8
+        index = data[index_start:index_start + 8]
+        # record count with continuation bit running into the CRC
+        index[1:4] = b'\xff\xff\xff'
+        crc = zlib.crc32(bytes(index[:4])) & 0xffffffff
+        index[4:8] = crc.to_bytes(4, 'little')
+        data[index_start:index_start + 8] = index
+        with self.temporary_file(data) as xz:
+            with raises(AzureXZIndexError):
+                XZIndex(xz.name)
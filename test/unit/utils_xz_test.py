@@ -1,9 +1,16 @@
 from .test_helper import argv_kiwi_tests
 
 from mock import patch
+from pytest import raises
+import io
 import mock
+import os
+import shutil
+from tempfile import mkdtemp
 
-from azurectl.utils.xz import XZ
+from azurectl.utils.xz import XZ, LZMA, ParallelXZ
+from azurectl.utils.xz_index import XZIndex
+from azurectl.azurectl_exceptions import AzureXZIndexError
 
 
 class TestXZ:
@@ -37,5 +44,115 @@ class TestXZ:
             chunk = xz.read(8)
             assert chunk is None
 
+    def test_read_with_small_input_buffer(self):
+        with XZ.open('../data/blob.more.xz', buffer_size=4) as xz:
+            assert xz.read(30) == b'Some data so that we can read '
+            assert xz.read(30) == b'it as multiple chunks\n'
+            assert xz.read(30) is None
+
+    def test_read_streams(self):
+        with XZ.open('../data/blob.streams.xz', buffer_size=16) as xz:
+            assert xz.read(60) == \
+                b'Some data so that it is stored in multiple xz blocks\n' + \
+                b'Some da'
+            assert xz.read(60) == \
+                b'ta so that we can read it as multiple chunks\n'
+            assert xz.read(60) is None
+
+    def test_read_truncated(self):
+        with open('../data/blob.more.xz', 'rb') as xz_file:
+            truncated = io.BytesIO(xz_file.read()[:-20])
+        xz = XZ(truncated)
+        with raises(EOFError):
+            xz.read(1024)
+
     def test_uncompressed_size(self):
         assert XZ.uncompressed_size('../data/blob.xz') == 4
+        assert XZ.uncompressed_size('../data/blob.streams.xz') == 105
+
+    @patch('azurectl.utils.xz.XZIndex')
+    def test_uncompressed_size_without_index(self, mock_xz_index):
+        mock_xz_index.side_effect = AzureXZIndexError('no index')
+        assert XZ.uncompressed_size('../data/blob.more.xz') is None
+
+    def test_uncompressed_tail(self):
+        assert XZ.uncompressed_tail('../data/blob.blocks.xz', 10) == \
+            b'xz blocks\n'
+        assert XZ.uncompressed_tail('../data/blob.xz', 10) == b'foo\n'
+
+    @patch('azurectl.utils.xz.XZIndex')
+    def test_uncompressed_tail_without_index(self, mock_xz_index):
+        mock_xz_index.side_effect = AzureXZIndexError('no index')
+        assert XZ.uncompressed_tail('../data/blob.more.xz', 7) == \
+            b'chunks\n'
+
+
+class TestLZMA:
+    def test_read(self):
+        with LZMA.open('../data/blob.lzma', buffer_size=16) as lzma:
+            assert lzma.read(100) == \
+                b'Some data so that we can read it as multiple chunks\n'
+            assert lzma.read(100) is None
+
+    def test_uncompressed_size(self):
+        assert LZMA.uncompressed_size('../data/blob.lzma') is None
+
+    def test_uncompressed_size_from_header(self):
+        temp_dir = mkdtemp()
+        try:
+            image = os.sep.join([temp_dir, 'sized.lzma'])
+            with open('../data/blob.lzma', 'rb') as lzma_file:
+                data = bytearray(lzma_file.read())
+            data[5:13] = (4711).to_bytes(8, 'little')
+            with open(image, 'wb') as lzma_file:
+                lzma_file.write(data)
+            assert LZMA.uncompressed_size(image) == 4711
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestParallelXZ:
+    def setup(self):
+        self.xz = ParallelXZ.open('../data/blob.streams.xz', max_workers=2)
+
+    def teardown(self):
+        self.xz.close()
+
+    def test_read(self):
+        assert self.xz.read(200) == \
+            b'Some data so that it is stored in multiple xz blocks\n' + \
+            b'Some data so that we can read it as multiple chunks\n'
+        assert self.xz.read(200) is None
+
+    def test_read_chunks(self):
+        with ParallelXZ.open('../data/blob.blocks.xz', 1) as xz:
+            assert len(xz.pending_blocks) == 2
+            assert xz.read(20) == b'Some data so that it'
+            assert xz.read(20) == b' is stored in multip'
+            assert xz.read(20) == b'le xz blocks\n'
+            assert xz.read(20) is None
+
+    def test_read_chunks_buffer_size(self):
+        xz_index = XZIndex('../data/blob.blocks.xz')
+        first_block_size = xz_index.blocks[0].uncompressed_size
+        with ParallelXZ.open(
+            '../data/blob.blocks.xz', 4, first_block_size
+        ) as xz:
+            assert len(xz.pending_blocks) == 1
+            assert xz.pending_size == first_block_size
+            assert xz.read(20) == b'Some data so that it'
+            assert xz.read(40) == b' is stored in multiple xz blocks\n'
+            assert xz.pending_size == 0
+
+    def test_decompress_block(self):
+        xz_index = XZIndex('../data/blob.blocks.xz')
+        assert ParallelXZ.decompress_block(
+            '../data/blob.blocks.xz', xz_index.blocks[3]
+        ) == b'ocks\n'
+
+    def test_close_cancels_pending_blocks(self):
+        xz = ParallelXZ.open('../data/blob.blocks.xz', 1)
+        pending_block = mock.Mock()
+        xz.pending_blocks.append((mock.Mock(), pending_block))
+        xz.close()
+        pending_block.cancel.assert_called_once_with()